@@ -1,18 +1,197 @@
+import lzma
 import os
 import shutil
+import sqlite3
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime
 
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import bindparam, insert, update
 
-from config import get_backup_folder
-from db import DB_PATH, SessionLocal
-from models import Cliente, Pedido, ItemPedido
+from cache_clientes import cache_clientes
+from config import get_backup_folder, get_formato_respaldo
+from db import DB_PATH, borrar_archivos_wal, engine
+from models import Cliente, normalizar_rut
+from snapshots import crear_snapshot, listar_snapshots, restaurar_snapshot
 
 
-def hacer_respaldo():
+# Páginas que copia cada paso de la API de backup de SQLite. Entre pasos
+# se suelta el bloqueo, así que la app puede seguir escribiendo.
+PAGINAS_POR_PASO = 256
+# Espera antes de reintentar un paso si la BD está bloqueada por una escritura
+ESPERA_SI_OCUPADA = 0.05  # segundos
+MAX_REINICIOS = 3
+
+# Respaldo comprimido: xz (lzma) con SHA-256 del contenido en el mismo archivo
+ARCHIVO_COMPRIMIDO = "backup_raiz_diseno.db.xz"
+NIVEL_COMPRESION = 1  # preset 6 comprime ~20 % más pero tarda 10 veces más
+TAM_TROZO = 1024 * 1024  # se comprime/descomprime de a 1 MB, sin cargar la BD en memoria
+_FIRMA_XZ = b"\xfd7zXZ\x00"
+
+
+class _DemasiadosReinicios(Exception):
+    pass
+
+
+def copiar_bd(origen: str, destino: str, progreso=None,
+              paginas_por_paso: int = PAGINAS_POR_PASO) -> None:
+    """
+    Copia una BD SQLite en uso con la API de backup (sqlite3.Connection.backup).
+
+    A diferencia de copiar el archivo, el resultado siempre es una BD
+    consistente: si otra conexión escribe mientras se copia, SQLite vuelve
+    a empezar la copia. Se copia de a paginas_por_paso páginas y entre
+    pasos los demás pueden escribir. Si las escrituras hacen reiniciar la
+    copia más de MAX_REINICIOS veces, se copia todo en un solo paso.
+
+    Se escribe primero en "<destino>.tmp" y luego se reemplaza destino, así
+    que nunca queda un respaldo a medio escribir.
+
+    progreso: función opcional progreso(paginas_copiadas, paginas_totales).
+    Usa conexiones sqlite3 propias, así que puede llamarse desde otro hilo.
+    """
+    estado = {"copiadas": 0, "reinicios": 0}
+
+    def _paso(status, restantes, total):
+        copiadas = total - restantes
+        if copiadas < estado["copiadas"]:
+            estado["reinicios"] += 1
+            if estado["reinicios"] > MAX_REINICIOS:
+                raise _DemasiadosReinicios()
+        estado["copiadas"] = copiadas
+        if progreso is not None:
+            progreso(copiadas, total)
+
+    temporal = destino + ".tmp"
+    src = sqlite3.connect(origen)
+    try:
+        dst = sqlite3.connect(temporal)
+        try:
+            try:
+                src.backup(dst, pages=paginas_por_paso, progress=_paso,
+                           sleep=ESPERA_SI_OCUPADA)
+            except _DemasiadosReinicios:
+                src.backup(dst, sleep=ESPERA_SI_OCUPADA)
+                if progreso is not None:
+                    total = src.execute("PRAGMA page_count").fetchone()[0]
+                    progreso(total, total)
+        finally:
+            dst.close()
+        os.replace(temporal, destino)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    finally:
+        src.close()
+
+
+# ============================================
+#  Formato comprimido (.db.xz)
+# ============================================
+
+def es_comprimido(ruta: str) -> bool:
+    """True si el archivo es un respaldo comprimido (xz), sin importar la extensión."""
+    with open(ruta, "rb") as f:
+        return f.read(len(_FIRMA_XZ)) == _FIRMA_XZ
+
+
+def comprimir_bd(origen: str, destino: str, nivel: int = NIVEL_COMPRESION,
+                 progreso=None) -> int:
+    """
+    Comprime el archivo origen (una BD que nadie está escribiendo, p. ej. la
+    copia de copiar_bd) en destino, de a TAM_TROZO bytes.
+
+    El formato xz guarda el SHA-256 del contenido, que se verifica al
+    descomprimir. Se escribe en "<destino>.tmp" y luego se reemplaza.
+    progreso: función opcional progreso(bytes_leidos, bytes_totales).
+    Devuelve el tamaño del archivo comprimido.
+    """
+    temporal = destino + ".tmp"
+    total = os.path.getsize(origen)
+    try:
+        with open(origen, "rb") as entrada, lzma.open(
+            temporal, "wb", format=lzma.FORMAT_XZ, check=lzma.CHECK_SHA256, preset=nivel
+        ) as salida:
+            while trozo := entrada.read(TAM_TROZO):
+                salida.write(trozo)
+                if progreso is not None:
+                    progreso(entrada.tell(), total)
+        os.replace(temporal, destino)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return os.path.getsize(destino)
+
+
+def descomprimir_bd(origen: str, destino: str) -> str:
+    """
+    Descomprime un respaldo .db.xz en destino. Si el archivo está truncado
+    o su checksum no calza, lanza RuntimeError y destino no se toca.
+    """
+    directorio = os.path.dirname(destino)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    temporal = destino + ".tmp"
+    try:
+        with lzma.open(origen, "rb") as entrada, open(temporal, "wb") as salida:
+            shutil.copyfileobj(entrada, salida, TAM_TROZO)
+        borrar_archivos_wal(destino)
+        os.replace(temporal, destino)
+    except (lzma.LZMAError, EOFError) as exc:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise RuntimeError(f"El respaldo comprimido {origen} está dañado: {exc}") from exc
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return destino
+
+
+@contextmanager
+def _respaldo_legible(ruta: str):
+    """Entrega una ruta a una BD SQLite: la misma, o una copia descomprimida temporal."""
+    if not es_comprimido(ruta):
+        yield ruta
+        return
+    temporal = tempfile.mkdtemp(prefix="crm_respaldo_")
+    try:
+        yield descomprimir_bd(ruta, os.path.join(temporal, "respaldo.db"))
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+
+def _respaldo_comprimido(backup_folder: str, progreso=None) -> dict:
+    destino = os.path.join(backup_folder, ARCHIVO_COMPRIMIDO)
+    temporal = tempfile.mkdtemp(prefix="crm_respaldo_")
+    try:
+        copia = os.path.join(temporal, "copia.db")
+        copiar_bd(DB_PATH, copia, progreso)
+        tamano = os.path.getsize(copia)
+        comprimido = comprimir_bd(copia, destino, progreso=progreso)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+    return {"nombre": ARCHIVO_COMPRIMIDO, "tamano": tamano, "tamano_comprimido": comprimido}
+
+
+def hacer_respaldo(progreso=None, formato: str | None = None) -> dict:
     """
-    Crea (o reemplaza) un único archivo de respaldo de la base de datos SQLite
-    en la carpeta de respaldo configurada.
+    Respalda la base de datos en la carpeta de respaldo configurada, en el
+    formato de config.get_formato_respaldo() (o el indicado):
+
+    - "snapshots": guarda un snapshot (ver snapshots.py); solo se escriben
+      los bloques que cambiaron desde el anterior y se aplica la retención.
+      Devuelve el resultado de snapshots.crear_snapshot.
+    - "comprimido": reemplaza ARCHIVO_COMPRIMIDO por una copia xz.
+      Devuelve {"nombre", "tamano", "tamano_comprimido"}.
+
+    Se puede llamar con la app en uso (ver copiar_bd) y desde otro hilo.
+    progreso(hechas, total) se llama durante la copia y de nuevo al guardar
+    o comprimir; si lanza una excepción el respaldo se abandona y el último
+    respaldo bueno queda intacto.
     """
     backup_folder = get_backup_folder()
     if not backup_folder:
@@ -24,18 +203,69 @@ def hacer_respaldo():
             "Ejecuta primero el sistema para crearla."
         )
 
-    os.makedirs(backup_folder, exist_ok=True)
+    if (formato or get_formato_respaldo()) == "comprimido":
+        resultado = _respaldo_comprimido(backup_folder, progreso)
+        print(
+            "Respaldo generado:", os.path.join(backup_folder, resultado["nombre"]),
+            f"({resultado['tamano_comprimido'] / 2**20:.1f} de {resultado['tamano'] / 2**20:.1f} MB)",
+        )
+        return resultado
+
+    resultado = crear_snapshot(DB_PATH, progreso=progreso)
+    print(
+        "Respaldo generado:", resultado["nombre"],
+        f"({resultado['bloques_nuevos']} de {resultado['bloques']} bloques nuevos)",
+    )
+    return resultado
+
+
+class DetectorCambios:
+    """
+    Dice si la BD cambió desde el último respaldo, con PRAGMA data_version.
+
+    data_version es propio de cada conexión y cambia cuando otra conexión
+    confirma una escritura, así que se lee desde una conexión sqlite3
+    aparte que no escribe nunca: ve todo lo que entra por el engine (ORM,
+    importaciones, SQL directo). Se puede usar desde otro hilo, pero de a
+    un hilo a la vez.
+    """
+
+    def __init__(self, ruta: str = DB_PATH):
+        self._conn = sqlite3.connect(ruta, check_same_thread=False)
+        # Al abrir la app se parte del respaldo que se hizo al cerrarla
+        self._respaldada = self._version()
 
-    # Siempre el mismo nombre: se sobrescribe el archivo anterior
-    destino = os.path.join(backup_folder, "backup_raiz_diseno.db")
-    shutil.copy2(DB_PATH, destino)
-    print("Respaldo generado en:", destino)
+    def _version(self) -> int:
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def hay_cambios(self) -> bool:
+        return self._version() != self._respaldada
+
+    def respaldar_si_cambio(self, progreso=None) -> dict | None:
+        """
+        Llama a hacer_respaldo solo si hubo escrituras desde el último
+        respaldo hecho por este detector. Devuelve su resultado, o None si
+        no había nada nuevo.
+        """
+        # Se lee antes de copiar: lo que se escriba durante la copia
+        # cuenta como cambio para la próxima vez
+        version = self._version()
+        if version == self._respaldada:
+            return None
+        resultado = hacer_respaldo(progreso)
+        self._respaldada = version
+        return resultado
+
+    def cerrar(self):
+        self._conn.close()
 
 
 def restaurar_si_no_existe():
     """
-    Si la base de datos principal no existe pero sí existe el archivo
-    backup_raiz_diseno.db en la carpeta de respaldo, lo copia como DB actual.
+    Si la base de datos principal no existe, la restaura desde el respaldo
+    más reciente de la carpeta de respaldo: el último snapshot o el archivo
+    comprimido, el que sea más nuevo. Si no hay ninguno, usa el archivo
+    backup_raiz_diseno.db de versiones anteriores.
 
     (Esta función ya no se llama automáticamente al inicio, pero
     la dejamos por si quieres usarla manualmente en el futuro).
@@ -49,6 +279,18 @@ def restaurar_si_no_existe():
     if os.path.exists(DB_PATH):
         return
 
+    snapshots = listar_snapshots()
+    ruta_comprimido = os.path.join(backup_folder, ARCHIVO_COMPRIMIDO)
+    if os.path.exists(ruta_comprimido):
+        fecha = datetime.fromtimestamp(os.path.getmtime(ruta_comprimido))
+        if not snapshots or fecha > snapshots[0]["creado"]:
+            descomprimir_bd(ruta_comprimido, DB_PATH)
+            print("Base de datos restaurada automáticamente desde:", ruta_comprimido)
+            return
+    if snapshots:
+        restaurar_snapshot(snapshots[0]["nombre"], DB_PATH)
+        return
+
     ruta_backup = os.path.join(backup_folder, "backup_raiz_diseno.db")
     if not os.path.exists(ruta_backup):
         # No hay backup para restaurar
@@ -66,170 +308,215 @@ def restaurar_si_no_existe():
 def importar_respaldo(ruta_backup: str) -> dict:
     """
     Importa datos desde un archivo de base de datos SQLite externo (respaldo)
-    hacia la BD actual, SIN borrar lo que ya existe.
+    hacia la BD actual, SIN borrar lo que ya existe. Acepta también
+    respaldos comprimidos (.db.xz), que se descomprimen a un temporal.
 
     - Si un pedido con el mismo numero_pedido ya existe, se omite.
-    - Los clientes se emparejan por RUT (si tiene) o por nombre.
+    - Los clientes se emparejan por RUT normalizado (si tiene) o por nombre.
     - Los ítems se consideran duplicados si coinciden pedido + producto + cantidad + precio.
 
+    El respaldo se adjunta (ATTACH) a la misma conexión, así que pedidos e
+    ítems se copian con unas pocas sentencias INSERT ... SELECT en lugar de
+    una consulta por fila. Todo ocurre en una sola transacción.
+
     Devuelve un diccionario con conteo de registros nuevos.
     """
     if not os.path.exists(ruta_backup):
         raise RuntimeError(f"No se encontró el archivo de respaldo: {ruta_backup}")
 
-    # Engine / sesión para la BD de respaldo
-    engine_backup = create_engine(
-        "sqlite:///" + ruta_backup.replace("\\", "/"),
-        echo=False,
-        future=True,
+    with _respaldo_legible(ruta_backup) as ruta_db:
+        return _importar_desde(ruta_db)
+
+
+def _importar_desde(ruta_db: str) -> dict:
+    with engine.connect() as conn:
+        conn.exec_driver_sql("ATTACH DATABASE ? AS respaldo", (ruta_db,))
+        try:
+            clientes_nuevos = _importar_clientes(conn)
+            pedidos_nuevos = _importar_pedidos(conn)
+            items_nuevos = _importar_items(conn)
+            conn.commit()
+            # Escrituras sin sesión ORM: el caché no se entera solo
+            cache_clientes.invalidar()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            for tabla in ("mapa_clientes", "mapa_pedidos", "items_unicos"):
+                conn.exec_driver_sql(f"DROP TABLE IF EXISTS temp.{tabla}")
+            conn.commit()
+            conn.exec_driver_sql("DETACH DATABASE respaldo")
+
+    return {
+        "clientes_nuevos": clientes_nuevos,
+        "pedidos_nuevos": pedidos_nuevos,
+        "items_nuevos": items_nuevos,
+    }
+
+
+_CAMPOS_CONTACTO = ("telefono", "correo", "direccion", "comuna")
+
+
+def _importar_clientes(conn) -> int:
+    """
+    Empareja los clientes del respaldo con los de la BD actual y crea los
+    que falten. Deja el resultado en la tabla temporal mapa_clientes.
+
+    Se hace en memoria, en una pasada, con diccionarios por RUT normalizado
+    y por nombre: un cliente creado en esta misma importación ya sirve para
+    emparejar a los siguientes, igual que antes con un flush por fila. Los
+    nuevos llevan un id provisional (negativo) hasta que SQLite les asigna
+    el real al insertarlos.
+    """
+    actuales: dict[int, dict] = {}
+    por_rut: dict[str, int] = {}
+    por_nombre: dict[str, int] = {}
+
+    filas = conn.exec_driver_sql(
+        "SELECT id, nombre, rut_normalizado, telefono, correo, direccion, comuna "
+        "FROM main.clientes ORDER BY id"
     )
-    SessionBackup = sessionmaker(bind=engine_backup)
+    for id_, nombre, rut_norm, *contacto in filas:
+        actuales[id_] = dict(zip(_CAMPOS_CONTACTO, contacto))
+        if rut_norm:
+            por_rut.setdefault(rut_norm, id_)
+        por_nombre.setdefault(nombre or "", id_)
+
+    nuevos: list[dict] = []
+    provisionales: list[int] = []
+    cambiados: set[int] = set()
+    mapa: list[tuple[int, int]] = []
+
+    filas = conn.exec_driver_sql(
+        "SELECT id, nombre, rut, telefono, correo, direccion, comuna "
+        "FROM respaldo.clientes ORDER BY id"
+    ).all()
+    for src_id, nombre, rut, *contacto in filas:
+        rut_norm = normalizar_rut(rut)
+        destino = por_rut.get(rut_norm) if rut_norm else None
+        if destino is None:
+            destino = por_nombre.get(nombre or "")
+
+        if destino is None:
+            # Cliente nuevo: id provisional hasta insertarlo en bloque
+            destino = -(len(nuevos) + 1)
+            fila = {"nombre": nombre, "rut": rut, "rut_normalizado": rut_norm}
+            fila.update(zip(_CAMPOS_CONTACTO, contacto))
+            nuevos.append(fila)
+            provisionales.append(destino)
+            actuales[destino] = fila
+            if rut_norm:
+                por_rut[rut_norm] = destino
+            por_nombre.setdefault(nombre or "", destino)
+        else:
+            # Completar campos vacíos con lo que viene del backup
+            info = actuales[destino]
+            for campo, valor in zip(_CAMPOS_CONTACTO, contacto):
+                if not info[campo] and valor:
+                    info[campo] = valor
+                    cambiados.add(destino)
+
+        mapa.append((src_id, destino))
+
+    # id provisional -> id real
+    reales: dict[int, int] = {}
+    if nuevos:
+        ids = conn.execute(
+            insert(Cliente).returning(Cliente.id, sort_by_parameter_order=True),
+            nuevos,
+        ).scalars().all()
+        reales = dict(zip(provisionales, ids))
+        mapa = [(src_id, reales.get(destino, destino)) for src_id, destino in mapa]
+
+    actualizar = [
+        {"b_id": i, **actuales[i]} for i in cambiados if i not in reales
+    ]
+    if actualizar:
+        conn.execute(
+            update(Cliente).where(Cliente.id == bindparam("b_id")),
+            actualizar,
+        )
 
-    session_dest = SessionLocal()
-    session_src = SessionBackup()
+    conn.exec_driver_sql(
+        "CREATE TEMP TABLE mapa_clientes (src_id INTEGER PRIMARY KEY, dest_id INTEGER)"
+    )
+    conn.exec_driver_sql("INSERT INTO temp.mapa_clientes VALUES (?, ?)", mapa)
+    return len(nuevos)
 
-    clientes_nuevos = 0
-    pedidos_nuevos = 0
-    items_nuevos = 0
 
-    try:
-        # ----------------------------
-        # 1) Importar / emparejar clientes
-        # ----------------------------
-        mapa_clientes_id: dict[int, int] = {}
-
-        clientes_src = session_src.query(Cliente).all()
-        for c_src in clientes_src:
-            destino = None
-
-            # Primero probamos por RUT (si tiene)
-            rut_src = (c_src.rut or "").strip()
-            if rut_src:
-                destino = (
-                    session_dest.query(Cliente)
-                    .filter(Cliente.rut == rut_src)
-                    .first()
-                )
-
-            # Si no se encontró por RUT, probamos por nombre
-            if destino is None:
-                destino = (
-                    session_dest.query(Cliente)
-                    .filter(Cliente.nombre == (c_src.nombre or ""))
-                    .first()
-                )
-
-            if destino is None:
-                # Cliente nuevo → lo creamos
-                destino = Cliente(
-                    nombre=c_src.nombre,
-                    rut=c_src.rut,
-                    telefono=c_src.telefono,
-                    correo=c_src.correo,
-                    direccion=c_src.direccion,
-                    comuna=c_src.comuna,
-                )
-                session_dest.add(destino)
-                session_dest.flush()
-                clientes_nuevos += 1
-            else:
-                # Opcional: actualizar campos vacíos con lo que viene del backup
-                if not destino.telefono and c_src.telefono:
-                    destino.telefono = c_src.telefono
-                if not destino.correo and c_src.correo:
-                    destino.correo = c_src.correo
-                if not destino.direccion and c_src.direccion:
-                    destino.direccion = c_src.direccion
-                if not destino.comuna and c_src.comuna:
-                    destino.comuna = c_src.comuna
-
-            mapa_clientes_id[c_src.id] = destino.id
-
-        # ----------------------------
-        # 2) Importar pedidos
-        # ----------------------------
-        mapa_pedidos_id: dict[int, int] = {}
-
-        pedidos_src = session_src.query(Pedido).all()
-        for p_src in pedidos_src:
-            numero = (p_src.numero_pedido or "").strip()
-            if not numero:
-                continue
-
-            # ¿Ya existe un pedido con ese número?
-            p_dest = (
-                session_dest.query(Pedido)
-                .filter(Pedido.numero_pedido == numero)
-                .first()
-            )
-
-            if p_dest is None:
-                p_dest = Pedido(
-                    numero_pedido=p_src.numero_pedido,
-                    fecha_pedido=p_src.fecha_pedido,
-                    canal_venta=p_src.canal_venta,
-                    forma_pago=p_src.forma_pago,
-                    tipo_documento=p_src.tipo_documento,
-                    monto_pagado=p_src.monto_pagado,
-                    saldo=p_src.saldo,
-                    despacho=p_src.despacho,
-                    estado=p_src.estado,
-                    cliente_id=mapa_clientes_id.get(p_src.cliente_id),
-                )
-                session_dest.add(p_dest)
-                session_dest.flush()
-                pedidos_nuevos += 1
-
-            mapa_pedidos_id[p_src.id] = p_dest.id
-
-        # ----------------------------
-        # 3) Importar ítems de pedido
-        # ----------------------------
-        items_src = session_src.query(ItemPedido).all()
-        for it_src in items_src:
-            nuevo_pedido_id = mapa_pedidos_id.get(it_src.pedido_id)
-            if nuevo_pedido_id is None:
-                continue
-
-            # ¿Ya existe ese ítem en el pedido destino?
-            existente = (
-                session_dest.query(ItemPedido)
-                .filter(
-                    ItemPedido.pedido_id == nuevo_pedido_id,
-                    ItemPedido.producto == it_src.producto,
-                    ItemPedido.cantidad == it_src.cantidad,
-                    ItemPedido.precio_unitario == it_src.precio_unitario,
-                )
-                .first()
-            )
-
-            if existente:
-                continue
-
-            it_dest = ItemPedido(
-                producto=it_src.producto,
-                cantidad=it_src.cantidad,
-                precio_unitario=it_src.precio_unitario,
-                total_item=it_src.total_item,
-                pedido_id=nuevo_pedido_id,
-            )
-            session_dest.add(it_dest)
-            items_nuevos += 1
-
-        session_dest.commit()
-
-        return {
-            "clientes_nuevos": clientes_nuevos,
-            "pedidos_nuevos": pedidos_nuevos,
-            "items_nuevos": items_nuevos,
-        }
+def _importar_pedidos(conn) -> int:
+    """Inserta los pedidos cuyo número no existe y arma mapa_pedidos."""
+    nuevos = conn.exec_driver_sql(
+        """
+        INSERT INTO main.pedidos (
+            numero_pedido, fecha_pedido, canal_venta, forma_pago, tipo_documento,
+            monto_pagado, saldo, despacho, estado, cliente_id
+        )
+        SELECT s.numero_pedido, s.fecha_pedido, s.canal_venta, s.forma_pago,
+               s.tipo_documento, s.monto_pagado, s.saldo, s.despacho, s.estado,
+               m.dest_id
+        FROM respaldo.pedidos s
+        LEFT JOIN temp.mapa_clientes m ON m.src_id = s.cliente_id
+        WHERE trim(coalesce(s.numero_pedido, '')) <> ''
+          AND NOT EXISTS (
+              SELECT 1 FROM main.pedidos d WHERE d.numero_pedido = trim(s.numero_pedido)
+          )
+        ORDER BY s.id
+        """
+    ).rowcount
+
+    conn.exec_driver_sql(
+        """
+        CREATE TEMP TABLE mapa_pedidos AS
+        SELECT s.id AS src_id, d.id AS dest_id
+        FROM respaldo.pedidos s
+        JOIN main.pedidos d
+          ON d.numero_pedido = trim(s.numero_pedido) OR d.numero_pedido = s.numero_pedido
+        WHERE trim(coalesce(s.numero_pedido, '')) <> ''
+        GROUP BY s.id
+        """
+    )
+    conn.exec_driver_sql("CREATE UNIQUE INDEX temp.ix_mapa_pedidos ON mapa_pedidos (src_id)")
+    return nuevos
 
-    except Exception:
-        session_dest.rollback()
-        raise
-    finally:
-        session_src.close()
-        session_dest.close()
+
+def _importar_items(conn) -> int:
+    """
+    Inserta los ítems que no estén ya en el pedido destino.
+
+    Como antes, un ítem es duplicado si coincide pedido + producto + cantidad
+    + precio (dos precios vacíos cuentan como iguales), ya sea contra la BD
+    actual o contra otro ítem del mismo respaldo.
+    """
+    # Un representante (el primero) por cada ítem repetido dentro del respaldo
+    conn.exec_driver_sql(
+        "CREATE TEMP TABLE items_unicos (id INTEGER PRIMARY KEY)"
+    )
+    conn.exec_driver_sql(
+        """
+        INSERT INTO temp.items_unicos
+        SELECT MIN(id) FROM respaldo.items_pedido
+        GROUP BY pedido_id, producto, cantidad, precio_unitario
+        """
+    )
+
+    return conn.exec_driver_sql(
+        """
+        INSERT INTO main.items_pedido (producto, cantidad, precio_unitario, total_item, pedido_id)
+        SELECT s.producto, s.cantidad, s.precio_unitario, s.total_item, m.dest_id
+        FROM respaldo.items_pedido s
+        JOIN temp.mapa_pedidos m ON m.src_id = s.pedido_id
+        WHERE s.id IN (SELECT id FROM temp.items_unicos)
+          AND NOT EXISTS (
+              SELECT 1 FROM main.items_pedido d
+              WHERE d.pedido_id = m.dest_id
+                AND d.producto = s.producto
+                AND d.cantidad = s.cantidad
+                AND d.precio_unitario IS s.precio_unitario
+          )
+        ORDER BY s.id
+        """
+    ).rowcount
 
 
 if __name__ == "__main__":
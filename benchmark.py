@@ -0,0 +1,1097 @@
+# benchmark.py
+"""
+Benchmarks de rendimiento del CRM.
+
+Se ejecutan sobre bases SQLite temporales con datos sintéticos, nunca
+sobre raiz_diseno.db. Uso:
+
+    python benchmark.py                 # todos
+    python benchmark.py listado_pedidos # uno en particular
+"""
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import Integer, cast, create_engine, event, func, insert, select
+from sqlalchemy.orm import defer, sessionmaker
+
+from config import PRAGMAS_SQLITE_DEFECTO
+from db import configurar_pragmas
+from init_db import preparar_esquema
+from models import Cliente, Pedido, ItemPedido, normalizar_rut
+
+
+# ============================================
+#  Utilidades
+# ============================================
+
+def crear_bd_temporal(carpeta: str, nombre: str = "bench.db", pragmas: dict | None = None):
+    """
+    Crea una BD SQLite vacía con el esquema del CRM y devuelve (engine, Session).
+    Sin pragmas usa los valores por defecto de SQLite (como antes de db.configurar_pragmas).
+    """
+    ruta = os.path.join(carpeta, nombre)
+    engine = create_engine("sqlite:///" + ruta.replace("\\", "/"), future=True)
+    if pragmas:
+        configurar_pragmas(engine, pragmas)
+    preparar_esquema(engine)
+    return engine, sessionmaker(bind=engine)
+
+
+NOMBRES = ["María", "José", "Juan", "Ana", "Claudia", "Pedro", "Camila", "Diego", "Javiera", "Nicolás"]
+APELLIDOS = ["González", "Muñoz", "Rojas", "Díaz", "Pérez", "Soto", "Contreras", "Silva",
+             "Martínez", "Sepúlveda", "Morales", "Rodríguez", "López", "Fuentes", "Hernández"]
+COMUNAS = ["Ñuñoa", "Providencia", "Las Condes", "Maipú", "La Florida", "Peñalolén", "Santiago"]
+PRODUCTOS = ["Tabla pino 23x70", "Tabla amasar", "Set alzador", "Base cocina grande",
+             "Panel", "Tortero 30", "Bandeja sushi", "Tabla con logo"]
+
+
+def poblar(engine, n_pedidos: int, items_por_pedido: int = 3, n_clientes: int | None = None):
+    """Inserta clientes, pedidos e ítems sintéticos en bloque."""
+    if n_clientes is None:
+        n_clientes = max(n_pedidos // 5, 1)
+    base = datetime(2024, 1, 1)
+
+    with engine.begin() as conn:
+        conn.execute(insert(Cliente), [
+            {
+                "id": i,
+                "nombre": f"{NOMBRES[i % 10]} {APELLIDOS[i % 15]} {APELLIDOS[i // 15 % 15]} {i}",
+                "rut": f"{10_000_000 + i}-{i % 10}",
+                "rut_normalizado": f"{10_000_000 + i}{i % 10}",
+                "telefono": f"9{i:08d}",
+                "comuna": COMUNAS[i % len(COMUNAS)],
+            }
+            for i in range(1, n_clientes + 1)
+        ])
+        conn.execute(insert(Pedido), [
+            {
+                "id": i,
+                "numero_pedido": f"B{i:08d}",
+                "fecha_pedido": base + timedelta(minutes=i),
+                "monto_pagado": 1000,
+                "saldo": None,
+                "estado": "Pendiente",
+                "cliente_id": (i % n_clientes) + 1,
+            }
+            for i in range(1, n_pedidos + 1)
+        ])
+        conn.execute(insert(ItemPedido), [
+            {
+                "producto": PRODUCTOS[(i + j) % len(PRODUCTOS)],
+                "cantidad": 1 + j,
+                "precio_unitario": 990,
+                "total_item": (1 + j) * 990,
+                "pedido_id": i,
+            }
+            for i in range(1, n_pedidos + 1)
+            for j in range(items_por_pedido)
+        ])
+
+
+def crear_excel_ventas(ruta: str, n_filas: int, semilla: int = 0) -> None:
+    """
+    Escribe un Excel con el formato de la planilla de ventas: una fila de
+    título, los encabezados y pedidos de 1 a 3 filas (las de continuación
+    solo traen producto y unidades). Algunos clientes se repiten con datos
+    de contacto incompletos y algunos N° de pedido vuelven a aparecer.
+    """
+    import random
+    from openpyxl import Workbook
+    from import_excel import COLUMNAS_EXCEL
+
+    rnd = random.Random(semilla)
+    n_clientes = max(n_filas // 6, 1)
+    base = datetime(2024, 1, 1)
+
+    wb = Workbook(write_only=True)
+    hoja = wb.create_sheet("Ventas")
+    hoja.append(["VENTAS RAÍZ DISEÑO"])
+    hoja.append(list(COLUMNAS_EXCEL))
+
+    filas = pedido = 0
+    while filas < n_filas:
+        pedido += 1
+        i = rnd.randrange(n_clientes)
+        numero = 10_000 + (rnd.randrange(pedido) if rnd.random() < 0.03 else pedido)
+        hoja.append([
+            base + timedelta(hours=pedido),
+            rnd.choice(["WEB", "TELEFONO", "WHATSAPP", None]),
+            numero if rnd.random() > 0.02 else None,
+            f"{NOMBRES[i % 10]} {APELLIDOS[i % 15]} {i}".upper(),
+            900_000_000 + i if rnd.random() > 0.3 else None,
+            f"CALLE {i} #{i % 97}" if rnd.random() > 0.3 else None,
+            COMUNAS[i % len(COMUNAS)].upper() if rnd.random() > 0.2 else None,
+            rnd.choice(PRODUCTOS).upper(),
+            rnd.choice([1, 2, 3, None]),
+            rnd.choice(["TRANSFERENCIA", "PAGO WEB", None]),
+            rnd.choice(["BOLETA", "FACTURA"]),
+            rnd.randrange(10, 500) * 1000,
+            None,
+            None,
+            f"cliente{i}@correo.cl" if rnd.random() > 0.5 else None,
+            None,
+        ])
+        filas += 1
+        for _ in range(rnd.randrange(3)):
+            fila = [None] * len(COLUMNAS_EXCEL)
+            fila[7] = rnd.choice(PRODUCTOS).upper()
+            fila[8] = rnd.choice([1, 2, None])
+            hoja.append(fila)
+            filas += 1
+    wb.save(ruta)
+
+
+class ContadorConsultas:
+    """Cuenta las sentencias SQL que ejecuta un engine."""
+
+    def __init__(self, engine):
+        self.total = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args, **kwargs):
+        self.total += 1
+
+
+def medir(fn, *args, **kwargs):
+    """Ejecuta fn y devuelve (resultado, segundos)."""
+    t0 = time.perf_counter()
+    res = fn(*args, **kwargs)
+    return res, time.perf_counter() - t0
+
+
+# ============================================
+#  Benchmarks
+# ============================================
+
+def bench_listado_pedidos():
+    """Listado de pedidos: carga ORM con lazy loading vs. consulta agregada."""
+    from repository import listar_pedidos
+
+    def carga_orm(session):
+        # Patrón anterior de PedidosDialog.cargar
+        filas = []
+        for p in session.query(Pedido).join(Cliente).order_by(Pedido.fecha_pedido.desc()).all():
+            total = sum(int(it.cantidad or 0) * int(it.precio_unitario or 0) for it in p.items)
+            filas.append((p.id, p.cliente.nombre, total))
+        return filas
+
+    print("Listado de pedidos (consultas SQL / segundos)")
+    print(f"{'pedidos':>10} {'ORM lazy':>22} {'agregada':>22}")
+    for n in (100, 1_000, 10_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine, Session = crear_bd_temporal(carpeta)
+            poblar(engine, n)
+            contador = ContadorConsultas(engine)
+
+            resultados = []
+            for fn in (carga_orm, listar_pedidos):
+                session = Session()
+                contador.total = 0
+                try:
+                    _, seg = medir(fn, session)
+                finally:
+                    session.close()
+                resultados.append(f"{contador.total:>8} q / {seg:7.3f} s")
+
+            print(f"{n:>10} {resultados[0]:>22} {resultados[1]:>22}")
+            engine.dispose()
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_busqueda_clientes():
+    """Búsqueda FTS5 de clientes (top 50) con 100.000 clientes."""
+    from busqueda import buscar_clientes
+
+    consultas = ["maria gonz", "jose munoz rojas", "nunoa", "10004567", "12.345",
+                 "penalolen cami", "bandeja sushi", "zzz"]
+    repeticiones = 20
+
+    carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+    try:
+        engine, Session = crear_bd_temporal(carpeta)
+        poblar(engine, n_pedidos=20_000, n_clientes=100_000)
+        session = Session()
+        try:
+            print("Búsqueda de clientes FTS5 (100.000 clientes, 60.000 ítems)")
+            print(f"{'consulta':>16} {'resultados':>11} {'ms/consulta':>12}")
+            for texto in consultas:
+                ids, _ = medir(buscar_clientes, session, texto)
+                t0 = time.perf_counter()
+                for _ in range(repeticiones):
+                    buscar_clientes(session, texto)
+                ms = (time.perf_counter() - t0) * 1000 / repeticiones
+                print(f"{texto:>16} {len(ids):>11} {ms:>12.2f}")
+        finally:
+            session.close()
+            engine.dispose()
+    finally:
+        shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def _importar_respaldo_por_fila(session_dest, session_src) -> dict:
+    """
+    Referencia: la versión anterior de backup.importar_respaldo, con una
+    consulta .first() y un flush por fila.
+    """
+    clientes_nuevos = pedidos_nuevos = items_nuevos = 0
+    mapa_clientes: dict[int, int] = {}
+    for c in session_src.query(Cliente).options(defer(Cliente.rut_normalizado)):
+        destino = None
+        clave = normalizar_rut(c.rut)
+        if clave:
+            destino = session_dest.query(Cliente).filter(Cliente.rut_normalizado == clave).first()
+        if destino is None:
+            destino = session_dest.query(Cliente).filter(Cliente.nombre == (c.nombre or "")).first()
+        if destino is None:
+            destino = Cliente(nombre=c.nombre, rut=c.rut, telefono=c.telefono, correo=c.correo,
+                              direccion=c.direccion, comuna=c.comuna)
+            session_dest.add(destino)
+            session_dest.flush()
+            clientes_nuevos += 1
+        else:
+            for campo in ("telefono", "correo", "direccion", "comuna"):
+                if not getattr(destino, campo) and getattr(c, campo):
+                    setattr(destino, campo, getattr(c, campo))
+        mapa_clientes[c.id] = destino.id
+
+    mapa_pedidos: dict[int, int] = {}
+    for p in session_src.query(Pedido):
+        numero = (p.numero_pedido or "").strip()
+        if not numero:
+            continue
+        destino = session_dest.query(Pedido).filter(Pedido.numero_pedido == numero).first()
+        if destino is None:
+            destino = Pedido(numero_pedido=p.numero_pedido, fecha_pedido=p.fecha_pedido,
+                             canal_venta=p.canal_venta, forma_pago=p.forma_pago,
+                             tipo_documento=p.tipo_documento, monto_pagado=p.monto_pagado,
+                             saldo=p.saldo, despacho=p.despacho, estado=p.estado,
+                             cliente_id=mapa_clientes.get(p.cliente_id))
+            session_dest.add(destino)
+            session_dest.flush()
+            pedidos_nuevos += 1
+        mapa_pedidos[p.id] = destino.id
+
+    for it in session_src.query(ItemPedido):
+        pedido_id = mapa_pedidos.get(it.pedido_id)
+        if pedido_id is None:
+            continue
+        existe = session_dest.query(ItemPedido).filter(
+            ItemPedido.pedido_id == pedido_id,
+            ItemPedido.producto == it.producto,
+            ItemPedido.cantidad == it.cantidad,
+            ItemPedido.precio_unitario == it.precio_unitario,
+        ).first()
+        if existe:
+            continue
+        session_dest.add(ItemPedido(producto=it.producto, cantidad=it.cantidad,
+                                    precio_unitario=it.precio_unitario,
+                                    total_item=it.total_item, pedido_id=pedido_id))
+        items_nuevos += 1
+
+    session_dest.commit()
+    return {"clientes_nuevos": clientes_nuevos, "pedidos_nuevos": pedidos_nuevos,
+            "items_nuevos": items_nuevos}
+
+
+def bench_importar_respaldo():
+    """Fusión de un respaldo: una consulta por fila vs. ATTACH + INSERT ... SELECT."""
+    import backup
+
+    print("Importar respaldo (respaldo con el doble de pedidos que la BD actual)")
+    print(f"{'ítems resp.':>12} {'por fila':>10} {'en bloque':>10}  resultado")
+    for n_pedidos in (2_000, 17_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine_src, _ = crear_bd_temporal(carpeta, "respaldo.db")
+            poblar(engine_src, n_pedidos)
+            engine_src.dispose()
+            ruta_src = os.path.join(carpeta, "respaldo.db")
+
+            engine_base, _ = crear_bd_temporal(carpeta, "actual.db")
+            poblar(engine_base, n_pedidos // 2)
+            engine_base.dispose()
+
+            tiempos, resultados = [], []
+            for modo in ("fila", "bloque"):
+                ruta = os.path.join(carpeta, f"{modo}.db")
+                shutil.copy(os.path.join(carpeta, "actual.db"), ruta)
+                engine = create_engine("sqlite:///" + ruta.replace("\\", "/"), future=True)
+                if modo == "fila":
+                    src = create_engine("sqlite:///" + ruta_src.replace("\\", "/"), future=True)
+                    s_dest, s_src = sessionmaker(bind=engine)(), sessionmaker(bind=src)()
+                    res, seg = medir(_importar_respaldo_por_fila, s_dest, s_src)
+                    s_dest.close(), s_src.close(), src.dispose()
+                else:
+                    engine_original, backup.engine = backup.engine, engine
+                    try:
+                        res, seg = medir(backup.importar_respaldo, ruta_src)
+                    finally:
+                        backup.engine = engine_original
+                engine.dispose()
+                tiempos.append(seg)
+                resultados.append(res)
+
+            igual = "iguales" if resultados[0] == resultados[1] else f"DISTINTOS {resultados}"
+            print(f"{n_pedidos * 3:>12} {tiempos[0]:>9.2f}s {tiempos[1]:>9.2f}s  {igual}")
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def _limpiar_dataframe_por_fila(df):
+    """Referencia: la versión anterior de import_excel.limpiar_dataframe (iterrows)."""
+    import pandas as pd
+    import import_excel as ie
+
+    df = df.dropna(how="all").copy()
+
+    cols_ffill_global = [
+        "fecha", "canal_venta", "numero_pedido",
+        "forma_pago", "tipo_documento", "pago",
+        "saldo", "despacho", "estado"
+    ]
+    for col in cols_ffill_global:
+        if col in df.columns:
+            df[col] = df[col].ffill()
+
+    cleaned_rows = []
+    current_cliente = None
+    contactos_por_cliente: dict[str, dict[str, str]] = {}
+
+    for _, original_row in df.iterrows():
+        row = original_row.copy()
+
+        cliente_str = ie.limpiar_nan(row.get("cliente"))
+
+        if cliente_str:
+            current_cliente = cliente_str
+
+            info = contactos_por_cliente.get(current_cliente, {})
+            for campo in ["telefono", "direccion", "comuna", "correo"]:
+                if campo in df.columns:
+                    if campo == "telefono":
+                        val = ie.limpiar_nan(row.get(campo), es_telefono=True)
+                    else:
+                        val = ie.limpiar_nan(row.get(campo))
+                    if val:
+                        info[campo] = val
+            contactos_por_cliente[current_cliente] = info
+
+        elif current_cliente:
+            row["cliente"] = current_cliente
+
+        if current_cliente and current_cliente in contactos_por_cliente:
+            info = contactos_por_cliente[current_cliente]
+            for campo in ["telefono", "direccion", "comuna", "correo"]:
+                if campo in df.columns:
+                    if campo == "telefono":
+                        val = ie.limpiar_nan(row.get(campo), es_telefono=True)
+                    else:
+                        val = ie.limpiar_nan(row.get(campo))
+                    if not val and campo in info:
+                        row[campo] = info[campo]
+                    else:
+                        row[campo] = val
+        else:
+            for campo in ["telefono", "direccion", "comuna", "correo"]:
+                if campo in df.columns:
+                    row[campo] = ie.limpiar_nan(
+                        row.get(campo),
+                        es_telefono=(campo == "telefono")
+                    )
+
+        for campo_texto in [
+            "canal_venta", "numero_pedido", "forma_pago",
+            "tipo_documento", "despacho", "estado", "producto"
+        ]:
+            if campo_texto in df.columns:
+                row[campo_texto] = ie.limpiar_nan(row.get(campo_texto))
+
+        cleaned_rows.append(row)
+
+    cleaned_df = pd.DataFrame(cleaned_rows)
+    return cleaned_df
+
+
+def _hojas_aleatorias(n_hojas: int = 30):
+    """
+    Hojas pequeñas con casos raros para comparar las dos limpiezas: columnas
+    que faltan, clientes vacíos o con espacios, teléfonos como número, en
+    notación científica o con símbolos, y textos "nan".
+    """
+    import random
+
+    import numpy as np
+    import pandas as pd
+
+    telefonos = [np.nan, None, "", 912345678.0, "9 1234-5678", "9.5e+08", "1e+5.0.0",
+                 " 56,9 ", "nan", "NaN", "1e+400", "abc e-x", 5.0, "12.0", pd.NaT]
+    textos = [np.nan, None, "", " x ", "Ñuñoa", "nan", 3.0, "  ", 7, "e+"]
+    clientes = [np.nan, "", " ", "Ana", " Ana ", "Pedro", "Juan", np.nan, np.nan, 3.0]
+
+    for semilla in range(n_hojas):
+        rng = random.Random(semilla)
+        n = rng.randint(0, 60)
+
+        def columna(valores):
+            return [rng.choice(valores) for _ in range(n)]
+
+        fechas = [pd.Timestamp("2025-01-01") + pd.Timedelta(days=d) for d in range(10)] + [pd.NaT]
+        df = pd.DataFrame({
+            "fecha": columna(fechas),
+            "numero_pedido": columna([np.nan, 1.0, "A2", " "]),
+            "cliente": columna(clientes),
+            "telefono": columna(telefonos),
+            "comuna": columna(textos),
+            "correo": columna(textos),
+            "producto": columna(textos),
+            "unidades": columna([np.nan, 1.0, 2.0]),
+        })
+        if semilla % 5 == 0:
+            df = df.drop(columns=["cliente"])
+        if semilla % 7 == 0:
+            df = df.drop(columns=["telefono", "fecha"])
+        yield df
+
+
+def bench_limpiar_dataframe():
+    """Limpieza del Excel: iterrows fila por fila vs. operaciones por columna."""
+    import pandas as pd
+    from import_excel import COLUMNAS_EXCEL, limpiar_dataframe
+
+    # Mismo resultado en hojas con casos raros (no se mide tiempo)
+    distintas = 0
+    for i, hoja in enumerate(_hojas_aleatorias()):
+        try:
+            pd.testing.assert_frame_equal(
+                _limpiar_dataframe_por_fila(hoja), limpiar_dataframe(hoja), check_exact=True
+            )
+        except AssertionError:
+            distintas += 1
+            print(f"Hoja aleatoria {i}: DISTINTO")
+    print(f"Hojas aleatorias con casos raros: {distintas} distintas")
+
+    ruta = os.path.join(os.path.dirname(os.path.abspath(__file__)), "utem.proyecto sercotec.xlsx")
+    muestra = pd.read_excel(ruta, header=1).rename(columns=COLUMNAS_EXCEL)
+
+    print("limpiar_dataframe (hoja de ejemplo repetida)")
+    print(f"{'filas':>10} {'iterrows':>10} {'columnas':>10}  resultado")
+    for n in (1_000, 10_000, 100_000):
+        veces = n // len(muestra) + 1
+        df = pd.concat([muestra] * veces, ignore_index=True).iloc[:n]
+        anterior, t_fila = medir(_limpiar_dataframe_por_fila, df)
+        nuevo, t_col = medir(limpiar_dataframe, df)
+        try:
+            pd.testing.assert_frame_equal(anterior, nuevo, check_exact=True)
+            igual = "idéntico"
+        except AssertionError:
+            igual = "DISTINTO"
+        print(f"{n:>10} {t_fila:>9.2f}s {t_col:>9.3f}s  {igual}")
+
+
+def _importar_excel_por_fila(session, df) -> None:
+    """
+    Referencia: el bucle anterior de import_excel.importar_excel, con una
+    consulta por cliente y por pedido y un flush por registro nuevo.
+    """
+    import pandas as pd
+    import import_excel as ie
+
+    for _, row in df.iterrows():
+        cliente_nombre = ie.limpiar_nan(row.get("cliente"))
+        producto_nombre = ie.limpiar_nan(row.get("producto"))
+
+        if not cliente_nombre and not producto_nombre:
+            continue
+
+        if pd.isna(row.get("fecha")):
+            continue
+
+        cliente = (
+            session.query(Cliente)
+            .filter(Cliente.nombre == cliente_nombre)
+            .first()
+        )
+
+        tel = ie.limpiar_nan(row.get("telefono"), es_telefono=True)
+        cor = ie.limpiar_nan(row.get("correo"))
+        dir_ = ie.limpiar_nan(row.get("direccion"))
+        com = ie.limpiar_nan(row.get("comuna"))
+
+        if not cliente:
+            cliente = Cliente(
+                nombre=cliente_nombre,
+                telefono=tel,
+                correo=cor,
+                direccion=dir_,
+                comuna=com,
+            )
+            session.add(cliente)
+            session.flush()
+        else:
+            if tel:
+                cliente.telefono = tel
+            if cor:
+                cliente.correo = cor
+            if dir_:
+                cliente.direccion = dir_
+            if com:
+                cliente.comuna = com
+
+        fecha_pedido = pd.to_datetime(row.get("fecha")).to_pydatetime()
+
+        numero_pedido = ie.limpiar_nan(row.get("numero_pedido"))
+        if not numero_pedido:
+            continue
+
+        pedido = (
+            session.query(Pedido)
+            .filter(Pedido.numero_pedido == numero_pedido)
+            .first()
+        )
+
+        if not pedido:
+            pedido = Pedido(
+                numero_pedido=numero_pedido,
+                fecha_pedido=fecha_pedido,
+                canal_venta=ie.limpiar_nan(row.get("canal_venta")),
+                forma_pago=ie.limpiar_nan(row.get("forma_pago")),
+                tipo_documento=ie.limpiar_nan(row.get("tipo_documento")),
+                monto_pagado=ie.a_entero_o_cero(row.get("pago")),
+                saldo=ie.a_entero_o_cero(row.get("saldo")),
+                estado=ie.limpiar_nan(row.get("estado")),
+                cliente_id=cliente.id,
+            )
+            session.add(pedido)
+            session.flush()
+        else:
+            if not pedido.canal_venta:
+                pedido.canal_venta = ie.limpiar_nan(row.get("canal_venta"))
+            if not pedido.forma_pago:
+                pedido.forma_pago = ie.limpiar_nan(row.get("forma_pago"))
+            if not pedido.tipo_documento:
+                pedido.tipo_documento = ie.limpiar_nan(row.get("tipo_documento"))
+
+        if not producto_nombre:
+            continue
+
+        unidades = ie.a_entero_o_cero(row.get("unidades"))
+        if unidades <= 0:
+            unidades = 1
+
+        item = ItemPedido(
+            producto=producto_nombre,
+            cantidad=unidades,
+            precio_unitario=None,
+            total_item=None,
+            pedido_id=pedido.id,
+        )
+        session.add(item)
+
+    session.commit()
+
+
+def bench_importar_excel():
+    """Importación de Excel: consultas y flush por fila vs. diccionarios y lotes."""
+    import import_excel
+
+    print("Importar Excel (solo la parte de BD; el Excel se lee y limpia aparte)")
+    print(f"{'filas':>10} {'leer+limpiar':>13} {'por fila':>10} {'en lotes':>10}  resultado")
+    for n in (5_000, 50_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            ruta_excel = os.path.join(carpeta, "ventas.xlsx")
+            crear_excel_ventas(ruta_excel, n)
+            df, t_leer = medir(import_excel.leer_excel, ruta_excel)
+
+            tiempos, conteos = [], []
+            for modo in ("fila", "lotes"):
+                engine, Session = crear_bd_temporal(carpeta, f"{modo}.db")
+                if modo == "fila":
+                    session = Session()
+                    try:
+                        _, seg = medir(_importar_excel_por_fila, session, df)
+                    finally:
+                        session.close()
+                else:
+                    sesion_original = import_excel.SessionLocal
+                    import_excel.SessionLocal = Session
+                    try:
+                        _, seg = medir(import_excel.importar_dataframe, df)
+                    finally:
+                        import_excel.SessionLocal = sesion_original
+                with engine.connect() as conn:
+                    conteos.append(tuple(
+                        conn.exec_driver_sql(f"SELECT count(*) FROM {t}").scalar()
+                        for t in ("clientes", "pedidos", "items_pedido")
+                    ))
+                engine.dispose()
+                tiempos.append(seg)
+
+            igual = "iguales" if conteos[0] == conteos[1] else f"DISTINTOS {conteos}"
+            print(f"{n:>10} {t_leer:>12.2f}s {tiempos[0]:>9.2f}s {tiempos[1]:>9.2f}s  {igual}")
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_leer_excel():
+    """Lectura del Excel: dos pd.read_excel (buscar encabezado + datos) vs. uno."""
+    import pandas as pd
+    from import_excel import COLUMNAS_EXCEL, leer_excel, limpiar_dataframe
+
+    def leer_dos_veces(ruta):
+        # Patrón anterior de importar_excel
+        df_raw = pd.read_excel(ruta, header=None)
+        fila = df_raw.index[df_raw.iloc[:, 0] == "FECHA"].tolist()[0]
+        df = pd.read_excel(ruta, header=fila).rename(columns=COLUMNAS_EXCEL)
+        return limpiar_dataframe(df)
+
+    print("Leer Excel de ventas")
+    print(f"{'filas':>10} {'2 lecturas':>11} {'1 lectura':>10}  resultado")
+    for n in (10_000, 50_000, 100_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            ruta = os.path.join(carpeta, "ventas.xlsx")
+            crear_excel_ventas(ruta, n)
+            anterior, t_dos = medir(leer_dos_veces, ruta)
+            nuevo, t_uno = medir(leer_excel, ruta)
+            try:
+                pd.testing.assert_frame_equal(anterior, nuevo, check_exact=True)
+                igual = "idéntico"
+            except AssertionError:
+                igual = "DISTINTO"
+            print(f"{n:>10} {t_dos:>10.2f}s {t_uno:>9.2f}s  {igual}")
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_importar_excel_streaming():
+    """Importación de Excel completa: DataFrame entero vs. por partes (memoria y tiempo)."""
+    import tracemalloc
+    import import_excel
+
+    print("Importar Excel: archivo entero vs. streaming por partes (pico de memoria Python)")
+    print(f"{'filas':>10} {'entero':>20} {'streaming':>20}  resultado")
+    for n in (10_000, 50_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            ruta_excel = os.path.join(carpeta, "ventas.xlsx")
+            crear_excel_ventas(ruta_excel, n)
+
+            celdas, conteos = [], []
+            for fn in (import_excel.importar_excel, import_excel.importar_excel_streaming):
+                _, Session = crear_bd_temporal(carpeta, f"{fn.__name__}.db")
+                sesion_original = import_excel.SessionLocal
+                import_excel.SessionLocal = Session
+                tracemalloc.start()
+                try:
+                    res, seg = medir(fn, ruta_excel)
+                    _, pico = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                    import_excel.SessionLocal = sesion_original
+                celdas.append(f"{pico / 2**20:7.1f} MB / {seg:5.1f} s")
+                conteos.append(res)
+
+            igual = "iguales" if conteos[0] == conteos[1] else f"DISTINTOS {conteos}"
+            print(f"{n:>10} {celdas[0]:>20} {celdas[1]:>20}  {igual}")
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_snapshots():
+    """Respaldo: bytes escritos en la carpeta sincronizada, copia completa vs. snapshot."""
+    import sqlite3
+    import snapshots
+
+    print("Respaldo tras cambios pequeños (bytes que tendría que subir OneDrive)")
+    print(f"{'pedidos':>10} {'tamaño BD':>10} {'copia completa':>15} {'snapshot':>10}")
+    for n in (10_000, 50_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine, _ = crear_bd_temporal(carpeta)
+            poblar(engine, n)
+            engine.dispose()
+            ruta = os.path.join(carpeta, "bench.db")
+            almacen = os.path.join(carpeta, "snapshots")
+            snapshots.crear_snapshot(ruta, almacen)
+
+            # Un día de trabajo típico: algunos pedidos nuevos y cambios de estado
+            conn = sqlite3.connect(ruta)
+            for i in range(20):
+                conn.execute(
+                    "INSERT INTO pedidos (numero_pedido, fecha_pedido, estado, cliente_id) "
+                    "VALUES (?, datetime('now'), 'Pendiente', 1)", (f"N{i}",)
+                )
+            conn.execute("UPDATE pedidos SET estado = 'Entregado' WHERE id % 997 = 0")
+            conn.commit()
+            conn.close()
+
+            res = snapshots.crear_snapshot(ruta, almacen)
+            tam = os.path.getsize(ruta) / 2**20
+            print(f"{n:>10} {tam:>8.1f}MB {tam:>13.1f}MB {res['bytes_nuevos'] / 2**20:>8.2f}MB")
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_respaldo_comprimido():
+    """Respaldo: copia simple vs. archivo .db.xz (tamaño y tiempo)."""
+    import backup
+
+    print("Respaldo completo: copia simple vs. comprimido (xz)")
+    print(f"{'pedidos':>10} {'copia':>8} {'xz':>8} {'t copia':>9} {'t xz':>8} {'t restaurar':>12}")
+    for n in (10_000, 50_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine, _ = crear_bd_temporal(carpeta)
+            poblar(engine, n)
+            engine.dispose()
+            ruta = os.path.join(carpeta, "bench.db")
+            copia = os.path.join(carpeta, "copia.db")
+            comprimido = os.path.join(carpeta, "copia.db.xz")
+
+            _, t_copia = medir(backup.copiar_bd, ruta, copia)
+            _, t_xz = medir(backup.comprimir_bd, copia, comprimido)
+            _, t_restaurar = medir(
+                backup.descomprimir_bd, comprimido, os.path.join(carpeta, "restaurada.db")
+            )
+            print(
+                f"{n:>10} {os.path.getsize(copia) / 2**20:>6.1f}MB "
+                f"{os.path.getsize(comprimido) / 2**20:>6.1f}MB "
+                f"{t_copia:>8.2f}s {t_copia + t_xz:>7.2f}s {t_restaurar:>11.2f}s"
+            )
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_pragmas():
+    """PRAGMA de SQLite: valores por defecto vs. WAL + synchronous=NORMAL + caché/mmap."""
+    from repository import listar_pedidos
+
+    n_commits = 300
+    n_paginas = 200
+    print(f"Commits pequeños ({n_commits}, como guardar ítems) y lectura de {n_paginas} páginas de 100 pedidos")
+    print(f"{'PRAGMA':>12} {'ms/commit':>10} {'páginas/s':>10}")
+    for etiqueta, pragmas in (("por defecto", None), ("config", PRAGMAS_SQLITE_DEFECTO)):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine, Session = crear_bd_temporal(carpeta, pragmas=pragmas)
+            poblar(engine, 50_000)
+
+            t0 = time.perf_counter()
+            for i in range(n_commits):
+                with Session() as s:
+                    pedido = s.get(Pedido, i + 1)
+                    s.add(ItemPedido(producto="Tabla", cantidad=1, precio_unitario=1000,
+                                     total_item=1000, pedido=pedido))
+                    pedido.saldo = 0
+                    s.commit()
+            ms_commit = (time.perf_counter() - t0) / n_commits * 1000
+
+            t0 = time.perf_counter()
+            with Session() as s:
+                for pagina in range(n_paginas):
+                    listar_pedidos(s, offset=pagina * 100, limite=100)
+            paginas_s = n_paginas / (time.perf_counter() - t0)
+
+            print(f"{etiqueta:>12} {ms_commit:>10.2f} {paginas_s:>10.0f}")
+            engine.dispose()
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_monto_total():
+    """Monto de cada pedido: sumar los ítems en cada consulta vs. leer pedidos.monto_total."""
+
+    def monto_por_items():
+        # Patrón anterior de listar_pedidos: subconsulta correlacionada
+        return (
+            select(func.coalesce(func.sum(
+                cast(func.coalesce(ItemPedido.cantidad, 0), Integer)
+                * cast(func.coalesce(ItemPedido.precio_unitario, 0), Integer)
+            ), 0))
+            .where(ItemPedido.pedido_id == Pedido.id)
+            .scalar_subquery()
+        )
+
+    def listar(session, monto):
+        stmt = select(Pedido.id, monto).order_by(Pedido.fecha_pedido.desc(), Pedido.id.desc())
+        return session.execute(stmt).all()
+
+    print("Listado completo con monto (segundos) y costo de mantener la columna")
+    print(f"{'pedidos':>10} {'suma ítems':>11} {'columna':>9} {'iguales':>8} {'ms/commit ítem':>15}")
+    for n in (10_000, 100_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine, Session = crear_bd_temporal(carpeta, pragmas=PRAGMAS_SQLITE_DEFECTO)
+            poblar(engine, n)
+
+            with Session() as s:
+                por_items, seg_items = medir(listar, s, monto_por_items())
+                por_columna, seg_columna = medir(listar, s, Pedido.monto_total)
+
+            # Guardar ítems ahora también actualiza el pedido (triggers)
+            n_commits = 200
+            t0 = time.perf_counter()
+            for i in range(n_commits):
+                with Session() as s:
+                    s.add(ItemPedido(producto="Tabla", cantidad=2, precio_unitario=1000,
+                                     total_item=2000, pedido_id=i + 1))
+                    s.commit()
+            ms_commit = (time.perf_counter() - t0) / n_commits * 1000
+
+            print(f"{n:>10} {seg_items:>11.3f} {seg_columna:>9.3f} "
+                  f"{str(por_items == por_columna):>8} {ms_commit:>15.2f}")
+            engine.dispose()
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_historial_cliente():
+    """Historial de un cliente mayorista: cargar todo y sumar ítems vs. resumen + primera página."""
+    from repository import listar_pedidos, resumen_por_cliente
+
+    def carga_anterior(session):
+        # Patrón anterior de HistorialClienteDialog.cargar
+        pedidos = session.query(Pedido).filter(Pedido.cliente_id == 1).order_by(Pedido.fecha_pedido.desc()).all()
+        total = saldo = 0
+        for p in pedidos:
+            monto = sum(int(it.cantidad or 0) * int(it.precio_unitario or 0) for it in p.items)
+            total += monto
+            saldo += p.saldo if p.saldo is not None else max(monto - (p.monto_pagado or 0), 0)
+        return len(pedidos), total, saldo
+
+    def carga_resumen(session):
+        listar_pedidos(session, cliente_id=1, limite=200)
+        r = resumen_por_cliente(session, [1])[1]
+        return r["n_pedidos"], r["monto_total"], r["saldo_pendiente"]
+
+    print("Abrir el historial de un cliente (consultas SQL / segundos)")
+    print(f"{'pedidos':>10} {'anterior':>22} {'resumen':>22} {'iguales':>8}")
+    for n in (1_000, 10_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine, Session = crear_bd_temporal(carpeta, pragmas=PRAGMAS_SQLITE_DEFECTO)
+            # Pocos clientes: el cliente 1 queda con n / 5 pedidos
+            poblar(engine, n * 5, n_clientes=5)
+            contador = ContadorConsultas(engine)
+
+            columnas = []
+            for fn in (carga_anterior, carga_resumen):
+                session = Session()
+                contador.total = 0
+                try:
+                    res, seg = medir(fn, session)
+                finally:
+                    session.close()
+                columnas.append((res, f"{contador.total:>8} q / {seg:7.3f} s"))
+
+            iguales = columnas[0][0] == columnas[1][0]
+            print(f"{n:>10} {columnas[0][1]:>22} {columnas[1][1]:>22} {str(iguales):>8}")
+            engine.dispose()
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+def bench_numero_pedido():
+    """N° de pedido: buscar el último con LIKE vs. secuencia por día (secuencias_pedido)."""
+    from sqlalchemy.exc import SQLAlchemyError
+    from numeracion import formatear_numero_pedido, siguiente_numero_pedido
+
+    def numero_like(session, fecha):
+        # Patrón anterior de generar_numero_pedido_db: se lee el último y se suma 1
+        prefijo = "P" + fecha.strftime("%Y%m%d")
+        ultimo = (
+            session.query(Pedido)
+            .filter(Pedido.numero_pedido.like(f"{prefijo}-%"))
+            .order_by(Pedido.numero_pedido.desc())
+            .first()
+        )
+        correlativo = int(ultimo.numero_pedido.split("-")[-1]) + 1 if ultimo else 1
+        return formatear_numero_pedido(fecha, correlativo)
+
+    def crear_pedidos(Session, generar, n, fallidos):
+        fecha = datetime(2025, 1, 1)
+        for _ in range(n):
+            session = Session()
+            try:
+                session.add(Pedido(numero_pedido=generar(session, fecha), fecha_pedido=fecha,
+                                   cliente_id=1))
+                session.commit()
+            except SQLAlchemyError:
+                session.rollback()
+                fallidos.append(1)
+            finally:
+                session.close()
+
+    n_pedidos = 200
+    print(f"Crear {n_pedidos} pedidos del mismo día (ms por pedido) y {n_pedidos} más desde 2 hilos a la vez")
+    print(f"{'pedidos':>10} {'método':>10} {'ms/pedido':>10} {'choques':>8}")
+    for n in (10_000, 100_000):
+        for etiqueta, generar in (("LIKE", numero_like), ("secuencia", siguiente_numero_pedido)):
+            carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+            try:
+                engine, Session = crear_bd_temporal(carpeta, pragmas=PRAGMAS_SQLITE_DEFECTO)
+                poblar(engine, n)
+
+                fallidos: list = []
+                _, seg = medir(crear_pedidos, Session, generar, n_pedidos, fallidos)
+
+                # Dos ventanas guardando a la vez: cada choque es un pedido que no se guardó
+                hilos = [
+                    threading.Thread(target=crear_pedidos, args=(Session, generar, n_pedidos // 2, fallidos))
+                    for _ in range(2)
+                ]
+                for h in hilos:
+                    h.start()
+                for h in hilos:
+                    h.join()
+
+                print(f"{n:>10} {etiqueta:>10} {seg / n_pedidos * 1000:>10.2f} {len(fallidos):>8}")
+                engine.dispose()
+            finally:
+                shutil.rmtree(carpeta, ignore_errors=True)
+
+def bench_cache_clientes():
+    """Revisar el RUT al guardar y pasar de página en Clientes: consulta a la BD vs. cache_clientes."""
+    from cache_clientes import CacheClientes, COLUMNAS_CLIENTE
+
+    def ruts_bd(Session, claves):
+        # Patrón de buscar_por_rut sin caché: una consulta por RUT revisado
+        session = Session()
+        try:
+            return [
+                session.execute(
+                    select(Cliente.id).where(Cliente.rut_normalizado == clave)
+                ).first() is not None
+                for clave in claves
+            ]
+        finally:
+            session.close()
+
+    def ruts_cache(Session, cache, claves):
+        session = Session()
+        try:
+            return [cache.por_rut(session, clave) is not None for clave in claves]
+        finally:
+            session.close()
+
+    def pagina_bd(Session, offset):
+        session = Session()
+        try:
+            return session.execute(
+                select(*COLUMNAS_CLIENTE).order_by(Cliente.id).offset(offset).limit(200)
+            ).all()
+        finally:
+            session.close()
+
+    def pagina_cache(Session, cache, offset):
+        session = Session()
+        try:
+            return cache.pagina(session, offset, 200)
+        finally:
+            session.close()
+
+    print("Clientes: 200 RUT revisados y una página de 200 al final de la lista (ms)")
+    print(f"{'clientes':>10} {'RUT BD':>10} {'RUT caché':>10} {'pág. BD':>10} {'pág. caché':>11} {'carga':>10}")
+    for n in (10_000, 100_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine, Session = crear_bd_temporal(carpeta)
+            poblar(engine, n, n_clientes=n)
+            cache = CacheClientes()
+            # Mitad existentes, mitad nuevos (como al importar o crear clientes)
+            claves = [f"{10_000_000 + i}{i % 10}" for i in range(0, n, n // 100)]
+            claves += [f"{90_000_000 + i}{i % 10}" for i in range(100)]
+            offset = n - 200
+
+            session = Session()
+            try:
+                _, seg_carga = medir(cache.cargar, session)
+            finally:
+                session.close()
+            r_bd, seg_rut_bd = medir(ruts_bd, Session, claves)
+            ruts_cache(Session, cache, claves)  # arma el índice por RUT
+            r_cache, seg_rut_cache = medir(ruts_cache, Session, cache, claves)
+            p_bd, seg_pag_bd = medir(pagina_bd, Session, offset)
+            p_cache, seg_pag_cache = medir(pagina_cache, Session, cache, offset)
+            assert r_bd == r_cache and [tuple(f) for f in p_bd] == [tuple(f) for f in p_cache]
+            print(f"{n:>10} {seg_rut_bd * 1000:>10.1f} {seg_rut_cache * 1000:>10.3f} "
+                  f"{seg_pag_bd * 1000:>10.2f} {seg_pag_cache * 1000:>11.3f} {seg_carga * 1000:>10.1f}")
+            engine.dispose()
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+def bench_selector_clientes():
+    """Cliente del pedido: cargar todos en el combo vs. buscar las primeras 20 coincidencias al escribir."""
+    from repository import sugerencias_clientes
+
+    def opciones_todas(Session):
+        # Patrón anterior: al abrir el formulario se leían todos los clientes por nombre
+        session = Session()
+        try:
+            return [
+                (cid, f"{nombre} ({telefono})" if telefono else nombre)
+                for cid, nombre, telefono in session.execute(
+                    select(Cliente.id, Cliente.nombre, Cliente.telefono).order_by(Cliente.nombre)
+                )
+            ]
+        finally:
+            session.close()
+
+    def sugerencias(Session, texto):
+        session = Session()
+        try:
+            return sugerencias_clientes(session, texto, 20)
+        finally:
+            session.close()
+
+    textos = ("an", "maria gonz", "nunoa", "12.345")
+    print("Abrir el formulario: todos los clientes vs. una búsqueda de 20 al escribir (ms)")
+    print(f"{'clientes':>10} {'todos':>10} " + " ".join(f"{t!r:>12}" for t in textos))
+    for n in (10_000, 100_000):
+        carpeta = tempfile.mkdtemp(prefix="crm_bench_")
+        try:
+            engine, Session = crear_bd_temporal(carpeta)
+            poblar(engine, n, items_por_pedido=1, n_clientes=n)
+
+            _, seg_todos = medir(opciones_todas, Session)
+            segs = [medir(sugerencias, Session, t)[1] for t in textos]
+            print(f"{n:>10} {seg_todos * 1000:>10.1f} " + " ".join(f"{s * 1000:>12.1f}" for s in segs))
+            engine.dispose()
+        finally:
+            shutil.rmtree(carpeta, ignore_errors=True)
+
+
+BENCHMARKS = {
+    "listado_pedidos": bench_listado_pedidos,
+    "busqueda_clientes": bench_busqueda_clientes,
+    "importar_respaldo": bench_importar_respaldo,
+    "limpiar_dataframe": bench_limpiar_dataframe,
+    "importar_excel": bench_importar_excel,
+    "leer_excel": bench_leer_excel,
+    "importar_excel_streaming": bench_importar_excel_streaming,
+    "snapshots": bench_snapshots,
+    "respaldo_comprimido": bench_respaldo_comprimido,
+    "pragmas": bench_pragmas,
+    "monto_total": bench_monto_total,
+    "historial_cliente": bench_historial_cliente,
+    "numero_pedido": bench_numero_pedido,
+    "cache_clientes": bench_cache_clientes,
+    "selector_clientes": bench_selector_clientes,
+}
+
+
+if __name__ == "__main__":
+    nombres = sys.argv[1:] or list(BENCHMARKS)
+    for nombre in nombres:
+        if nombre not in BENCHMARKS:
+            raise SystemExit(f"Benchmark desconocido: {nombre}. Opciones: {', '.join(BENCHMARKS)}")
+        BENCHMARKS[nombre]()
+        print()
@@ -0,0 +1,308 @@
+# busqueda.py
+"""
+Índice de texto completo (SQLite FTS5) para buscar clientes.
+
+- clientes_fts: nombre, RUT, teléfono, correo, dirección y comuna
+  (rowid = clientes.id).
+- productos_fts: nombre de producto de cada ítem, con el cliente del
+  pedido (rowid = items_pedido.id).
+
+Ambas tablas se mantienen al día con triggers de SQLite, así que no importa
+si los datos entran por el ORM, por importar_excel o por SQL directo.
+
+El tokenizador unicode61 con remove_diacritics ignora tildes y eñes:
+"nunoa" encuentra "Ñuñoa". Cada palabra buscada se trata como prefijo.
+"""
+import re
+import unicodedata
+
+from sqlalchemy import (
+    Column, Float, Integer, MetaData, String, Table, func, literal, select, union_all
+)
+from sqlalchemy.orm import Session
+
+TOKENIZADOR = "unicode61 remove_diacritics 2"
+
+# Sobre este número de coincidencias no se ordena por relevancia (bm25)
+UMBRAL_RANKING = 1000
+
+# RUT sin puntos ni guion, para que se indexe como una sola palabra
+_RUT_SQL = "upper(replace(replace(trim({col}), '.', ''), '-', ''))"
+
+SENTENCIAS_FTS = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS clientes_fts USING fts5(
+        nombre, rut, telefono, correo, direccion, comuna,
+        tokenize = '{TOKENIZADOR}'
+    )
+    """,
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS productos_fts USING fts5(
+        producto, cliente_id UNINDEXED,
+        tokenize = '{TOKENIZADOR}'
+    )
+    """,
+    # ---- clientes ----
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_ai AFTER INSERT ON clientes BEGIN
+        INSERT INTO clientes_fts (rowid, nombre, rut, telefono, correo, direccion, comuna)
+        VALUES (new.id, new.nombre, {_RUT_SQL.format(col="new.rut")},
+                new.telefono, new.correo, new.direccion, new.comuna);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_au AFTER UPDATE ON clientes BEGIN
+        DELETE FROM clientes_fts WHERE rowid = old.id;
+        INSERT INTO clientes_fts (rowid, nombre, rut, telefono, correo, direccion, comuna)
+        VALUES (new.id, new.nombre, {_RUT_SQL.format(col="new.rut")},
+                new.telefono, new.correo, new.direccion, new.comuna);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS clientes_fts_ad AFTER DELETE ON clientes BEGIN
+        DELETE FROM clientes_fts WHERE rowid = old.id;
+    END
+    """,
+    # ---- ítems de pedido ----
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_ai AFTER INSERT ON items_pedido BEGIN
+        INSERT INTO productos_fts (rowid, producto, cliente_id)
+        SELECT new.id, new.producto, p.cliente_id FROM pedidos p WHERE p.id = new.pedido_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_au
+    AFTER UPDATE OF producto, pedido_id ON items_pedido BEGIN
+        DELETE FROM productos_fts WHERE rowid = old.id;
+        INSERT INTO productos_fts (rowid, producto, cliente_id)
+        SELECT new.id, new.producto, p.cliente_id FROM pedidos p WHERE p.id = new.pedido_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_ad AFTER DELETE ON items_pedido BEGIN
+        DELETE FROM productos_fts WHERE rowid = old.id;
+    END
+    """,
+    # ---- pedido que cambia de cliente ----
+    """
+    CREATE TRIGGER IF NOT EXISTS productos_fts_pedido_au
+    AFTER UPDATE OF cliente_id ON pedidos BEGIN
+        UPDATE productos_fts SET cliente_id = new.cliente_id
+        WHERE rowid IN (SELECT id FROM items_pedido WHERE pedido_id = new.id);
+    END
+    """,
+]
+
+_POBLAR_FTS = [
+    "DELETE FROM clientes_fts",
+    f"""
+    INSERT INTO clientes_fts (rowid, nombre, rut, telefono, correo, direccion, comuna)
+    SELECT id, nombre, {_RUT_SQL.format(col="rut")}, telefono, correo, direccion, comuna
+    FROM clientes
+    """,
+    "DELETE FROM productos_fts",
+    """
+    INSERT INTO productos_fts (rowid, producto, cliente_id)
+    SELECT i.id, i.producto, p.cliente_id
+    FROM items_pedido i JOIN pedidos p ON p.id = i.pedido_id
+    """,
+]
+
+
+def crear_indice_busqueda(conn) -> None:
+    """
+    Crea las tablas FTS5 y sus triggers si no existen. Si el índice es
+    nuevo (BD antigua), lo llena con los datos actuales.
+
+    conn: conexión SQLAlchemy dentro de una transacción (engine.begin()).
+    """
+    existia = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'clientes_fts'"
+    ).first() is not None
+
+    for sql in SENTENCIAS_FTS:
+        conn.exec_driver_sql(sql)
+
+    if not existia:
+        for sql in _POBLAR_FTS:
+            conn.exec_driver_sql(sql)
+
+
+# ============================================
+#  Consultas
+# ============================================
+
+_meta_fts = MetaData()
+
+clientes_fts = Table(
+    "clientes_fts", _meta_fts,
+    Column("rowid", Integer),
+    Column("clientes_fts", String),
+    Column("rank", Float),
+)
+
+productos_fts = Table(
+    "productos_fts", _meta_fts,
+    Column("rowid", Integer),
+    Column("cliente_id", Integer),
+    Column("productos_fts", String),
+    Column("rank", Float),
+)
+
+_RE_PALABRA = re.compile(r"\w+")
+_RE_RUT = re.compile(r"^[0-9.\-]+[0-9kK]$")
+
+
+def _palabras(texto: str | None) -> list[str]:
+    palabras = []
+    for parte in (texto or "").split():
+        if _RE_RUT.match(parte):
+            parte = parte.replace(".", "").replace("-", "")
+        palabras.extend(_RE_PALABRA.findall(parte))
+    return palabras
+
+
+def consulta_fts(texto: str) -> str | None:
+    """
+    Convierte lo que escribe el usuario en una consulta FTS5:
+    cada palabra se busca como prefijo y todas deben aparecer.
+    Los RUT se buscan sin puntos ni guion ("12.345.678-5" → 123456785*).
+
+    Devuelve None si el texto no tiene palabras buscables.
+    """
+    palabras = _palabras(texto)
+    if not palabras:
+        return None
+    return " ".join(f'"{p}"*' for p in palabras)
+
+
+# ============================================
+#  Lo mismo en memoria (para refinar resultados ya cargados)
+# ============================================
+
+def plegar(texto: str | None) -> str:
+    """Minúsculas y sin tildes, como el tokenizador: "Ñuñoa" → "nunoa"."""
+    descompuesto = unicodedata.normalize("NFKD", (texto or "").lower())
+    return "".join(c for c in descompuesto if not unicodedata.combining(c))
+
+
+def palabras_busqueda(texto: str | None) -> list[str]:
+    """Las palabras de consulta_fts, plegadas."""
+    return [plegar(p) for p in _palabras(texto)]
+
+
+def tokens_busqueda(*campos: str | None, rut: str | None = None) -> frozenset[str]:
+    """
+    Palabras plegadas de los campos, tal como quedan en el índice FTS5
+    (el RUT sin puntos ni guion). Se calculan una vez al cargar cada fila.
+    """
+    tokens = set()
+    for campo in campos:
+        tokens.update(_RE_PALABRA.findall(plegar(campo)))
+    if rut:
+        tokens.update(_RE_PALABRA.findall(plegar(rut.strip().replace(".", "").replace("-", ""))))
+    return frozenset(tokens)
+
+
+def coincide(palabras: list[str], tokens: frozenset[str]) -> bool:
+    """True si cada palabra es prefijo de algún token (igual que la consulta FTS5)."""
+    return all(any(t.startswith(p) for t in tokens) for p in palabras)
+
+
+def es_refinamiento(anteriores: list[str], nuevas: list[str]) -> bool:
+    """
+    True si todo lo que calza con `nuevas` calza también con `anteriores`:
+    cada palabra anterior es prefijo de alguna nueva ("mar" → "maria",
+    "maria" → "maria nunoa").
+    """
+    return bool(anteriores) and all(
+        any(q.startswith(p) for q in nuevas) for p in anteriores
+    )
+
+
+def ids_clientes_coincidentes(consulta: str):
+    """Subconsulta: rowid (= clientes.id) de clientes cuyos datos calzan."""
+    return select(clientes_fts.c.rowid).where(
+        clientes_fts.c.clientes_fts.op("MATCH")(consulta)
+    )
+
+
+def es_consulta_amplia(session: Session, consulta: str) -> bool:
+    """
+    True si la consulta calza con más de UMBRAL_RANKING clientes.
+    Se corta en el LIMIT, así que cuesta lo mismo con 1.000 o 100.000
+    coincidencias. Para una misma consulta basta mirarlo una vez (p. ej.
+    con la primera página) y pasarlo a ids_clientes_por_relevancia.
+    """
+    muestra = ids_clientes_coincidentes(consulta).limit(UMBRAL_RANKING + 1).subquery()
+    return session.scalar(select(func.count()).select_from(muestra)) > UMBRAL_RANKING
+
+
+def ids_clientes_por_relevancia(
+    session: Session,
+    consulta: str,
+    incluir_productos: bool = True,
+    offset: int = 0,
+    limite: int | None = None,
+    amplia: bool | None = None,
+) -> list[int]:
+    """
+    Ids de clientes que calzan con la consulta FTS5, en orden de relevancia:
+    primero los que calzan por sus datos (bm25) y después los que solo
+    calzan por productos comprados (por id).
+
+    bm25 cuesta unos microsegundos por coincidencia. Si la consulta es muy
+    amplia (p. ej. "nunoa" con miles de clientes) el rank no aporta y se
+    ordena por id: así SQLite recorre el índice FTS en orden y se detiene
+    en el LIMIT.
+
+    amplia: resultado de es_consulta_amplia, si ya se calculó (si no, se
+    calcula aquí).
+    """
+    if amplia is None:
+        amplia = es_consulta_amplia(session, consulta)
+    if amplia:
+        rank = literal(0.0)
+    else:
+        rank = clientes_fts.c.rank
+
+    partes = [
+        select(
+            clientes_fts.c.rowid.label("id"),
+            literal(0).label("prioridad"),
+            rank.label("rank"),
+        ).where(clientes_fts.c.clientes_fts.op("MATCH")(consulta))
+    ]
+    if incluir_productos:
+        por_producto = (
+            select(productos_fts.c.cliente_id)
+            .where(productos_fts.c.productos_fts.op("MATCH")(consulta))
+            .distinct()
+            .subquery()
+        )
+        partes.append(
+            select(
+                por_producto.c.cliente_id.label("id"),
+                literal(1).label("prioridad"),
+                literal(0.0).label("rank"),
+            ).where(por_producto.c.cliente_id.not_in(ids_clientes_coincidentes(consulta)))
+        )
+
+    stmt = union_all(*partes).order_by("prioridad", "rank", "id")
+    if offset:
+        stmt = stmt.offset(offset)
+    if limite is not None:
+        stmt = stmt.limit(limite)
+    return list(session.scalars(stmt))
+
+
+def buscar_clientes(
+    session: Session, texto: str, limite: int = 50, incluir_productos: bool = True
+) -> list[int]:
+    """Devuelve los ids de clientes que calzan con el texto, por relevancia."""
+    consulta = consulta_fts(texto)
+    if consulta is None:
+        return []
+    return ids_clientes_por_relevancia(
+        session, consulta, incluir_productos, limite=limite
+    )
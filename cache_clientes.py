@@ -0,0 +1,212 @@
+# cache_clientes.py
+"""
+Clientes en memoria: id, nombre, RUT y datos de contacto.
+
+Se leen de una vez con la primera consulta que los necesita y después se
+mantienen al día con eventos de sesión de SQLAlchemy (db.SessionLocal):
+
+- after_flush anota los Cliente agregados, cambiados o borrados, y
+  do_orm_execute las escrituras en bloque sobre clientes (importar_excel).
+- after_commit aplica lo anotado: los borrados salen del caché, los demás
+  ids se vuelven a leer (por clave primaria) en la próxima consulta, y una
+  escritura en bloque vacía el caché entero.
+- after_rollback descarta lo anotado.
+
+Lo que escribe en clientes sin una sesión de db.SessionLocal (p. ej.
+importar_respaldo, que usa una conexión directa) debe llamar a
+cache_clientes.invalidar().
+
+Lo usan el hilo de la GUI y las consultas en segundo plano (ConsultaBD):
+los índices se cambian bajo un lock, pero la lectura de la BD se hace
+fuera de él para no frenar a la GUI.
+"""
+import threading
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from db import SessionLocal
+from models import Cliente, normalizar_rut
+
+# Columnas de cada fila en caché (Row de SQLAlchemy: fila.id, fila.nombre, ...)
+COLUMNAS_CLIENTE = (
+    Cliente.id, Cliente.nombre, Cliente.rut, Cliente.telefono,
+    Cliente.correo, Cliente.direccion, Cliente.comuna,
+)
+
+# Claves en session.info con lo anotado hasta el commit
+_CAMBIADOS = "cache_clientes_cambiados"   # {id: True si se borró}
+_TODOS = "cache_clientes_todos"           # escritura en bloque sobre clientes
+
+
+class CacheClientes:
+    def __init__(self) -> None:
+        self._bloqueo = threading.Lock()
+        self._por_id: dict | None = None          # None: sin cargar
+        # Índice por RUT normalizado: se arma la primera vez que se usa
+        self._por_rut: dict[str, int] | None = None
+        self._pendientes: set[int] = set()        # ids a releer de la BD
+        self._ids: list[int] | None = None        # ordenados por id
+        # Sube con cada cambio aplicado: una lectura que empezó antes no se guarda
+        self._version = 0
+
+    # ---------------- Al día con la BD ----------------
+
+    @property
+    def al_dia(self) -> bool:
+        """True si las consultas se responden sin leer la BD."""
+        return self._por_id is not None and not self._pendientes
+
+    def invalidar(self) -> None:
+        """Olvida todo: la próxima consulta vuelve a leer los clientes."""
+        with self._bloqueo:
+            self._version += 1
+            self._por_id = None
+            self._por_rut = None
+            self._pendientes = set()
+            self._ids = None
+
+    def aplicar_cambios(self, cambiados: dict[int, bool]) -> None:
+        """Quita los clientes borrados y marca los demás para releerlos."""
+        with self._bloqueo:
+            self._version += 1
+            if self._por_id is None:
+                return
+            for cliente_id, borrado in cambiados.items():
+                self._quitar(cliente_id)
+                if borrado:
+                    self._pendientes.discard(cliente_id)
+                else:
+                    self._pendientes.add(cliente_id)
+
+    def cargar(self, session: Session) -> None:
+        """Deja el caché al día (pensado para correr en segundo plano, con ConsultaBD)."""
+        self._preparar(session)
+
+    def _preparar(self, session: Session) -> None:
+        """Carga el caché o relee los pendientes, si hace falta."""
+        while True:
+            with self._bloqueo:
+                if self.al_dia:
+                    return
+                version = self._version
+                completo = self._por_id is None
+                pendientes = set(self._pendientes)
+
+            stmt = select(*COLUMNAS_CLIENTE)
+            if not completo:
+                stmt = stmt.where(Cliente.id.in_(pendientes))
+            filas = session.execute(stmt).all()
+
+            with self._bloqueo:
+                # Si hubo un commit mientras se leía, lo leído puede estar viejo
+                if version != self._version:
+                    continue
+                if completo:
+                    self._por_id = {}
+                    self._por_rut = None
+                else:
+                    for cliente_id in pendientes:
+                        self._quitar(cliente_id)
+                    self._pendientes -= pendientes
+                for fila in filas:
+                    self._agregar(fila)
+                return
+
+    def _agregar(self, fila) -> None:
+        self._por_id[fila.id] = fila
+        if self._por_rut is not None:
+            self._indexar_rut(fila)
+        self._ids = None
+
+    def _indexar_rut(self, fila) -> None:
+        rut = normalizar_rut(fila.rut)
+        if rut:
+            self._por_rut[rut] = fila.id
+
+    def _quitar(self, cliente_id: int) -> None:
+        fila = self._por_id.pop(cliente_id, None)
+        if fila is None:
+            return
+        if self._por_rut is not None:
+            rut = normalizar_rut(fila.rut)
+            if rut and self._por_rut.get(rut) == cliente_id:
+                del self._por_rut[rut]
+        self._ids = None
+
+    # ---------------- Consultas ----------------
+    # Devuelven Row de SQLAlchemy (inmutables): fila.id, fila.nombre, fila.rut,
+    # fila.telefono, fila.correo, fila.direccion, fila.comuna.
+    # La sesión solo se usa si el caché no está al día.
+
+    def varios(self, session: Session, ids: list[int]) -> list:
+        """Clientes de los ids indicados, en ese orden (omite los que no existen)."""
+        self._preparar(session)
+        with self._bloqueo:
+            return [self._por_id[i] for i in ids if i in self._por_id]
+
+    def por_rut(self, session: Session, rut: str | None):
+        """Cliente con ese RUT (sin importar puntos ni guion), o None."""
+        clave = normalizar_rut(rut)
+        if clave is None:
+            return None
+        self._preparar(session)
+        with self._bloqueo:
+            if self._por_rut is None:
+                self._por_rut = {}
+                for fila in self._por_id.values():
+                    self._indexar_rut(fila)
+            cliente_id = self._por_rut.get(clave)
+            return self._por_id.get(cliente_id) if cliente_id is not None else None
+
+    def pagina(self, session: Session, offset: int = 0, limite: int | None = None) -> list:
+        """Clientes ordenados por id, desde offset."""
+        self._preparar(session)
+        with self._bloqueo:
+            if self._ids is None:
+                self._ids = sorted(self._por_id)
+            fin = None if limite is None else offset + limite
+            return [self._por_id[i] for i in self._ids[offset:fin]]
+
+
+cache_clientes = CacheClientes()
+
+
+# ============================================
+#  Eventos de sesión
+# ============================================
+
+@event.listens_for(SessionLocal, "after_flush")
+def _anotar_flush(session, flush_context) -> None:
+    # En after_flush, new/dirty/deleted todavía muestran lo que se escribió
+    cambiados = session.info.setdefault(_CAMBIADOS, {})
+    for obj in session.new | session.dirty:
+        if isinstance(obj, Cliente):
+            cambiados.setdefault(obj.id, False)
+    for obj in session.deleted:
+        if isinstance(obj, Cliente):
+            cambiados[obj.id] = True
+
+
+@event.listens_for(SessionLocal, "do_orm_execute")
+def _anotar_en_bloque(estado) -> None:
+    if not (estado.is_insert or estado.is_update or estado.is_delete):
+        return
+    tabla = getattr(estado.statement, "table", None)
+    if tabla is not None and tabla.name == Cliente.__tablename__:
+        estado.session.info[_TODOS] = True
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _aplicar_commit(session) -> None:
+    cambiados = session.info.pop(_CAMBIADOS, None)
+    if session.info.pop(_TODOS, False):
+        cache_clientes.invalidar()
+    elif cambiados:
+        cache_clientes.aplicar_cambios(cambiados)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _descartar(session) -> None:
+    session.info.pop(_CAMBIADOS, None)
+    session.info.pop(_TODOS, False)
@@ -36,3 +36,75 @@ def get_backup_folder() -> str | None:
     """Devuelve la carpeta de backup configurada o None si no existe."""
     settings = load_settings()
     return settings.get("backup_folder")
+
+
+# Retención de snapshots de respaldo: se conserva el último de cada uno de
+# los últimos N días y de las últimas M semanas (ver snapshots.py)
+RETENCION_DIARIA_DEFECTO = 7
+RETENCION_SEMANAL_DEFECTO = 4
+
+
+def get_retencion_snapshots() -> tuple[int, int]:
+    """Devuelve (días, semanas) de retención de snapshots desde config.json."""
+    settings = load_settings()
+    dias = settings.get("snapshots_diarios", RETENCION_DIARIA_DEFECTO)
+    semanas = settings.get("snapshots_semanales", RETENCION_SEMANAL_DEFECTO)
+    return int(dias), int(semanas)
+
+
+# Formato de hacer_respaldo: "snapshots" (bloques deduplicados, ver
+# snapshots.py) o "comprimido" (un archivo .db.xz con checksum)
+FORMATOS_RESPALDO = ("snapshots", "comprimido")
+FORMATO_RESPALDO_DEFECTO = "snapshots"
+
+
+def get_formato_respaldo() -> str:
+    """Devuelve el formato de respaldo configurado en config.json."""
+    settings = load_settings()
+    formato = settings.get("formato_respaldo", FORMATO_RESPALDO_DEFECTO)
+    if formato not in FORMATOS_RESPALDO:
+        return FORMATO_RESPALDO_DEFECTO
+    return formato
+
+
+# Minutos entre respaldos automáticos mientras la app está abierta (0 = nunca)
+INTERVALO_RESPALDO_DEFECTO = 30
+
+
+def get_intervalo_respaldo() -> int:
+    """Devuelve el intervalo del respaldo automático, en minutos."""
+    settings = load_settings()
+    try:
+        return max(0, int(settings.get("intervalo_respaldo_min", INTERVALO_RESPALDO_DEFECTO)))
+    except (TypeError, ValueError):
+        return INTERVALO_RESPALDO_DEFECTO
+
+
+def set_intervalo_respaldo(minutos: int):
+    """Guarda el intervalo del respaldo automático en config.json."""
+    settings = load_settings()
+    settings["intervalo_respaldo_min"] = max(0, int(minutos))
+    save_settings(settings)
+
+
+# PRAGMA que se aplican a cada conexión SQLite (ver db.py). Se pueden
+# cambiar en config.json con "sqlite_pragmas": {"synchronous": "FULL", ...};
+# un valor null deja el valor por defecto de SQLite.
+PRAGMAS_SQLITE_DEFECTO = {
+    "journal_mode": "WAL",          # lectores y escritor no se bloquean entre sí
+    "synchronous": "NORMAL",        # en WAL, sin fsync en cada commit; seguro ante cortes de la app
+    "cache_size": -64000,           # negativo = KiB → ~64 MB por conexión
+    "mmap_size": 256 * 1024 * 1024,
+    "temp_store": "MEMORY",
+    "foreign_keys": "ON",
+}
+
+
+def get_pragmas_sqlite() -> dict:
+    """Devuelve los PRAGMA de SQLite: los por defecto más los de config.json."""
+    settings = load_settings()
+    pragmas = dict(PRAGMAS_SQLITE_DEFECTO)
+    propios = settings.get("sqlite_pragmas")
+    if isinstance(propios, dict):
+        pragmas.update(propios)
+    return pragmas
@@ -1,7 +1,10 @@
 import os
+import re
 import sys
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import scoped_session, sessionmaker
+
+from config import get_pragmas_sqlite
 
 # ============================================
 #  BASE_DIR distinto si está en .exe (PyInstaller)
@@ -17,5 +20,53 @@ DB_PATH = os.path.join(BASE_DIR, "raiz_diseno.db")
 # URL para SQLAlchemy (sqlite:///ruta/al/archivo.db)
 DB_URL = "sqlite:///" + DB_PATH.replace("\\", "/")
 
+_RE_NOMBRE_PRAGMA = re.compile(r"^[a-z_]+$")
+_RE_VALOR_PRAGMA = re.compile(r"^-?\w+$")
+
+
+def aplicar_pragmas(dbapi_conn, pragmas: dict) -> None:
+    """
+    Ejecuta "PRAGMA nombre = valor" en una conexión sqlite3 recién abierta.
+    Los valores vienen de config.json, así que solo se aceptan nombres y
+    valores simples (números o palabras); None se salta.
+    """
+    cursor = dbapi_conn.cursor()
+    try:
+        for nombre, valor in pragmas.items():
+            if valor is None:
+                continue
+            if isinstance(valor, bool):
+                valor = "ON" if valor else "OFF"
+            if not (_RE_NOMBRE_PRAGMA.match(nombre) and _RE_VALOR_PRAGMA.match(str(valor))):
+                raise ValueError(f"PRAGMA no válido en la configuración: {nombre} = {valor!r}")
+            cursor.execute(f"PRAGMA {nombre} = {valor}")
+    finally:
+        cursor.close()
+
+
+def configurar_pragmas(engine, pragmas: dict) -> None:
+    """Aplica los PRAGMA a cada conexión nueva que abra el engine."""
+
+    @event.listens_for(engine, "connect")
+    def _al_conectar(dbapi_conn, _registro):
+        aplicar_pragmas(dbapi_conn, pragmas)
+
+
+def borrar_archivos_wal(ruta: str) -> None:
+    """
+    Borra "<ruta>-wal" y "<ruta>-shm" si quedaron de una BD anterior. Se
+    usa antes de reemplazar el archivo de la BD al restaurar un respaldo:
+    SQLite no debe aplicar el WAL viejo sobre la BD restaurada.
+    """
+    for sufijo in ("-wal", "-shm"):
+        if os.path.exists(ruta + sufijo):
+            os.remove(ruta + sufijo)
+
+
 engine = create_engine(DB_URL, echo=False, future=True)
+configurar_pragmas(engine, get_pragmas_sqlite())
 SessionLocal = sessionmaker(bind=engine)
+
+# Una sesión por hilo, reutilizada entre operaciones de la GUI
+# (ver repository.sesion / repository.transaccion)
+SesionHilo = scoped_session(SessionLocal)
@@ -1,17 +1,24 @@
 # gui/clientes_dialog.py
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget,
-    QTableWidgetItem, QPushButton, QMessageBox,
+    QDialog, QVBoxLayout, QHBoxLayout, QTableView,
+    QAbstractItemView, QPushButton, QMessageBox,
     QFormLayout, QLineEdit, QComboBox, QLabel
 )
-from PySide6.QtCore import QRegularExpression, Qt
+from PySide6.QtCore import QRegularExpression, Qt, QTimer
 from PySide6.QtGui import QRegularExpressionValidator
 
-from db import SessionLocal
-from models import Cliente
+from cache_clientes import cache_clientes
+from busqueda import coincide, es_refinamiento, palabras_busqueda, tokens_busqueda
+from repository import (
+    actualizar_cliente, buscar_por_rut, busqueda_amplia, clientes_por_id, crear_cliente,
+    eliminar_cliente, listar_clientes, productos_por_cliente, resumen_por_cliente, sesion, transaccion,
+)
+from .modelos import ModeloTablaPaginado, ProxyFiltroFilas
+from .tareas import ConsultaBD, crear_indicador_carga
 from .pedidos_dialog import (
     HistorialClienteDialog,
     COMUNAS_SANTIAGO,
+    ESPERA_BUSQUEDA_MS,
     crear_validador_telefono,
     configurar_combo_comuna,
     crear_lineedit_rut,
@@ -35,7 +42,8 @@ class EditClienteDialog(QDialog):
         self.setWindowTitle("Editar cliente")
         self.resize(400, 250)
 
-        self._cliente = cliente
+        # Datos a guardar (ver guardar); el cliente recibido no se modifica
+        self.datos: dict = {}
 
         layout = QVBoxLayout(self)
         form = QFormLayout()
@@ -80,13 +88,15 @@ class EditClienteDialog(QDialog):
             QMessageBox.warning(self, "Editar cliente", "El nombre no puede estar vacío.")
             return
 
-        self._cliente.nombre = nombre
-        self._cliente.rut = self.ed_rut.text().strip() or None
-        self._cliente.telefono = self.ed_telefono.text().strip() or None
-        self._cliente.correo = self.ed_correo.text().strip() or None
-        self._cliente.direccion = self.ed_direccion.text().strip() or None
         comuna_txt = self.cb_comuna.currentText().strip()
-        self._cliente.comuna = comuna_txt or None
+        self.datos = {
+            "nombre": nombre,
+            "rut": self.ed_rut.text().strip() or None,
+            "telefono": self.ed_telefono.text().strip() or None,
+            "correo": self.ed_correo.text().strip() or None,
+            "direccion": self.ed_direccion.text().strip() or None,
+            "comuna": comuna_txt or None,
+        }
 
         self.accept()
 
@@ -113,25 +123,50 @@ class ClientesDialog(QDialog):
         search_layout = QHBoxLayout()
         lbl_buscar = QLabel("Buscar cliente:")
         self.ed_buscar_cliente = QLineEdit()
-        self.ed_buscar_cliente.setPlaceholderText("Nombre del cliente...")
+        self.ed_buscar_cliente.setPlaceholderText("Nombre, RUT, teléfono, comuna o producto...")
         self.btn_buscar_cliente = QPushButton("Buscar")
         self.btn_limpiar_cliente = QPushButton("Limpiar")
         search_layout.addWidget(lbl_buscar)
         search_layout.addWidget(self.ed_buscar_cliente)
         search_layout.addWidget(self.btn_buscar_cliente)
         search_layout.addWidget(self.btn_limpiar_cliente)
+        self.indicador_carga = crear_indicador_carga(self)
+        search_layout.addWidget(self.indicador_carga)
         layout.addLayout(search_layout)
 
-        # ---- Tabla ----
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels(
-            ["ID", "Nombre", "RUT", "Teléfono", "Correo", "Dirección", "Comuna"]
+        # ---- Tabla (modelo paginado: trae filas a medida que se hace scroll) ----
+        self.model = ModeloTablaPaginado(
+            [
+                ("ID", "id"),
+                ("Nombre", "nombre"),
+                ("RUT", "rut"),
+                ("Teléfono", "telefono"),
+                ("Correo", "correo"),
+                ("Dirección", "direccion"),
+                ("Comuna", "comuna"),
+                # Resumen precalculado (tabla resumen_clientes)
+                ("Pedidos", "n_pedidos"),
+                ("Total comprado", "monto_total"),
+                ("Saldo pendiente", "saldo_pendiente"),
+                ("Último pedido", "ultimo_pedido"),
+            ],
+            self,
         )
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        # Filtro y orden sobre lo ya cargado (ver _mostrar)
+        self.proxy = ProxyFiltroFilas(self.model, self)
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        # Sin columna elegida se mantiene el orden de la BD (id o relevancia)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         layout.addWidget(self.table)
 
+        # Las páginas llegan en segundo plano
+        self.model.cargando.connect(self._al_cambiar_carga)
+        self.model.error.connect(self._al_fallar_carga)
+
         # ---- Botones ----
         hb = QHBoxLayout()
         self.btn_add = QPushButton("Nuevo cliente")
@@ -148,6 +183,16 @@ class ClientesDialog(QDialog):
         hb.addWidget(self.btn_close)
         layout.addLayout(hb)
 
+        # Búsqueda mientras se escribe: se espera una pausa al tipear.
+        # _palabras_cargadas: las de la consulta que tiene self.model.
+        self._palabras_mostradas: list[str] = []
+        self._palabras_cargadas: list[str] = []
+        self._temporizador_busqueda = QTimer(self)
+        self._temporizador_busqueda.setSingleShot(True)
+        self._temporizador_busqueda.setInterval(ESPERA_BUSQUEDA_MS)
+        self._temporizador_busqueda.timeout.connect(self._buscar_al_escribir)
+        self.ed_buscar_cliente.textChanged.connect(self._temporizador_busqueda.start)
+
         # Conexión de señales
         self.btn_add.clicked.connect(self.add_cliente)
         self.btn_edit.clicked.connect(self.edit_cliente)
@@ -159,39 +204,97 @@ class ClientesDialog(QDialog):
         self.btn_limpiar_cliente.clicked.connect(self.limpiar_busqueda_clientes)
         self.ed_buscar_cliente.returnPressed.connect(self.aplicar_busqueda_clientes)
 
-        # Datos en memoria para búsqueda
-        self._datos_clientes = []
         self.cargar()
 
+        # La primera página sale de una consulta con LIMIT; mientras se mira,
+        # los clientes se cargan en memoria (cache_clientes) en segundo plano
+        # para las páginas siguientes y los avisos de RUT repetido
+        ConsultaBD(cache_clientes.cargar).iniciar()
+
     # -------------------------------------------------
-    # Rellenar tabla desde una lista de dicts
+    # Rellenar tabla (por páginas, según se haga scroll)
     # -------------------------------------------------
-    def _llenar_tabla(self, datos):
-        self.table.setRowCount(len(datos))
-        for row, d in enumerate(datos):
-            self.table.setItem(row, 0, QTableWidgetItem(str(d["id"])))
-            self.table.setItem(row, 1, QTableWidgetItem(d["nombre"] or ""))
-            self.table.setItem(row, 2, QTableWidgetItem(d.get("rut", "") or ""))
-            self.table.setItem(row, 3, QTableWidgetItem(d["telefono"] or ""))
-            self.table.setItem(row, 4, QTableWidgetItem(d["correo"] or ""))
-            self.table.setItem(row, 5, QTableWidgetItem(d["direccion"] or ""))
-            self.table.setItem(row, 6, QTableWidgetItem(d["comuna"] or ""))
-        self.table.resizeColumnsToContents()
+    def _mostrar(self, texto: str | None = None):
+        palabras = palabras_busqueda(texto)
+        self._palabras_mostradas = palabras
+
+        # Si se siguió escribiendo sobre una búsqueda que ya trajo todas sus
+        # filas (o se volvió a ella), basta con filtrar lo cargado
+        if self.model.completo and es_refinamiento(self._palabras_cargadas, palabras):
+            if palabras == self._palabras_cargadas:
+                self.proxy.set_filtro(None)
+            else:
+                self.proxy.set_filtro(
+                    lambda fila: any(coincide(palabras, t) for t in fila["_tokens"])
+                )
+            return
+
+        # Si la búsqueda es amplia no cambia de una página a otra: se mira
+        # una vez, con la primera página
+        amplia: list[bool] = []
+
+        def cargar_pagina(session, offset, limite):
+            if not amplia:
+                amplia.append(busqueda_amplia(session, texto))
+            clientes = listar_clientes(
+                session, texto=texto, offset=offset, limite=limite, amplia=amplia[0]
+            )
+            filas = [
+                {
+                    "id": c.id,
+                    "nombre": c.nombre or "",
+                    "rut": c.rut or "",
+                    "telefono": c.telefono or "",
+                    "correo": c.correo or "",
+                    "direccion": c.direccion or "",
+                    "comuna": c.comuna or "",
+                }
+                for c in clientes
+            ]
+            resumenes = resumen_por_cliente(session, [f["id"] for f in filas])
+            for f in filas:
+                r = resumenes[f["id"]]
+                f["n_pedidos"] = r["n_pedidos"]
+                f["monto_total"] = r["monto_total"]
+                f["saldo_pendiente"] = r["saldo_pendiente"]
+                f["ultimo_pedido"] = (
+                    r["ultimo_pedido"].strftime("%Y-%m-%d") if r["ultimo_pedido"] else ""
+                )
+            if palabras:
+                # Claves de búsqueda para filtrar en memoria si se sigue
+                # escribiendo. Como en el índice FTS, todas las palabras deben
+                # calzar en los datos del cliente o en un mismo producto.
+                productos = productos_por_cliente(session, [f["id"] for f in filas])
+                for f, c in zip(filas, clientes):
+                    f["_tokens"] = [
+                        tokens_busqueda(
+                            c.nombre, c.telefono, c.correo, c.direccion, c.comuna, rut=c.rut
+                        ),
+                        *(tokens_busqueda(p) for p in productos[c.id]),
+                    ]
+            return filas
+
+        self._palabras_cargadas = palabras
+        self.proxy.set_filtro(None)
+        self.model.set_consulta(cargar_pagina)
+
+    def _al_cambiar_carga(self, cargando: bool):
+        self.indicador_carga.setVisible(cargando)
+        # Ajustar columnas con la primera página, no con cada una
+        if not cargando and self.model.rowCount() <= self.model.TAM_PAGINA:
+            self.table.resizeColumnsToContents()
+
+    def _al_fallar_carga(self, mensaje: str):
+        QMessageBox.critical(self, "Error", f"No se pudieron cargar los clientes:\n{mensaje}")
 
     # -------------------------------------------------
     # Utilidad: obtener id del cliente seleccionado
     # -------------------------------------------------
     def _cliente_seleccionado_id(self):
-        row = self.table.currentRow()
-        if row < 0:
-            return None
-        item = self.table.item(row, 0)
-        if not item:
-            return None
-        try:
-            return int(item.text())
-        except ValueError:
+        d = self.proxy.fila(self.table.currentIndex().row())
+        if d is None:
             return None
+        return d["id"]
 
     #-------------------------------------------------
     # Crear cliente (pide TODOS los datos)
@@ -283,20 +386,11 @@ class ClientesDialog(QDialog):
         direccion = ed_direccion.text().strip() or None
         comuna = cb_comuna.currentText().strip() or None
 
-        # Normalizamos el RUT para comparar (sin puntos ni guion)
-        rut_limpio = rut.replace(".", "").replace("-", "").upper()
-
-        session = SessionLocal()
         try:
-            # Buscar si ya existe un cliente con el mismo RUT
-            clientes = session.query(Cliente).all()
-            for c in clientes:
-                if not c.rut:
-                    continue
-                rut_existente_limpio = (
-                    c.rut.replace(".", "").replace("-", "").upper()
-                )
-                if rut_existente_limpio == rut_limpio:
+            with transaccion() as session:
+                # Buscar si ya existe un cliente con el mismo RUT (índice único)
+                c = buscar_por_rut(session, rut)
+                if c:
                     QMessageBox.warning(
                         dlg,
                         "Nuevo cliente",
@@ -304,22 +398,18 @@ class ClientesDialog(QDialog):
                     )
                     return
 
-            # Si no existe, creamos el cliente nuevo
-            c = Cliente(
-                nombre=nombre,
-                rut=rut,
-                telefono=telefono,
-                correo=correo,
-                direccion=direccion,
-                comuna=comuna,
-            )
-            session.add(c)
-            session.commit()
+                # Si no existe, creamos el cliente nuevo
+                crear_cliente(
+                    session,
+                    nombre=nombre,
+                    rut=rut,
+                    telefono=telefono,
+                    correo=correo,
+                    direccion=direccion,
+                    comuna=comuna,
+                )
         except Exception as exc:
-            session.rollback()
             QMessageBox.critical(self, "Error", str(exc))
-        finally:
-            session.close()
 
         self.cargar()
 
@@ -334,22 +424,30 @@ class ClientesDialog(QDialog):
             )
             return
 
-        session = SessionLocal()
-        try:
-            cliente = session.query(Cliente).get(cliente_id)
-            if not cliente:
-                QMessageBox.warning(self, "Editar", "Cliente no encontrado.")
-                return
+        with sesion() as session:
+            encontrados = clientes_por_id(session, [cliente_id])
+        cliente = encontrados[0] if encontrados else None
+        if not cliente:
+            QMessageBox.warning(self, "Editar", "Cliente no encontrado.")
+            return
 
-            dlg = EditClienteDialog(cliente, self)
-            if dlg.exec() == QDialog.Accepted:
-                try:
-                    session.commit()
-                except Exception as exc:
-                    session.rollback()
-                    QMessageBox.critical(self, "Error", str(exc))
-        finally:
-            session.close()
+        dlg = EditClienteDialog(cliente, self)
+        if dlg.exec() != QDialog.Accepted:
+            return
+
+        try:
+            with transaccion() as session:
+                otro = buscar_por_rut(session, dlg.datos["rut"])
+                if otro and otro.id != cliente_id:
+                    QMessageBox.warning(
+                        self,
+                        "Editar",
+                        f"Ya existe un cliente con este RUT:\n{otro.nombre} ({otro.rut}).",
+                    )
+                    return
+                actualizar_cliente(session, cliente_id, **dlg.datos)
+        except Exception as exc:
+            QMessageBox.critical(self, "Error", str(exc))
 
         self.cargar()
 
@@ -372,17 +470,11 @@ class ClientesDialog(QDialog):
         if r != QMessageBox.Yes:
             return
 
-        session = SessionLocal()
         try:
-            cliente = session.query(Cliente).get(cliente_id)
-            if cliente:
-                session.delete(cliente)
-                session.commit()
+            with transaccion() as session:
+                eliminar_cliente(session, cliente_id)
         except Exception as exc:
-            session.rollback()
             QMessageBox.critical(self, "Error", str(exc))
-        finally:
-            session.close()
 
         self.cargar()
 
@@ -390,45 +482,28 @@ class ClientesDialog(QDialog):
     # Cargar tabla de clientes
     # -------------------------------------------------
     def cargar(self):
-        session = SessionLocal()
-        try:
-            clientes = session.query(Cliente).order_by(Cliente.id).all()
-            self._datos_clientes = []
-            for c in clientes:
-                self._datos_clientes.append({
-                    "id": c.id,
-                    "nombre": c.nombre or "",
-                    "rut": getattr(c, "rut", "") or "",
-                    "telefono": c.telefono or "",
-                    "correo": c.correo or "",
-                    "direccion": c.direccion or "",
-                    "comuna": c.comuna or "",
-                })
-        finally:
-            session.close()
-
         self.ed_buscar_cliente.clear()
-        self._llenar_tabla(self._datos_clientes)
+        self._temporizador_busqueda.stop()
+        self._mostrar()
 
     # -------------------------------------------------
-    # Búsqueda por nombre de cliente
+    # Búsqueda de clientes (índice de texto completo en la BD):
+    # nombre, RUT, teléfono, correo, dirección, comuna o productos
     # -------------------------------------------------
     def aplicar_busqueda_clientes(self):
-        texto = self.ed_buscar_cliente.text().strip().lower()
-        if not texto:
-            self._llenar_tabla(self._datos_clientes)
-            return
-
-        filtrados = []
-        for d in self._datos_clientes:
-            if texto in (d["nombre"] or "").lower():
-                filtrados.append(d)
+        self._temporizador_busqueda.stop()
+        texto = self.ed_buscar_cliente.text().strip()
+        self._mostrar(texto=texto or None)
 
-        self._llenar_tabla(filtrados)
+    def _buscar_al_escribir(self):
+        # Mismas palabras que lo que ya se muestra (p. ej. solo un espacio): nada que hacer
+        if palabras_busqueda(self.ed_buscar_cliente.text()) != self._palabras_mostradas:
+            self.aplicar_busqueda_clientes()
 
     def limpiar_busqueda_clientes(self):
         self.ed_buscar_cliente.clear()
-        self._llenar_tabla(self._datos_clientes)
+        self._temporizador_busqueda.stop()
+        self._mostrar()
 
     # -------------------------------------------------
     # Ver historial de compras del cliente
@@ -442,3 +517,5 @@ class ClientesDialog(QDialog):
             return
         dlg = HistorialClienteDialog(cliente_id, self)
         dlg.exec()
+        # Los ítems pueden haber cambiado desde el historial: refrescar el resumen
+        self.model.recargar()
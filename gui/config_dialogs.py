@@ -4,10 +4,13 @@ import sys
 
 from PySide6.QtWidgets import (
     QDialog, QVBoxLayout, QLabel, QHBoxLayout,
-    QLineEdit, QPushButton, QFileDialog, QMessageBox
+    QLineEdit, QPushButton, QFileDialog, QMessageBox, QInputDialog
 )
 
-from config import load_settings, save_settings, get_backup_folder
+from config import (
+    load_settings, save_settings, get_backup_folder,
+    get_intervalo_respaldo, set_intervalo_respaldo,
+)
 
 
 class ConfigInicialDialog(QDialog):
@@ -128,3 +131,23 @@ def change_backup_folder(parent=None):
     save_settings(settings)
     QMessageBox.information(parent, "Configuración", "Carpeta de respaldo actualizada.")
     return True
+
+
+def change_backup_interval(parent=None) -> int | None:
+    """
+    Permite cambiar cada cuántos minutos se hace el respaldo automático.
+    Devuelve el nuevo intervalo (0 = desactivado) o None si se canceló.
+    """
+    minutos, ok = QInputDialog.getInt(
+        parent,
+        "Respaldo automático",
+        "Minutos entre respaldos automáticos (0 = desactivado):",
+        get_intervalo_respaldo(),
+        0,
+        24 * 60,
+    )
+    if not ok:
+        return None
+
+    set_intervalo_respaldo(minutos)
+    return minutos
@@ -6,17 +6,21 @@ from PySide6.QtWidgets import (
     QFileDialog,
     QMessageBox,
     QToolBar,
+    QProgressDialog,
+    QApplication,
 )
 from PySide6.QtCore import Qt
     # noqa
 from PySide6.QtGui import QAction, QIcon
 import os
 
-from import_excel import importar_excel
+from import_excel import UMBRAL_STREAMING, importar_excel, importar_excel_streaming
 from backup import hacer_respaldo, importar_respaldo
 from .clientes_dialog import ClientesDialog
 from .pedidos_dialog import PedidosDialog
-from .config_dialogs import change_backup_folder
+from .config_dialogs import change_backup_folder, change_backup_interval
+from .respaldo_automatico import RespaldoAutomatico
+from .tareas import Tarea, TareaCancelada
 
 
 class MainWindow(QMainWindow):
@@ -43,6 +47,14 @@ class MainWindow(QMainWindow):
         else:
             self.current_zoom = 100
 
+        # Respaldo al cerrar (ver closeEvent)
+        self._respaldo = None
+        self._respaldo_listo = False
+
+        # Respaldo periódico en segundo plano mientras la app está abierta
+        self.respaldo_auto = RespaldoAutomatico(self)
+        self.respaldo_auto.mensaje.connect(lambda texto: self.statusBar().showMessage(texto, 10000))
+
         self.setWindowTitle("CRM Raíz Diseño")
         self.resize(1000, 600)
 
@@ -74,6 +86,9 @@ class MainWindow(QMainWindow):
         self.act_cambiar_carpeta = QAction("Cambiar carpeta de respaldo", self)
         self.act_cambiar_carpeta.triggered.connect(self.action_cambiar_carpeta)
 
+        self.act_intervalo_respaldo = QAction("Respaldo automático...", self)
+        self.act_intervalo_respaldo.triggered.connect(self.action_intervalo_respaldo)
+
         self.act_salir = QAction("Salir", self)
         self.act_salir.triggered.connect(self.close)
 
@@ -105,6 +120,7 @@ class MainWindow(QMainWindow):
         menu_archivo.addAction(self.act_importar_excel)
         menu_archivo.addAction(self.act_importar_backup)   # ← NUEVO
         menu_archivo.addAction(self.act_cambiar_carpeta)
+        menu_archivo.addAction(self.act_intervalo_respaldo)
         menu_archivo.addSeparator()
         menu_archivo.addAction(self.act_salir)
 
@@ -157,19 +173,53 @@ class MainWindow(QMainWindow):
         )
         if not path:
             return
+
+        avance = QProgressDialog("Importando desde Excel...", None, 0, 0, self)
+        avance.setWindowTitle("Importación")
+        avance.setWindowModality(Qt.WindowModal)
+        avance.setMinimumDuration(0)
+        avance.show()
+        QApplication.processEvents()
+
+        def progreso(hechas: int, total: int):
+            if total:
+                avance.setMaximum(total)
+                avance.setValue(hechas)
+                avance.setLabelText(f"Importando desde Excel... {hechas} de {total} filas")
+            else:
+                # Streaming: no se sabe el total, la barra queda "ocupada"
+                avance.setLabelText(f"Importando desde Excel... {hechas} filas")
+            QApplication.processEvents()
+
+        # Planillas .xlsx grandes se leen por partes para no cargarlas enteras
+        importar = importar_excel
+        if path.lower().endswith(".xlsx") and os.path.getsize(path) > UMBRAL_STREAMING:
+            importar = importar_excel_streaming
+
         try:
-            importar_excel(path)
-            QMessageBox.information(self, "Importación", "Importación desde Excel completada.")
+            resultado = importar(path, progreso=progreso)
+            avance.close()
+            QMessageBox.information(
+                self,
+                "Importación",
+                (
+                    "Importación desde Excel completada.\n\n"
+                    f"Clientes nuevos: {resultado['clientes_nuevos']}\n"
+                    f"Pedidos nuevos: {resultado['pedidos_nuevos']}\n"
+                    f"Ítems nuevos: {resultado['items_nuevos']}"
+                ),
+            )
         except Exception as exc:
+            avance.close()
             QMessageBox.critical(self, "Error", f"Error al importar Excel:\n{exc}")
 
     def action_importar_backup(self):
-        """Permite al usuario importar información desde un archivo .db de respaldo."""
+        """Permite al usuario importar información desde un archivo .db (o .db.xz) de respaldo."""
         path, _ = QFileDialog.getOpenFileName(
             self,
             "Seleccionar archivo de respaldo",
             "",
-            "Base de datos SQLite (*.db);;Todos los archivos (*.*)",
+            "Respaldos (*.db *.xz);;Base de datos SQLite (*.db);;Todos los archivos (*.*)",
         )
         if not path:
             return
@@ -202,17 +252,69 @@ class MainWindow(QMainWindow):
         dlg.exec()
 
     def action_cambiar_carpeta(self):
-        change_backup_folder(self)
+        if change_backup_folder(self):
+            # Si no había carpeta, el respaldo automático estaba detenido
+            self.respaldo_auto.configurar()
+
+    def action_intervalo_respaldo(self):
+        minutos = change_backup_interval(self)
+        if minutos is not None:
+            self.respaldo_auto.configurar(minutos)
 
     # ==========================
     # Backup automático al cerrar
     # ==========================
     def closeEvent(self, event):
-        try:
-            hacer_respaldo()
-        except Exception as exc:
-            QMessageBox.warning(self, "Backup", f"No se pudo generar el respaldo al cerrar:\n{exc}")
-        super().closeEvent(event)
+        """
+        El respaldo corre en otro hilo (Tarea) con un diálogo de avance. El
+        primer cierre se ignora y la ventana se vuelve a cerrar sola cuando
+        el respaldo termina, falla o se cancela.
+        """
+        if self._respaldo_listo:
+            super().closeEvent(event)
+            return
+
+        event.ignore()
+        if self._respaldo is not None:
+            # Ya hay un respaldo en curso
+            return
+        if self.respaldo_auto.en_curso:
+            # Primero se corta el respaldo automático; después se vuelve a cerrar
+            self.respaldo_auto.detener(self.close)
+            return
+        self.respaldo_auto.detener()
+
+        avance = QProgressDialog("Generando respaldo...", "Cancelar", 0, 0, self)
+        avance.setWindowTitle("Backup")
+        avance.setWindowModality(Qt.WindowModal)
+        avance.setMinimumDuration(500)
+        avance.setAutoClose(False)
+        avance.setAutoReset(False)
+
+        def progreso(hechas: int, total: int):
+            avance.setMaximum(total)
+            avance.setValue(hechas)
+
+        def fin(exc=None):
+            avance.close()
+            self._respaldo = None
+            self._respaldo_listo = True
+            if exc is not None and not isinstance(exc, TareaCancelada):
+                QMessageBox.warning(
+                    self, "Backup", f"No se pudo generar el respaldo al cerrar:\n{exc}"
+                )
+            self.close()
+
+        def cancelar():
+            avance.setLabelText("Cancelando respaldo...")
+            self._respaldo.cancelar()
+
+        self._respaldo = Tarea(hacer_respaldo)
+        self._respaldo.senales.progreso.connect(progreso)
+        self._respaldo.senales.terminado.connect(lambda _resultado: fin())
+        self._respaldo.senales.fallo.connect(fin)
+        avance.canceled.connect(cancelar)
+        self._respaldo.iniciar()
 
     # ==========================
     # Lógica de ZOOM
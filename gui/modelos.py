@@ -0,0 +1,202 @@
+# gui/modelos.py
+from typing import Callable
+
+from PySide6.QtCore import (
+    QAbstractTableModel, QModelIndex, QSortFilterProxyModel, Qt, Signal
+)
+from sqlalchemy.orm import Session
+
+from .tareas import ConsultaBD, TareaCancelada
+
+
+# Función que recibe (session, offset, limite) y devuelve una lista de dicts.
+# Corre en un hilo del pool (ver tareas.ConsultaBD).
+CargadorPagina = Callable[[Session, int, int], list[dict]]
+
+# Recibe una fila (dict) ya cargada y dice si sigue en el resultado
+FiltroFila = Callable[[dict], bool]
+
+# Rol con el valor sin formatear de cada celda, para ordenar (números como números)
+ROL_ORDEN = Qt.UserRole
+
+
+class ModeloTablaPaginado(QAbstractTableModel):
+    """
+    Modelo de tabla que trae las filas desde la BD por páginas.
+
+    La vista (QTableView) pide más filas con canFetchMore/fetchMore a medida
+    que el usuario hace scroll, así que abrir una tabla con 200.000 filas
+    cuesta lo mismo que abrir una con 200: solo se consulta la primera página.
+
+    Cada página se consulta en segundo plano (ConsultaBD) y se agrega al
+    llegar. Una consulta nueva (set_consulta) cancela la página que estaba
+    cargando la anterior y descarta su resultado.
+
+    columnas: lista de (título, clave del dict).
+    """
+
+    TAM_PAGINA = 200
+
+    # True mientras hay una página en camino (para el indicador de carga)
+    cargando = Signal(bool)
+    # Mensaje de error si una página no se pudo cargar
+    error = Signal(str)
+
+    def __init__(self, columnas: list[tuple[str, str]], parent=None) -> None:
+        super().__init__(parent)
+        self._columnas = columnas
+        self._filas: list[dict] = []
+        self._cargar_pagina: CargadorPagina | None = None
+        self._agotado = True
+        # True si la consulta actual ya trajo todas sus filas sin errores
+        self._completo = False
+        self._tarea: ConsultaBD | None = None
+
+    # ---------------- Consulta ----------------
+
+    def set_consulta(self, cargar_pagina: CargadorPagina) -> None:
+        """Reemplaza la consulta actual y trae la primera página."""
+        self._cancelar_carga()
+        self.beginResetModel()
+        self._filas = []
+        self._cargar_pagina = cargar_pagina
+        self._agotado = False
+        self._completo = False
+        self.endResetModel()
+        self.fetchMore(QModelIndex())
+
+    def recargar(self) -> None:
+        """Vuelve a ejecutar la consulta actual desde la primera página."""
+        if self._cargar_pagina is not None:
+            self.set_consulta(self._cargar_pagina)
+
+    def fila(self, row: int) -> dict | None:
+        """Devuelve el dict de la fila indicada (o None si no existe)."""
+        if 0 <= row < len(self._filas):
+            return self._filas[row]
+        return None
+
+    @property
+    def completo(self) -> bool:
+        """True si ya están cargadas todas las filas de la consulta actual."""
+        return self._completo and self._tarea is None
+
+    # ---------------- Carga incremental ----------------
+
+    def canFetchMore(self, parent=QModelIndex()) -> bool:
+        if parent.isValid():
+            return False
+        return not self._agotado
+
+    def fetchMore(self, parent=QModelIndex()) -> None:
+        if parent.isValid() or self._agotado or self._cargar_pagina is None:
+            return
+        if self._tarea is not None:
+            # Ya viene una página en camino
+            return
+
+        tarea = ConsultaBD(self._cargar_pagina, len(self._filas), self.TAM_PAGINA)
+        tarea.senales.terminado.connect(lambda filas: self._pagina_cargada(tarea, filas))
+        tarea.senales.fallo.connect(lambda exc: self._pagina_fallida(tarea, exc))
+        self._tarea = tarea
+        self.cargando.emit(True)
+        tarea.iniciar()
+
+    def _cancelar_carga(self) -> None:
+        if self._tarea is not None:
+            self._tarea.cancelar()
+            self._tarea = None
+            self.cargando.emit(False)
+
+    def _pagina_cargada(self, tarea: ConsultaBD, nuevas: list[dict]) -> None:
+        if tarea is not self._tarea:
+            # Resultado de una consulta reemplazada
+            return
+        self._tarea = None
+        if len(nuevas) < self.TAM_PAGINA:
+            self._agotado = True
+            self._completo = True
+        if nuevas:
+            inicio = len(self._filas)
+            self.beginInsertRows(QModelIndex(), inicio, inicio + len(nuevas) - 1)
+            self._filas.extend(nuevas)
+            self.endInsertRows()
+        self.cargando.emit(False)
+
+    def _pagina_fallida(self, tarea: ConsultaBD, exc: Exception) -> None:
+        if tarea is not self._tarea:
+            return
+        self._tarea = None
+        self._agotado = True
+        self.cargando.emit(False)
+        if not isinstance(exc, TareaCancelada):
+            self.error.emit(str(exc))
+
+    # ---------------- QAbstractTableModel ----------------
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._filas)
+
+    def columnCount(self, parent=QModelIndex()) -> int:
+        if parent.isValid():
+            return 0
+        return len(self._columnas)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role not in (Qt.DisplayRole, ROL_ORDEN):
+            return None
+        clave = self._columnas[index.column()][1]
+        valor = self._filas[index.row()].get(clave, "")
+        if role == ROL_ORDEN:
+            return valor
+        return "" if valor is None else str(valor)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return self._columnas[section][0]
+        return str(section + 1)
+
+
+class ProxyFiltroFilas(QSortFilterProxyModel):
+    """
+    Filtro y orden en memoria sobre un ModeloTablaPaginado.
+
+    El modelo de origen guarda las filas de la última consulta a la BD; este
+    proxy decide cuáles se ven (set_filtro) y en qué orden (clic en el
+    encabezado de la tabla). Cambiar o quitar el filtro no vuelve a la BD ni
+    copia filas: solo se reevalúa filterAcceptsRow sobre las ya cargadas.
+
+    Se ordena por el valor sin formatear (ROL_ORDEN), así que montos e ids se
+    comparan como números. Mientras no se elija una columna, se mantiene el
+    orden de la consulta.
+    """
+
+    def __init__(self, modelo: ModeloTablaPaginado, parent=None) -> None:
+        super().__init__(parent)
+        self._filtro: FiltroFila | None = None
+        self.setSortRole(ROL_ORDEN)
+        self.setSourceModel(modelo)
+
+    def set_filtro(self, filtro: FiltroFila | None) -> None:
+        """Muestra solo las filas cargadas que cumplen filtro (None: todas)."""
+        if filtro is None and self._filtro is None:
+            return
+        self._filtro = filtro
+        self.invalidateRowsFilter()
+
+    def filterAcceptsRow(self, source_row: int, source_parent: QModelIndex) -> bool:
+        if self._filtro is None:
+            return True
+        fila = self.sourceModel().fila(source_row)
+        return fila is not None and bool(self._filtro(fila))
+
+    def fila(self, row: int) -> dict | None:
+        """Dict de la fila visible indicada (o None si no existe)."""
+        origen = self.mapToSource(self.index(row, 0))
+        if not origen.isValid():
+            return None
+        return self.sourceModel().fila(origen.row())
@@ -2,15 +2,23 @@
 from datetime import datetime
 
 from PySide6.QtWidgets import (
-    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget,
-    QTableWidgetItem, QPushButton, QMessageBox,
+    QDialog, QVBoxLayout, QHBoxLayout, QTableWidget, QTableView,
+    QTableWidgetItem, QPushButton, QMessageBox, QAbstractItemView,
     QFormLayout, QComboBox, QDateEdit, QLineEdit, QLabel, QCompleter
 )
-from PySide6.QtCore import Qt, QDate, QRegularExpression
+from PySide6.QtCore import Qt, QDate, QModelIndex, QRegularExpression, QStringListModel, QTimer
 from PySide6.QtGui import QRegularExpressionValidator
 
-from db import SessionLocal
-from models import Cliente, Pedido, ItemPedido
+from models import Pedido
+from busqueda import coincide, es_refinamiento, palabras_busqueda, tokens_busqueda
+from repository import (
+    actualizar_pedido, buscar_por_rut, clientes_por_id, crear_cliente, crear_pedido,
+    eliminar_pedido, guardar_items, items_pedido, listar_pedidos, obtener_pedido,
+    resumen_por_cliente, sesion, sugerencias_clientes, transaccion,
+)
+
+from .modelos import FiltroFila, ModeloTablaPaginado, ProxyFiltroFilas
+from .tareas import ConsultaBD, TareaCancelada, crear_indicador_carga
 
 
 # ===================================================
@@ -61,6 +69,9 @@ ESTADOS_PEDIDO = [
     "Cancelado",
 ]
 
+# Pausa al escribir en un buscador antes de consultar (búsqueda al tipear)
+ESPERA_BUSQUEDA_MS = 250
+
 
 def crear_validador_telefono(parent=None):
     """Solo permite dígitos 0-9 (vacío también es válido)."""
@@ -128,43 +139,126 @@ def crear_lineedit_rut(parent=None) -> QLineEdit:
     return le
 
 
-
 # ===================================================
-# ========== GENERACIÓN NÚMERO DE PEDIDO ============
+# =============== SELECTOR DE CLIENTE ===============
 # ===================================================
 
-def _generar_codigo_pedido(fecha: datetime, correlativo: int) -> str:
-    """Genera un código del tipo PYYYYMMDD-XXX."""
-    return "P" + fecha.strftime("%Y%m%d") + f"-{correlativo:03d}"
+def texto_cliente(cliente) -> str:
+    """Cómo se muestra un cliente al elegirlo: "Nombre (teléfono)"."""
+    nombre = cliente.nombre or ""
+    telefono = cliente.telefono or ""
+    if telefono and nombre:
+        return f"{nombre} ({telefono})"
+    return nombre or telefono
 
 
-def generar_numero_pedido_db(session, fecha: datetime | None = None) -> str:
+def opciones_clientes(session, texto: str, limite: int) -> list[tuple[int, str]]:
+    """(id, texto a mostrar) de los clientes que calzan con el texto, por relevancia."""
+    return [(c.id, texto_cliente(c)) for c in sugerencias_clientes(session, texto, limite)]
+
+
+class SelectorCliente(QLineEdit):
     """
-    Genera un número de pedido único consultando la BD.
-    Busca el último número del día y suma 1.
+    Campo para elegir un cliente escribiendo parte de su nombre, RUT,
+    teléfono, correo, dirección o comuna.
+
+    No carga la lista de clientes: tras una pausa al escribir busca en el
+    índice de texto completo (en segundo plano) y ofrece las primeras
+    MAX_OPCIONES coincidencias. Abrirlo cuesta lo mismo con cien o con cien
+    mil clientes.
     """
-    if fecha is None:
-        fecha = datetime.now()
 
-    prefijo = "P" + fecha.strftime("%Y%m%d")
+    MAX_OPCIONES = 20
 
-    ultimo = (
-        session.query(Pedido)
-        .filter(Pedido.numero_pedido.like(f"{prefijo}-%"))
-        .order_by(Pedido.numero_pedido.desc())
-        .first()
-    )
+    def __init__(self, parent=None) -> None:
+        super().__init__(parent)
+        self.setPlaceholderText("Escribe nombre, RUT o teléfono...")
+
+        self._cliente_id: int | None = None
+        self._ids_opciones: list[int] = []
+        self._tarea: ConsultaBD | None = None
+
+        self._opciones = QStringListModel(self)
+        completer = QCompleter(self._opciones, self)
+        # Las opciones ya vienen filtradas y ordenadas por la BD
+        completer.setCompletionMode(QCompleter.UnfilteredPopupCompletion)
+        completer.setMaxVisibleItems(self.MAX_OPCIONES)
+        completer.activated[QModelIndex].connect(self._al_elegir)
+        self.setCompleter(completer)
+
+        self._temporizador = QTimer(self)
+        self._temporizador.setSingleShot(True)
+        self._temporizador.setInterval(ESPERA_BUSQUEDA_MS)
+        self._temporizador.timeout.connect(self._buscar)
+        self.textEdited.connect(self._al_escribir)
+
+    @property
+    def cliente_id(self) -> int | None:
+        """Cliente elegido, o None si no se eligió (o se cambió el texto después)."""
+        return self._cliente_id
+
+    def set_cliente(self, cliente_id: int | None) -> None:
+        """Deja elegido el cliente indicado (una consulta por clave primaria)."""
+        self._cancelar_busqueda()
+        self._cliente_id = None
+        self.clear()
+        if cliente_id is None:
+            return
+        with sesion() as session:
+            clientes = clientes_por_id(session, [cliente_id])
+        if clientes:
+            self._cliente_id = cliente_id
+            self.setText(texto_cliente(clientes[0]))
+            self.setCursorPosition(0)
+
+    def _al_escribir(self, _texto: str) -> None:
+        # Cualquier cambio a mano deja sin cliente hasta que se elija uno
+        self._cliente_id = None
+        self._temporizador.start()
+
+    def _cancelar_busqueda(self) -> None:
+        self._temporizador.stop()
+        if self._tarea is not None:
+            self._tarea.cancelar()
+            self._tarea = None
+
+    def _buscar(self) -> None:
+        self._cancelar_busqueda()
+        texto = self.text().strip()
+        if not palabras_busqueda(texto):
+            self._ids_opciones = []
+            self._opciones.setStringList([])
+            return
 
-    if not ultimo:
-        correlativo = 1
-    else:
-        try:
-            parte_final = ultimo.numero_pedido.split("-")[-1]
-            correlativo = int(parte_final) + 1
-        except Exception:
-            correlativo = 1
+        tarea = ConsultaBD(opciones_clientes, texto, self.MAX_OPCIONES)
+        tarea.senales.terminado.connect(lambda opciones: self._mostrar_opciones(tarea, opciones))
+        tarea.senales.fallo.connect(lambda exc: self._al_fallar(tarea, exc))
+        self._tarea = tarea
+        tarea.iniciar()
+
+    def _mostrar_opciones(self, tarea: ConsultaBD, opciones: list[tuple[int, str]]) -> None:
+        if tarea is not self._tarea:
+            return
+        self._tarea = None
+        self._ids_opciones = [cliente_id for cliente_id, _ in opciones]
+        self._opciones.setStringList([texto for _, texto in opciones])
+        if opciones and self.hasFocus():
+            self.completer().complete()
+
+    def _al_fallar(self, tarea: ConsultaBD, exc: Exception) -> None:
+        if tarea is not self._tarea:
+            return
+        self._tarea = None
+        if not isinstance(exc, TareaCancelada):
+            QMessageBox.critical(self, "Error", f"No se pudieron buscar los clientes:\n{exc}")
+
+    def _al_elegir(self, index: QModelIndex) -> None:
+        fila = self.completer().completionModel().mapToSource(index).row()
+        if 0 <= fila < len(self._ids_opciones):
+            self._cancelar_busqueda()
+            self._cliente_id = self._ids_opciones[fila]
+            self.setText(self._opciones.stringList()[fila])
 
-    return _generar_codigo_pedido(fecha, correlativo)
 
 
 # ===================================================
@@ -222,21 +316,15 @@ class ItemsPedidoDialog(QDialog):
 
     def load_items(self) -> None:
         """Carga los ítems actuales del pedido desde la BD y calcula resumen."""
-        session = SessionLocal()
-        try:
-            items = (
-                session.query(ItemPedido)
-                .filter_by(pedido_id=self._pedido_id)
-                .all()
-            )
-            pedido = session.query(Pedido).get(self._pedido_id)
+        with sesion() as session:
+            items = items_pedido(session, self._pedido_id)
+            pedido = obtener_pedido(session, self._pedido_id)
+            total_pedido = pedido.monto_total if pedido else 0
 
             rows: list[dict] = []
-            total_pedido = 0
             for it in items:
                 cantidad = it.cantidad or 0
                 precio = it.precio_unitario or 0
-                total_pedido += int(cantidad) * int(precio)
                 rows.append(
                     {
                         "id": it.id,
@@ -251,8 +339,6 @@ class ItemsPedidoDialog(QDialog):
                 saldo_final = pedido.saldo
             else:
                 saldo_final = max(int(total_pedido) - int(abono), 0)
-        finally:
-            session.close()
 
         self.table.setRowCount(len(rows))
 
@@ -292,101 +378,56 @@ class ItemsPedidoDialog(QDialog):
         - Actualiza ítems existentes.
         - Elimina ítems que estaban en la BD pero ya no están en la tabla.
         """
-        session = SessionLocal()
+        filas: list[dict] = []
 
-        try:
-            # Ítems que ya existen en la BD para este pedido
-            existentes: dict[int, ItemPedido] = {
-                it.id: it
-                for it in session.query(ItemPedido)
-                .filter_by(pedido_id=self._pedido_id)
-                .all()
-            }
-
-            # Recorrer las filas de la tabla y actualizar / crear ítems
-            for r in range(self.table.rowCount()):
-                id_item = self.table.item(r, 0)
-                prod_item = self.table.item(r, 1)
-                cant_item = self.table.item(r, 2)
-                prec_item = self.table.item(r, 3)
-
-                # Si no hay celda de producto, ignoramos la fila
-                if not prod_item:
-                    continue
-
-                producto = prod_item.text().strip()
-                if not producto:
-                    # Fila vacía de producto -> no se guarda
-                    continue
-
-                # Cantidad
-                try:
-                    cantidad = int(cant_item.text()) if cant_item and cant_item.text().strip() else 0
-                except Exception:
-                    cantidad = 0
-
-                if cantidad <= 0:
-                    cantidad = 1
-
-                # Precio
-                try:
-                    precio = float(prec_item.text()) if prec_item and prec_item.text().strip() else 0.0
-                except Exception:
-                    precio = 0.0
-
-                # ¿Es un ítem ya existente o uno nuevo?
-                iid: int | None = None
-                if id_item and id_item.text().strip().isdigit():
-                    iid = int(id_item.text().strip())
-
-                if iid is not None and iid in existentes:
-                    # Actualizar ítem existente
-                    it = existentes.pop(iid)
-                    it.producto = producto
-                    it.cantidad = cantidad
-                    it.precio_unitario = precio
-                    it.total_item = cantidad * precio
-                else:
-                    # Crear ítem nuevo
-                    it = ItemPedido(
-                        producto=producto,
-                        cantidad=cantidad,
-                        precio_unitario=precio,
-                        total_item=cantidad * precio,
-                        pedido_id=self._pedido_id,
-                    )
-                    session.add(it)
+        # Recorrer las filas de la tabla
+        for r in range(self.table.rowCount()):
+            id_item = self.table.item(r, 0)
+            prod_item = self.table.item(r, 1)
+            cant_item = self.table.item(r, 2)
+            prec_item = self.table.item(r, 3)
 
-            # Eliminar ítems que ya no están en la tabla
-            for it in existentes.values():
-                session.delete(it)
+            # Si no hay celda de producto, ignoramos la fila
+            if not prod_item:
+                continue
 
-                # Primero guardamos los cambios
-            session.commit()
+            producto = prod_item.text().strip()
+            if not producto:
+                # Fila vacía de producto -> no se guarda
+                continue
 
-                        # ---- Calcular el total del pedido y actualizar saldo final ----
-            total = session.query(ItemPedido).filter_by(pedido_id=self._pedido_id).all()
-            total_pedido = sum(
-                (int(it.cantidad or 0)) * int(it.precio_unitario or 0) for it in total
-            )
+            # Cantidad
+            try:
+                cantidad = int(cant_item.text()) if cant_item and cant_item.text().strip() else 0
+            except Exception:
+                cantidad = 0
 
-            pedido = session.query(Pedido).get(self._pedido_id)
-            if pedido:
-                abono = pedido.monto_pagado or 0
-                pedido.saldo = max(int(total_pedido) - int(abono), 0)
+            if cantidad <= 0:
+                cantidad = 1
 
-            session.commit()
-            # ---------------------------------------------
+            # Precio
+            try:
+                precio = float(prec_item.text()) if prec_item and prec_item.text().strip() else 0.0
+            except Exception:
+                precio = 0.0
 
-            QMessageBox.information(self, "Ítems", "Cambios guardados.")
-            self.load_items()
+            # ¿Es un ítem ya existente o uno nuevo?
+            iid: int | None = None
+            if id_item and id_item.text().strip().isdigit():
+                iid = int(id_item.text().strip())
 
+            filas.append({"id": iid, "producto": producto, "cantidad": cantidad, "precio": precio})
 
+        try:
+            # Crea, actualiza y borra ítems, y recalcula el saldo final
+            with transaccion() as session:
+                guardar_items(session, self._pedido_id, filas)
         except Exception as exc:
-            session.rollback()
             QMessageBox.critical(self, "Error", str(exc))
-        finally:
-            session.close()
+            return
+
+        QMessageBox.information(self, "Ítems", "Cambios guardados.")
+        self.load_items()
 
 
 # ===================================================
@@ -414,25 +455,13 @@ class PedidoFormDialog(QDialog):
         layout = QVBoxLayout(self)
         form = QFormLayout()
 
-               # Combo de clientes + botón "Nuevo cliente"
-        self.cb_cliente = QComboBox()
-        self._clientes_ids: list[int] = []
+        # Selector de cliente (busca al escribir) + botón "Nuevo cliente"
+        self.sel_cliente = SelectorCliente(self)
         self.btn_nuevo_cliente = QPushButton("Nuevo cliente")
-        self.cargar_clientes()
-
-        # Hacer el combo de clientes editable con búsqueda por texto
-        self.cb_cliente.setEditable(True)
-        # Evita que al escribir se creen clientes nuevos en la lista
-        self.cb_cliente.setInsertPolicy(QComboBox.NoInsert)
-        # Autocompletado que busca el texto en cualquier parte del nombre/teléfono
-        completer = QCompleter(self.cb_cliente.model(), self.cb_cliente)
-        completer.setCaseSensitivity(Qt.CaseInsensitive)
-        completer.setFilterMode(Qt.MatchContains)
-        self.cb_cliente.setCompleter(completer)
-
-        # Widget para agrupar combo + botón en la misma fila del formulario
+
+        # Widget para agrupar selector + botón en la misma fila del formulario
         hb_cliente = QHBoxLayout()
-        hb_cliente.addWidget(self.cb_cliente)
+        hb_cliente.addWidget(self.sel_cliente)
         hb_cliente.addWidget(self.btn_nuevo_cliente)
 
         self.dt_fecha = QDateEdit()
@@ -474,13 +503,13 @@ class PedidoFormDialog(QDialog):
 
         hb = QHBoxLayout()
         hb.addStretch()
-        btn_ok = QPushButton("Guardar")
+        self.btn_ok = QPushButton("Guardar")
         btn_cancel = QPushButton("Cancelar")
-        hb.addWidget(btn_ok)
+        hb.addWidget(self.btn_ok)
         hb.addWidget(btn_cancel)
         layout.addLayout(hb)
 
-        btn_ok.clicked.connect(self.accept)
+        self.btn_ok.clicked.connect(self.guardar)
         btn_cancel.clicked.connect(self.reject)
         self.btn_nuevo_cliente.clicked.connect(self.crear_nuevo_cliente)
 
@@ -491,39 +520,22 @@ class PedidoFormDialog(QDialog):
             # En edición también dejamos el número bloqueado
             self.ed_numero.setReadOnly(True)
         else:
-            # Pedido nuevo: generar número automático y bloquear campo
-            session = SessionLocal()
-            try:
-                numero = generar_numero_pedido_db(session, datetime.now())
-            except Exception as exc:
-                numero = ""
-                QMessageBox.critical(self, "Error", f"No se pudo generar N° de pedido:\n{exc}")
-            finally:
-                session.close()
-
-            self.ed_numero.setText(numero)
+            # Pedido nuevo: el número se reserva al guardar (PedidosDialog.nuevo),
+            # en la misma transacción que crea el pedido
+            self.ed_numero.setPlaceholderText("Se asigna al guardar")
             self.ed_numero.setReadOnly(True)
 
     # ------------------- CLIENTES -------------------
 
-    def cargar_clientes(self) -> None:
-        """Carga los clientes en el combo, guardando IDs en un arreglo paralelo."""
-        session = SessionLocal()
-        try:
-            clientes = session.query(Cliente).order_by(Cliente.nombre).all()
-            self._clientes_ids = []
-            self.cb_cliente.clear()
-            for c in clientes:
-                nombre = c.nombre or ""
-                telefono = c.telefono or ""
-                if telefono and nombre:
-                    display = f"{nombre} ({telefono})"
-                else:
-                    display = nombre or telefono
-                self.cb_cliente.addItem(display)
-                self._clientes_ids.append(c.id)
-        finally:
-            session.close()
+    def guardar(self) -> None:
+        """Acepta el formulario solo si hay un cliente elegido en el selector."""
+        if self.sel_cliente.cliente_id is None:
+            QMessageBox.warning(
+                self, "Pedido", "Busca el cliente y elígelo de la lista (o crea uno nuevo)."
+            )
+            self.sel_cliente.setFocus()
+            return
+        self.accept()
 
     def crear_nuevo_cliente(self) -> None:
         """
@@ -597,58 +609,39 @@ class PedidoFormDialog(QDialog):
             )
             return
 
-        rut_limpio = rut.replace(".", "").replace("-", "").upper()
-
-        session = SessionLocal()
         nuevo_id: int | None = None
         try:
-            # Buscar si ya existe un cliente con ese RUT
-            cliente_existente = None
-            for c in session.query(Cliente).all():
-                if not c.rut:
-                    continue
-                rut_existente_limpio = (
-                    c.rut.replace(".", "").replace("-", "").upper()
-                )
-                if rut_existente_limpio == rut_limpio:
-                    cliente_existente = c
-                    break
-
-            if cliente_existente:
-                # Ya existe: usamos ese cliente para el pedido
-                QMessageBox.information(
-                    self,
-                    "Cliente existente",
-                    f"Ya existe un cliente con este RUT:\n"
-                    f"{cliente_existente.nombre} ({cliente_existente.rut}).\n"
-                    f"Se usará ese cliente en el pedido."
-                )
-                nuevo_id = cliente_existente.id
-            else:
-                # No existe: creamos un nuevo cliente
-                c = Cliente(
-                    nombre=nombre,
-                    rut=rut,
-                    telefono=telefono,
-                    correo=correo,
-                    direccion=direccion,
-                    comuna=comuna,
-                )
-                session.add(c)
-                session.commit()
-                nuevo_id = c.id
+            with transaccion() as session:
+                # Buscar si ya existe un cliente con ese RUT (índice único)
+                cliente_existente = buscar_por_rut(session, rut)
+
+                if cliente_existente:
+                    # Ya existe: usamos ese cliente para el pedido
+                    QMessageBox.information(
+                        self,
+                        "Cliente existente",
+                        f"Ya existe un cliente con este RUT:\n"
+                        f"{cliente_existente.nombre} ({cliente_existente.rut}).\n"
+                        f"Se usará ese cliente en el pedido."
+                    )
+                    nuevo_id = cliente_existente.id
+                else:
+                    # No existe: creamos un nuevo cliente
+                    nuevo_id = crear_cliente(
+                        session,
+                        nombre=nombre,
+                        rut=rut,
+                        telefono=telefono,
+                        correo=correo,
+                        direccion=direccion,
+                        comuna=comuna,
+                    ).id
         except Exception as exc:
-            session.rollback()
             QMessageBox.critical(self, "Error", str(exc))
             return
-        finally:
-            session.close()
 
-        # Recargar combo y seleccionar el cliente (nuevo o existente)
-        self.cargar_clientes()
-        if nuevo_id in self._clientes_ids:
-            idx = self._clientes_ids.index(nuevo_id)
-            self.cb_cliente.setCurrentIndex(idx)
+        # Dejar elegido el cliente (nuevo o existente)
+        self.sel_cliente.set_cliente(nuevo_id)
 
 
     # -------------------- PEDIDO --------------------
@@ -658,9 +651,7 @@ class PedidoFormDialog(QDialog):
         p = self._pedido
 
         # Cliente
-        if p.cliente_id in self._clientes_ids:
-            idx = self._clientes_ids.index(p.cliente_id)
-            self.cb_cliente.setCurrentIndex(idx)
+        self.sel_cliente.set_cliente(p.cliente_id)
 
         # Fecha
         if p.fecha_pedido:
@@ -697,8 +688,7 @@ class PedidoFormDialog(QDialog):
 
     def obtener_datos(self) -> dict:
         """Devuelve un diccionario con los datos del formulario."""
-        idx = self.cb_cliente.currentIndex()
-        cliente_id = self._clientes_ids[idx] if idx >= 0 else None
+        cliente_id = self.sel_cliente.cliente_id
 
         fecha_q = self.dt_fecha.date()
         fecha = datetime(fecha_q.year(), fecha_q.month(), fecha_q.day())
@@ -726,6 +716,111 @@ class PedidoFormDialog(QDialog):
 # ================== LISTA PEDIDOS ==================
 # ===================================================
 
+def _columnas_pedido(datos: dict) -> dict:
+    """Datos de PedidoFormDialog.obtener_datos como columnas de Pedido."""
+    return {
+        "cliente_id": datos["cliente_id"],
+        "fecha_pedido": datos["fecha"],
+        "canal_venta": datos["canal"],
+        "forma_pago": datos["forma_pago"],
+        "tipo_documento": datos["tipo_doc"],
+        # El abono se guarda en monto_pagado
+        "monto_pagado": datos["abono"],
+        "despacho": datos["despacho"],
+        "estado": datos["estado"],
+    }
+
+
+def _pedido_a_dict(f) -> dict:
+    """Convierte una fila de listar_pedidos en el dict que muestra la tabla."""
+    total_pedido = f.monto or 0
+
+    abono = f.monto_pagado or 0
+    if f.saldo is not None:
+        saldo_final = f.saldo
+    else:
+        saldo_final = max(int(total_pedido) - int(abono), 0)
+
+    return {
+        "id": f.id,
+        "numero": f.numero_pedido or "",
+        "fecha": f.fecha_pedido.strftime("%Y-%m-%d") if f.fecha_pedido else "",
+        "cliente": f.cliente_nombre or "",
+        # RUT formateado si existe
+        "rut": formatear_rut(f.cliente_rut) if f.cliente_rut else "",
+        "telefono": f.cliente_telefono or "",
+        "monto": int(total_pedido),
+        "abono": int(abono),
+        "saldo_final": int(saldo_final),
+        "estado": f.estado or "",
+        # Claves de búsqueda del cliente, para filtrar en memoria
+        "_tokens": tokens_busqueda(
+            f.cliente_nombre, f.cliente_telefono, f.cliente_correo,
+            f.cliente_direccion, f.cliente_comuna, rut=f.cliente_rut,
+        ),
+    }
+
+
+def filtro_pedidos(
+    numero: str | None = None,
+    cliente: str | None = None,
+    estado: str | None = None,
+    desde=None,
+    hasta=None,
+) -> FiltroFila:
+    """
+    Los filtros de listar_pedidos, evaluados sobre filas ya cargadas
+    (dicts de _pedido_a_dict). Deben dar lo mismo que la consulta a la BD.
+    """
+    numero = numero.lower() if numero else None
+    palabras = palabras_busqueda(cliente)
+    estado = estado.lower() if estado else None
+    desde = desde.isoformat() if desde is not None else None
+    hasta = hasta.isoformat() if hasta is not None else None
+
+    def acepta(d: dict) -> bool:
+        if numero and numero not in d["numero"].lower():
+            return False
+        if palabras and not coincide(palabras, d["_tokens"]):
+            return False
+        if estado and d["estado"].lower() != estado:
+            return False
+        if desde and not (d["fecha"] and d["fecha"] >= desde):
+            return False
+        if hasta and not (d["fecha"] and d["fecha"] <= hasta):
+            return False
+        return True
+
+    return acepta
+
+
+def cubre(fuente: dict, filtros: dict) -> bool:
+    """
+    True si todo pedido que cumple `filtros` cumple también `fuente`, es
+    decir, si filtrar en memoria lo cargado con `fuente` da el resultado
+    completo de `filtros` (p. ej. "Todos" cubre cualquier búsqueda, y
+    "mar" cubre "maria").
+    """
+    numero = fuente.get("numero")
+    if numero and numero.lower() not in (filtros.get("numero") or "").lower():
+        return False
+    palabras = palabras_busqueda(fuente.get("cliente"))
+    if palabras and not es_refinamiento(palabras, palabras_busqueda(filtros.get("cliente"))):
+        return False
+    estado = fuente.get("estado")
+    if estado and estado.lower() != (filtros.get("estado") or "").lower():
+        return False
+    if fuente.get("desde") is not None and (
+        filtros.get("desde") is None or filtros["desde"] < fuente["desde"]
+    ):
+        return False
+    if fuente.get("hasta") is not None and (
+        filtros.get("hasta") is None or filtros["hasta"] > fuente["hasta"]
+    ):
+        return False
+    return True
+
+
 class PedidosDialog(QDialog):
     """Listado y gestión de pedidos."""
 
@@ -784,31 +879,43 @@ class PedidosDialog(QDialog):
         search_layout.addWidget(self.date_hasta)
         search_layout.addWidget(self.btn_buscar)
         search_layout.addWidget(self.btn_limpiar_busqueda)
+        self.indicador_carga = crear_indicador_carga(self)
+        search_layout.addWidget(self.indicador_carga)
 
         layout.addLayout(search_layout)
 
-        # ---- Tabla ----
-        self.table = QTableWidget()
-        self.table.setColumnCount(10)
-        self.table.setHorizontalHeaderLabels(
+        # ---- Tabla (modelo paginado: trae filas a medida que se hace scroll) ----
+        self.model = ModeloTablaPaginado(
             [
-                "ID",
-                "N° Pedido",
-                "Fecha",
-                "Cliente",
-                "RUT",
-                "Teléfono",
-                "Monto",
-                "Abono",
-                "Saldo final",
-                "Estado",
-            ]
+                ("ID", "id"),
+                ("N° Pedido", "numero"),
+                ("Fecha", "fecha"),
+                ("Cliente", "cliente"),
+                ("RUT", "rut"),
+                ("Teléfono", "telefono"),
+                ("Monto", "monto"),
+                ("Abono", "abono"),
+                ("Saldo final", "saldo_final"),
+                ("Estado", "estado"),
+            ],
+            self,
         )
-
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        # Filtro y orden sobre lo ya cargado (ver _mostrar)
+        self.proxy = ProxyFiltroFilas(self.model, self)
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        # Sin columna elegida se mantiene el orden de la BD (más recientes primero)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         layout.addWidget(self.table)
 
+        # Las páginas llegan en segundo plano
+        self.model.cargando.connect(self._al_cambiar_carga)
+        self.model.error.connect(self._al_fallar_carga)
+
         # ---- Botones ----
         hb = QHBoxLayout()
         self.btn_add = QPushButton("Nuevo pedido")
@@ -840,7 +947,17 @@ class PedidosDialog(QDialog):
         self.cb_buscar_por.currentTextChanged.connect(self._cambio_modo_busqueda)
         self.cb_buscar_estado.currentIndexChanged.connect(self.aplicar_busqueda)
 
-        self._datos_pedidos: list[dict] = []
+        # Filtros de la consulta cargada en self.model (None: recargar siempre)
+        self._filtros_cargados: dict | None = None
+
+        # Búsqueda mientras se escribe: se espera una pausa al tipear
+        self._busqueda_mostrada: tuple[str, str] = ("Todos", "")
+        self._temporizador_busqueda = QTimer(self)
+        self._temporizador_busqueda.setSingleShot(True)
+        self._temporizador_busqueda.setInterval(ESPERA_BUSQUEDA_MS)
+        self._temporizador_busqueda.timeout.connect(self._buscar_al_escribir)
+        self.ed_buscar.textChanged.connect(self._temporizador_busqueda.start)
+
         self.cargar()
 
     # ===============================================================
@@ -874,103 +991,61 @@ class PedidosDialog(QDialog):
     # ===============================================================
     # LLENAR TABLA
     # ===============================================================
-    def _llenar_tabla(self, datos: list[dict]) -> None:
-        self.table.setRowCount(len(datos))
-        for i, d in enumerate(datos):
-            self.table.setItem(i, 0, QTableWidgetItem(str(d["id"])))
-            self.table.setItem(i, 1, QTableWidgetItem(d["numero"]))
-            self.table.setItem(i, 2, QTableWidgetItem(d["fecha"]))
-            self.table.setItem(i, 3, QTableWidgetItem(d["cliente"]))
-            # NUEVA COLUMNA RUT (columna 4)
-            self.table.setItem(i, 4, QTableWidgetItem(d.get("rut", "")))
-            # El resto se corre una posición
-            self.table.setItem(i, 5, QTableWidgetItem(d["telefono"]))
-            self.table.setItem(i, 6, QTableWidgetItem(str(int(d["monto"]))))
-            self.table.setItem(i, 7, QTableWidgetItem(str(int(d["abono"]))))
-            self.table.setItem(i, 8, QTableWidgetItem(str(int(d["saldo_final"]))))
-            self.table.setItem(i, 9, QTableWidgetItem(d["estado"]))
+    def _mostrar(self, **filtros) -> None:
+        """
+        Muestra en la tabla los pedidos que cumplen los filtros (los de
+        listar_pedidos).
+
+        Si la consulta ya cargada trajo todas sus filas y abarca la nueva
+        búsqueda (cubre), solo se cambia el filtro del proxy: p. ej. con
+        "Todos" cargado, buscar por estado, fecha o cliente y volver a
+        "Todos" no consulta la BD. Si no, el modelo pide las filas a la BD
+        por páginas según se necesiten, en segundo plano.
+        """
+        filtros = {k: v for k, v in filtros.items() if v}
+        fuente = self._filtros_cargados
+        if fuente is not None and self.model.completo and cubre(fuente, filtros):
+            self.proxy.set_filtro(filtro_pedidos(**filtros) if filtros != fuente else None)
+            return
 
+        def cargar_pagina(session, offset: int, limite: int) -> list[dict]:
+            filas = listar_pedidos(session, offset=offset, limite=limite, **filtros)
+            return [_pedido_a_dict(f) for f in filas]
 
-        self.table.resizeColumnsToContents()
+        self._filtros_cargados = filtros
+        self.proxy.set_filtro(None)
+        self.model.set_consulta(cargar_pagina)
+
+    def _al_cambiar_carga(self, cargando: bool) -> None:
+        self.indicador_carga.setVisible(cargando)
+        # Ajustar columnas con la primera página, no con cada una
+        if not cargando and self.model.rowCount() <= self.model.TAM_PAGINA:
+            self.table.resizeColumnsToContents()
 
+    def _al_fallar_carga(self, mensaje: str) -> None:
+        QMessageBox.critical(self, "Error", f"No se pudieron cargar los pedidos:\n{mensaje}")
 
     # ===============================================================
     # CARGAR PEDIDOS (CON TELÉFONO DEL CLIENTE)
     # ===============================================================
     def cargar(self) -> None:
         """Carga los pedidos desde la BD y rellena la tabla."""
-        session = SessionLocal()
-        try:
-            pedidos = (
-                session.query(Pedido)
-                .join(Cliente, Pedido.cliente_id == Cliente.id)
-                .order_by(Pedido.fecha_pedido.desc())
-                .all()
-            )
-
-            self._datos_pedidos = []
-
-            for p in pedidos:
-                if p.cliente:
-                    nombre = p.cliente.nombre or ""
-                    telefono = p.cliente.telefono or ""
-                    # NUEVO: RUT formateado si existe
-                    rut = formatear_rut(p.cliente.rut) if getattr(p.cliente, "rut", None) else ""
-                else:
-                    nombre = ""
-                    telefono = ""
-                    rut = ""
-
-                                # Calcular monto del pedido a partir de los ítems
-                total_pedido = 0
-                for it in p.items:
-                    total_pedido += int(it.cantidad or 0) * int(it.precio_unitario or 0)
-
-                abono = p.monto_pagado or 0
-                if p.saldo is not None:
-                    saldo_final = p.saldo
-                else:
-                    saldo_final = max(int(total_pedido) - int(abono), 0)
-
-                self._datos_pedidos.append(
-                    {
-                        "id": p.id,
-                        "numero": p.numero_pedido or "",
-                        "fecha": p.fecha_pedido.strftime("%Y-%m-%d") if p.fecha_pedido else "",
-                        "cliente": nombre,
-                        "rut": rut,
-                        "telefono": telefono,
-                        "monto": total_pedido,
-                        "abono": abono,
-                        "saldo_final": saldo_final,
-                        "estado": p.estado or "",
-                    }
-                )
-
-
-        finally:
-            session.close()
-
-        self._llenar_tabla(self._datos_pedidos)
+        self._busqueda_mostrada = ("Todos", "")
+        self._filtros_cargados = None
+        self._mostrar()
 
     # ===============================================================
-    # BÚSQUEDA
+    # BÚSQUEDA (en la BD, o en memoria si lo cargado la abarca)
     # ===============================================================
     def aplicar_busqueda(self) -> None:
+        self._temporizador_busqueda.stop()
         modo = self.cb_buscar_por.currentText()
-        texto = self.ed_buscar.text().lower()
+        texto = self.ed_buscar.text()
+        self._busqueda_mostrada = (modo, texto)
 
         # Buscar por estado
         if modo == "Estado":
-            estado = self.cb_buscar_estado.currentText().lower()
-            if not estado:
-                self._llenar_tabla(self._datos_pedidos)
-                return
-
-            filtrados = [
-                d for d in self._datos_pedidos if d["estado"].lower() == estado
-            ]
-            self._llenar_tabla(filtrados)
+            self._mostrar(estado=self.cb_buscar_estado.currentText() or None)
             return
 
         # Buscar por fecha (rango)
@@ -984,60 +1059,48 @@ class PedidosDialog(QDialog):
             desde = datetime(desde_q.year(), desde_q.month(), desde_q.day()).date()
             hasta = datetime(hasta_q.year(), hasta_q.month(), hasta_q.day()).date()
 
-            filtrados: list[dict] = []
-            for d in self._datos_pedidos:
-                if not d["fecha"]:
-                    continue
-                fdate = datetime.strptime(d["fecha"], "%Y-%m-%d").date()
-                if desde <= fdate <= hasta:
-                    filtrados.append(d)
-
-            self._llenar_tabla(filtrados)
+            self._mostrar(desde=desde, hasta=hasta)
             return
 
         # Buscar por texto
         if modo == "Cliente":
-            filtrados = []
-            for d in self._datos_pedidos:
-                cliente = d["cliente"].lower()
-                telefono = d["telefono"].lower()
-                rut = d.get("rut", "").lower()
-                if texto in cliente or texto in telefono or texto in rut:
-                    filtrados.append(d)
-
-            self._llenar_tabla(filtrados)
+            self._mostrar(cliente=texto)
             return
 
-
         if modo == "N° Pedido":
-            filtrados = [
-                d for d in self._datos_pedidos if texto in d["numero"].lower()
-            ]
-            self._llenar_tabla(filtrados)
+            self._mostrar(numero=texto)
             return
 
         # Todos
-        self._llenar_tabla(self._datos_pedidos)
+        self._mostrar()
 
     # ===============================================================
     # LIMPIAR BÚSQUEDA
     # ===============================================================
     def limpiar_busqueda(self) -> None:
+        self._busqueda_mostrada = ("Todos", "")
         self.ed_buscar.clear()
         self.cb_buscar_por.setCurrentIndex(0)
         self.cb_buscar_estado.setCurrentIndex(0)
         self.date_desde.setDate(QDate.currentDate())
         self.date_hasta.setDate(QDate.currentDate())
-        self._llenar_tabla(self._datos_pedidos)
+        self._temporizador_busqueda.stop()
+        self._mostrar()
+
+    def _buscar_al_escribir(self) -> None:
+        # Solo los modos de texto; en "Todos" el texto no se usa
+        modo = self.cb_buscar_por.currentText()
+        if modo in ("Cliente", "N° Pedido") and (modo, self.ed_buscar.text()) != self._busqueda_mostrada:
+            self.aplicar_busqueda()
 
     # ===============================================================
     # UTILIDAD
     # ===============================================================
     def _id_seleccionado(self) -> int | None:
-        r = self.table.currentRow()
-        if r < 0:
+        d = self.proxy.fila(self.table.currentIndex().row())
+        if d is None:
             return None
-        return int(self.table.item(r, 0).text())
+        return d["id"]
 
     # ===============================================================
     # CRUD DE PEDIDOS
@@ -1056,35 +1119,16 @@ class PedidosDialog(QDialog):
                 QMessageBox.warning(self, "Error", "Debes seleccionar un cliente.")
                 return
 
-            session = SessionLocal()
             nuevo_id: int | None = None
             try:
-                p = Pedido(
-                    cliente_id=datos["cliente_id"],
-                    fecha_pedido=datos["fecha"],
-                    numero_pedido=datos["numero"],
-                    canal_venta=datos["canal"],
-                    forma_pago=datos["forma_pago"],
-                    tipo_documento=datos["tipo_doc"],
-                    # Guardamos el abono en monto_pagado
-                    monto_pagado=datos["abono"],
-                    # El saldo final se calculará según los ítems
-                    saldo=0,
-                    despacho=datos["despacho"],
-                    estado=datos["estado"],
-                )
-
-                session.add(p)
-                session.commit()
-                nuevo_id = p.id
+                # El N° de pedido se reserva en esta misma transacción
+                with transaccion() as session:
+                    nuevo_id = crear_pedido(session, **_columnas_pedido(datos)).id
             except Exception as exc:
-                session.rollback()
                 QMessageBox.critical(
                     self, "Error", f"No se pudo crear el pedido:\n{exc}"
                 )
                 return
-            finally:
-                session.close()
 
             # Si el pedido se creó bien, abrimos inmediatamente la ventana de ítems
             if nuevo_id is not None:
@@ -1100,11 +1144,8 @@ class PedidosDialog(QDialog):
             QMessageBox.warning(self, "Editar", "Selecciona un pedido.")
             return
 
-        session = SessionLocal()
-        try:
-            pedido = session.query(Pedido).get(pid)
-        finally:
-            session.close()
+        with sesion() as session:
+            pedido = obtener_pedido(session, pid)
 
         if not pedido:
             return
@@ -1113,33 +1154,9 @@ class PedidosDialog(QDialog):
         if dlg.exec() == QDialog.Accepted:
             datos = dlg.obtener_datos()
 
-            session = SessionLocal()
-            try:
-                pedido = session.query(Pedido).get(pid)
-                if not pedido:
-                    return
-                pedido.cliente_id = datos["cliente_id"]
-                pedido.fecha_pedido = datos["fecha"]
-                pedido.canal_venta = datos["canal"]
-                pedido.forma_pago = datos["forma_pago"]
-                pedido.tipo_documento = datos["tipo_doc"]
-                               # Guardamos el abono
-                pedido.monto_pagado = datos["abono"]
-                pedido.despacho = datos["despacho"]
-                pedido.estado = datos["estado"]
-
-                # Recalcular saldo final según ítems
-                total_pedido = 0
-                for it in pedido.items:
-                    total_pedido += int(it.cantidad or 0) * int(it.precio_unitario or 0)
-
-                abono = pedido.monto_pagado or 0
-                pedido.saldo = max(int(total_pedido) - int(abono), 0)
-
-                session.commit()
-
-            finally:
-                session.close()
+            # Guarda los cambios y recalcula el saldo final según los ítems
+            with transaccion() as session:
+                actualizar_pedido(session, pid, **_columnas_pedido(datos))
 
             self.cargar()
 
@@ -1154,14 +1171,8 @@ class PedidosDialog(QDialog):
         ) != QMessageBox.Yes:
             return
 
-        session = SessionLocal()
-        try:
-            pedido = session.query(Pedido).get(pid)
-            if pedido:
-                session.delete(pedido)
-                session.commit()
-        finally:
-            session.close()
+        with transaccion() as session:
+            eliminar_pedido(session, pid)
 
         self.cargar()
 
@@ -1182,6 +1193,23 @@ class PedidosDialog(QDialog):
 # =========== HISTORIAL DE COMPRAS CLIENTE ==========
 # ===================================================
 
+def historial_cliente(session, cliente_id: int, offset: int = 0,
+                      limite: int | None = None) -> list[dict]:
+    """Una página de pedidos de un cliente (más recientes primero), como dicts para la tabla."""
+    filas = listar_pedidos(session, cliente_id=cliente_id, offset=offset, limite=limite)
+    return [_pedido_a_dict(f) for f in filas]
+
+
+def texto_resumen_cliente(resumen: dict) -> str:
+    """Línea de resumen de un cliente (ver repository.resumen_por_cliente)."""
+    ultimo = resumen["ultimo_pedido"]
+    return (
+        f"Pedidos: {resumen['n_pedidos']} | Total comprado: {resumen['monto_total']} | "
+        f"Saldo pendiente: {resumen['saldo_pendiente']} | "
+        f"Último pedido: {ultimo.strftime('%Y-%m-%d') if ultimo else '-'}"
+    )
+
+
 class HistorialClienteDialog(QDialog):
     """Historial de compras de un cliente específico."""
 
@@ -1198,92 +1226,98 @@ class HistorialClienteDialog(QDialog):
         self.setWindowTitle("Historial de compras")
         self.resize(750, 350)
         self._cliente_id = cliente_id
+        self._tarea: ConsultaBD | None = None
 
         layout = QVBoxLayout(self)
 
-        self.table = QTableWidget()
-        self.table.setColumnCount(7)
-        self.table.setHorizontalHeaderLabels(
-            ["ID pedido", "N° Pedido", "Fecha", "Monto", "Abono", "Saldo final", "Estado"]
-        )
+        # Resumen precalculado del cliente (tabla resumen_clientes)
+        self.lbl_resumen = QLabel()
+        layout.addWidget(self.lbl_resumen)
 
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        # ---- Tabla (modelo paginado: trae filas a medida que se hace scroll) ----
+        self.model = ModeloTablaPaginado(
+            [
+                ("ID pedido", "id"),
+                ("N° Pedido", "numero"),
+                ("Fecha", "fecha"),
+                ("Monto", "monto"),
+                ("Abono", "abono"),
+                ("Saldo final", "saldo_final"),
+                ("Estado", "estado"),
+            ],
+            self,
+        )
+        self.proxy = ProxyFiltroFilas(self.model, self)
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
         layout.addWidget(self.table)
-        
 
         hb = QHBoxLayout()
         self.btn_items = QPushButton("Ver ítems")
         self.btn_close = QPushButton("Cerrar")
+        self.indicador_carga = crear_indicador_carga(self)
         hb.addWidget(self.btn_items)
+        hb.addWidget(self.indicador_carga)
         hb.addStretch()
         hb.addWidget(self.btn_close)
         layout.addLayout(hb)
 
+        self.model.cargando.connect(self._al_cambiar_carga)
+        self.model.error.connect(self._al_fallar_carga)
         self.btn_items.clicked.connect(self.ver_items)
         self.btn_close.clicked.connect(self.accept)
 
         self.cargar()
 
     def cargar(self) -> None:
-        """Carga el historial de pedidos de un cliente."""
-        session = SessionLocal()
-        try:
-            pedidos = (
-                session.query(Pedido)
-                .filter(Pedido.cliente_id == self._cliente_id)
-                .order_by(Pedido.fecha_pedido.desc())
-                .all()
-            )
+        """Carga el resumen y el historial del cliente (en segundo plano, por páginas)."""
+        cliente_id = self._cliente_id
 
-            datos: list[dict] = []
-            for p in pedidos:
-                                # Calcular monto del pedido desde los ítems
-                total_pedido = 0
-                for it in p.items:
-                    total_pedido += int(it.cantidad or 0) * int(it.precio_unitario or 0)
+        def cargar_pagina(session, offset: int, limite: int) -> list[dict]:
+            return historial_cliente(session, cliente_id, offset, limite)
 
-                abono = p.monto_pagado or 0
-                if p.saldo is not None:
-                    saldo_final = p.saldo
-                else:
-                    saldo_final = max(int(total_pedido) - int(abono), 0)
+        self.model.set_consulta(cargar_pagina)
 
-                datos.append(
-                    {
-                        "id": p.id,
-                        "numero": p.numero_pedido or "",
-                        "fecha": p.fecha_pedido.strftime("%Y-%m-%d")
-                        if p.fecha_pedido
-                        else "",
-                        "monto": total_pedido,
-                        "abono": abono,
-                        "saldo_final": saldo_final,
-                        "estado": p.estado or "",
-                    }
-                )
+        if self._tarea is not None:
+            self._tarea.cancelar()
+        tarea = ConsultaBD(resumen_por_cliente, [cliente_id])
+        tarea.senales.terminado.connect(lambda datos: self._mostrar_resumen(tarea, datos))
+        tarea.senales.fallo.connect(lambda exc: self._al_fallar(tarea, exc))
+        self._tarea = tarea
+        tarea.iniciar()
 
-        finally:
-            session.close()
+    def _al_cambiar_carga(self, cargando: bool) -> None:
+        self.indicador_carga.setVisible(cargando)
+        if not cargando and self.model.rowCount() <= self.model.TAM_PAGINA:
+            self.table.resizeColumnsToContents()
 
-        self.table.setRowCount(len(datos))
+    def _al_fallar_carga(self, mensaje: str) -> None:
+        QMessageBox.critical(self, "Error", f"No se pudo cargar el historial:\n{mensaje}")
 
-        for i, d in enumerate(datos):
-            self.table.setItem(i, 0, QTableWidgetItem(str(d["id"])))
-            self.table.setItem(i, 1, QTableWidgetItem(d["numero"]))
-            self.table.setItem(i, 2, QTableWidgetItem(d["fecha"]))
-            self.table.setItem(i, 3, QTableWidgetItem(str(d["monto"])))
-            self.table.setItem(i, 4, QTableWidgetItem(str(d["abono"])))
-            self.table.setItem(i, 5, QTableWidgetItem(str(d["saldo_final"])))
-            self.table.setItem(i, 6, QTableWidgetItem(d["estado"]))
+    def _al_fallar(self, tarea: ConsultaBD, exc: Exception) -> None:
+        if tarea is not self._tarea:
+            return
+        self._tarea = None
+        if not isinstance(exc, TareaCancelada):
+            self.lbl_resumen.setText(f"No se pudo cargar el resumen: {exc}")
 
-        self.table.resizeColumnsToContents()
+    def _mostrar_resumen(self, tarea: ConsultaBD, resumenes: dict[int, dict]) -> None:
+        if tarea is not self._tarea:
+            # Resultado de una carga reemplazada
+            return
+        self._tarea = None
+        self.lbl_resumen.setText(texto_resumen_cliente(resumenes[self._cliente_id]))
 
     def _id_pedido_seleccionado(self) -> int | None:
-        r = self.table.currentRow()
-        if r < 0:
+        d = self.proxy.fila(self.table.currentIndex().row())
+        if d is None:
             return None
-        return int(self.table.item(r, 0).text())
+        return d["id"]
 
     def ver_items(self) -> None:
         pid = self._id_pedido_seleccionado()
@@ -0,0 +1,84 @@
+# gui/respaldo_automatico.py
+"""
+Respaldo automático periódico mientras la app está abierta.
+
+Cada config.get_intervalo_respaldo() minutos se lanza en segundo plano
+(ver tareas.py) un respaldo con backup.DetectorCambios: si nadie escribió
+en la BD desde el último respaldo, no se copia nada. Sin carpeta de
+respaldo configurada el temporizador queda detenido.
+"""
+from PySide6.QtCore import QObject, QTimer, Signal
+
+from backup import DetectorCambios
+from config import get_backup_folder, get_intervalo_respaldo
+from .tareas import Tarea, TareaCancelada
+
+
+class RespaldoAutomatico(QObject):
+    # Texto para la barra de estado de la ventana
+    mensaje = Signal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.detector = DetectorCambios()
+        self.tarea = None
+        self._al_detener = None
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.ejecutar)
+        self.configurar()
+
+    @property
+    def en_curso(self) -> bool:
+        return self.tarea is not None
+
+    def configurar(self, minutos: int | None = None):
+        """
+        Reinicia el temporizador con el intervalo indicado (0 = desactivado;
+        None = el de config). Si no hay carpeta de respaldo, lo detiene.
+        """
+        if minutos is None:
+            minutos = get_intervalo_respaldo()
+        if minutos > 0 and get_backup_folder():
+            self.timer.start(minutos * 60 * 1000)
+        else:
+            self.timer.stop()
+
+    def ejecutar(self):
+        if self.tarea is not None:
+            # El respaldo anterior todavía no termina
+            return
+        if not get_backup_folder():
+            # Se quitó la carpeta de config.json: configurar() lo reanuda
+            self.timer.stop()
+            return
+        self.tarea = Tarea(self.detector.respaldar_si_cambio)
+        self.tarea.senales.terminado.connect(self._fin)
+        self.tarea.senales.fallo.connect(self._fin)
+        self.tarea.iniciar()
+
+    def _fin(self, resultado):
+        self.tarea = None
+        if isinstance(resultado, TareaCancelada):
+            pass
+        elif isinstance(resultado, Exception):
+            self.mensaje.emit(f"No se pudo generar el respaldo automático: {resultado}")
+        elif resultado is not None:
+            self.mensaje.emit(f"Respaldo automático generado: {resultado['nombre']}")
+
+        if self._al_detener is not None:
+            al_detener, self._al_detener = self._al_detener, None
+            self.detector.cerrar()
+            al_detener()
+
+    def detener(self, al_detener=None):
+        """
+        Detiene el temporizador y cancela el respaldo en curso, si hay uno.
+        Si había uno, al_detener() se llama cuando termina de cortarse.
+        """
+        self.timer.stop()
+        if self.tarea is None:
+            self.detector.cerrar()
+        else:
+            self._al_detener = al_detener or (lambda: None)
+            self.tarea.cancelar()
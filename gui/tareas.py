@@ -0,0 +1,139 @@
+# gui/tareas.py
+"""
+Tareas en segundo plano para la GUI.
+
+Tarea ejecuta una función en QThreadPool para no congelar la ventana. El
+avance, el resultado y los errores llegan como señales Qt, que se
+entregan en el hilo de la GUI.
+
+La función recibe como primer argumento progreso(hechas, total): cada
+llamada emite la señal progreso (como mucho cada INTERVALO_PROGRESO
+segundos) y, si se pidió cancelar, lanza TareaCancelada para cortar el
+trabajo en ese punto.
+
+ConsultaBD es una Tarea para leer de la BD: la función recibe una sesión
+propia (SessionLocal) en vez de progreso, y cancelar() interrumpe la
+sentencia SQL que esté corriendo.
+"""
+import threading
+import time
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+from PySide6.QtWidgets import QProgressBar
+
+from db import SessionLocal
+
+# Menos señales de avance: la barra no necesita más de 10 cambios por segundo
+INTERVALO_PROGRESO = 0.1  # segundos
+
+# Tareas en curso: el pool no guarda referencias de Python, así que sin
+# esto una tarea reemplazada podría liberarse mientras todavía corre
+_activas: set = set()
+
+
+class TareaCancelada(Exception):
+    """Se pidió cancelar la tarea desde la GUI."""
+
+
+class _SenalesTarea(QObject):
+    progreso = Signal(int, int)
+    terminado = Signal(object)   # resultado de la función
+    fallo = Signal(object)       # la excepción (TareaCancelada si se canceló)
+
+
+class Tarea(QRunnable):
+    def __init__(self, funcion, *args, **kwargs):
+        super().__init__()
+        self.setAutoDelete(False)
+        self.funcion = funcion
+        self.args = args
+        self.kwargs = kwargs
+        self.senales = _SenalesTarea()
+        self._cancelar = threading.Event()
+        self._ultimo_aviso = 0.0
+
+    def cancelar(self):
+        self._cancelar.set()
+
+    @property
+    def cancelada(self) -> bool:
+        return self._cancelar.is_set()
+
+    def _progreso(self, hechas: int, total: int):
+        if self._cancelar.is_set():
+            raise TareaCancelada()
+        ahora = time.monotonic()
+        if hechas >= total or ahora - self._ultimo_aviso >= INTERVALO_PROGRESO:
+            self._ultimo_aviso = ahora
+            self.senales.progreso.emit(hechas, total)
+
+    def _ejecutar(self):
+        return self.funcion(self._progreso, *self.args, **self.kwargs)
+
+    def run(self):
+        try:
+            resultado = self._ejecutar()
+        except Exception as exc:
+            if self.cancelada and not isinstance(exc, TareaCancelada):
+                exc = TareaCancelada()
+            self.senales.fallo.emit(exc)
+        else:
+            self.senales.terminado.emit(resultado)
+
+    def _soltar(self, _resultado=None):
+        _activas.discard(self)
+
+    def iniciar(self, pool: QThreadPool | None = None) -> "Tarea":
+        # Conectado al final: se suelta después de avisar a los demás
+        self.senales.terminado.connect(self._soltar)
+        self.senales.fallo.connect(self._soltar)
+        _activas.add(self)
+        (pool or QThreadPool.globalInstance()).start(self)
+        return self
+
+
+class ConsultaBD(Tarea):
+    """
+    Ejecuta funcion(session, *args, **kwargs) en el pool con una sesión
+    propia, que se cierra al terminar. El resultado debe ser datos simples
+    (dicts, tuplas), no objetos ORM ligados a esa sesión.
+    """
+
+    def __init__(self, funcion, *args, **kwargs):
+        super().__init__(funcion, *args, **kwargs)
+        self._bloqueo = threading.Lock()
+        self._conexion = None
+
+    def cancelar(self):
+        super().cancelar()
+        # sqlite3 interrupt() es seguro desde otro hilo; el bloqueo evita
+        # interrumpir la conexión después de que volvió al pool
+        with self._bloqueo:
+            if self._conexion is not None:
+                self._conexion.interrupt()
+
+    def _ejecutar(self):
+        if self.cancelada:
+            raise TareaCancelada()
+        session = SessionLocal()
+        try:
+            with self._bloqueo:
+                self._conexion = session.connection().connection.dbapi_connection
+            if self.cancelada:
+                raise TareaCancelada()
+            return self.funcion(session, *self.args, **self.kwargs)
+        finally:
+            with self._bloqueo:
+                self._conexion = None
+            session.close()
+
+
+def crear_indicador_carga(parent=None) -> QProgressBar:
+    """Barra "ocupada" para mostrar mientras una consulta está en curso (oculta al inicio)."""
+    barra = QProgressBar(parent)
+    barra.setRange(0, 0)
+    barra.setTextVisible(False)
+    barra.setMaximumWidth(120)
+    barra.setMaximumHeight(14)
+    barra.setVisible(False)
+    return barra
@@ -1,14 +1,49 @@
 import pandas as pd
+from pandas.io.parsers import TextParser
+from sqlalchemy import insert, select, update
 from sqlalchemy.orm import Session
 from datetime import datetime
+from typing import Iterable, Iterator
 
 from db import SessionLocal
 from models import Cliente, Pedido, ItemPedido
-
-
-def generar_codigo_pedido(fecha: datetime, correlativo: int) -> str:
-    """Genera un código de pedido interno si el Excel no trae uno."""
-    return "P" + fecha.strftime("%Y%m%d") + f"-{correlativo:03d}"
+from numeracion import siguiente_numero_pedido
+
+
+# Filas del Excel que se confirman juntas en importar_excel
+TAM_LOTE = 2000
+
+# Sobre este tamaño (bytes) conviene importar .xlsx con importar_excel_streaming
+UMBRAL_STREAMING = 20 * 1024 * 1024
+
+# Encabezados del Excel → nombres de columna internos
+COLUMNAS_EXCEL = {
+    "FECHA": "fecha",
+    "CANAL DE VENTA": "canal_venta",
+    "PEDIDO": "numero_pedido",
+    "CLIENTE": "cliente",
+    "TELÉFONO": "telefono",
+    "DIRECCIÓN": "direccion",
+    "COMUNA": "comuna",
+    "PRODUCTOS": "producto",
+    "UNID": "unidades",
+    "FORMA DE PAGO": "forma_pago",
+    "BOLETA": "tipo_documento",
+    "PAGO": "pago",
+    "SALDO": "saldo",
+    "DESPACHO": "despacho",
+    "CORREO": "correo",
+    "ESTADO": "estado",
+}
+
+
+def generar_codigo_pedido(session: Session, fecha: datetime) -> str:
+    """
+    Reserva un código de pedido interno si el Excel no trae uno, con la
+    misma secuencia por día que los pedidos creados en la app (numeracion).
+    Debe ir en la transacción que inserta el pedido.
+    """
+    return siguiente_numero_pedido(session, fecha)
 
 
 def limpiar_nan(valor, es_telefono: bool = False) -> str:
@@ -73,78 +108,143 @@ def a_entero_o_cero(valor) -> int:
         return 0
 
 
-def limpiar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
-    df = df.dropna(how="all").copy()
-
-    cols_ffill_global = [
-        "fecha", "canal_venta", "numero_pedido",
-        "forma_pago", "tipo_documento", "pago",
-        "saldo", "despacho", "estado"
-    ]
-    for col in cols_ffill_global:
-        if col in df.columns:
-            df[col] = df[col].ffill()
-
-    cleaned_rows = []
-    current_cliente = None
-    contactos_por_cliente: dict[str, dict[str, str]] = {}
-
-    for _, original_row in df.iterrows():
-        row = original_row.copy()
-
-        cliente_str = limpiar_nan(row.get("cliente"))
-
-        if cliente_str:
-            current_cliente = cliente_str
-
-            info = contactos_por_cliente.get(current_cliente, {})
-            for campo in ["telefono", "direccion", "comuna", "correo"]:
-                if campo in df.columns:
-                    if campo == "telefono":
-                        val = limpiar_nan(row.get(campo), es_telefono=True)
-                    else:
-                        val = limpiar_nan(row.get(campo))
-                    if val:
-                        info[campo] = val
-            contactos_por_cliente[current_cliente] = info
-
-        elif current_cliente:
-            row["cliente"] = current_cliente
-
-        if current_cliente and current_cliente in contactos_por_cliente:
-            info = contactos_por_cliente[current_cliente]
-            for campo in ["telefono", "direccion", "comuna", "correo"]:
-                if campo in df.columns:
-                    if campo == "telefono":
-                        val = limpiar_nan(row.get(campo), es_telefono=True)
-                    else:
-                        val = limpiar_nan(row.get(campo))
-                    if not val and campo in info:
-                        row[campo] = info[campo]
-                    else:
-                        row[campo] = val
+def _entero_desde_cientifica(txt: str) -> str:
+    """9.5e+08 -> 950000000; si no es un número, lo deja igual."""
+    try:
+        return str(int(float(txt)))
+    except Exception:
+        return txt
+
+
+def limpiar_columna(serie: pd.Series, es_telefono: bool = False) -> pd.Series:
+    """
+    Igual que limpiar_nan, pero para una columna completa a la vez
+    (operaciones .str de pandas en vez de una llamada por celda).
+    """
+    txt = serie.astype(object).where(serie.notna(), "").map(str).str.strip()
+    txt = txt.mask(txt.str.lower() == "nan", "")
+
+    if es_telefono:
+        txt = txt.mask(txt.str.endswith(".0"), txt.str[:-2])
+
+        minus = txt.str.lower()
+        cientifica = (
+            minus.str.contains("e+", regex=False)
+            | minus.str.contains("e-", regex=False)
+        )
+        if cientifica.any():
+            # Pocas celdas: se convierten una a una, igual que limpiar_nan
+            txt[cientifica] = txt[cientifica].map(_entero_desde_cientifica)
+
+        for caracter in (" ", ",", "-"):
+            txt = txt.str.replace(caracter, "", regex=False)
+
+    return txt
+
+
+_COLS_FFILL_GLOBAL = [
+    "fecha", "canal_venta", "numero_pedido",
+    "forma_pago", "tipo_documento", "pago",
+    "saldo", "despacho", "estado"
+]
+_CAMPOS_CONTACTO = ("telefono", "correo", "direccion", "comuna")
+_CAMPOS_TEXTO = [
+    "canal_venta", "numero_pedido", "forma_pago",
+    "tipo_documento", "despacho", "estado", "producto"
+]
+
+
+class LimpiadorExcel:
+    """
+    Aplica limpiar_dataframe a la planilla por partes, en orden.
+
+    Guarda lo que se arrastra de una parte a la siguiente: el último valor
+    de cada columna que se rellena hacia abajo, el cliente vigente y el
+    último dato de contacto de cada cliente. Así limpiar el archivo en
+    trozos da el mismo resultado que limpiarlo entero.
+    """
+
+    def __init__(self) -> None:
+        self._ultimos: dict[str, object] = {}
+        self._cliente_actual: str | None = None
+        self._contactos: dict[str, dict[str, str]] = {c: {} for c in _CAMPOS_CONTACTO}
+
+    def limpiar(self, df: pd.DataFrame) -> pd.DataFrame:
+        df = df.dropna(how="all").copy()
+        if df.empty:
+            return pd.DataFrame()
+
+        for col in _COLS_FFILL_GLOBAL:
+            if col not in df.columns:
+                continue
+            ultimo = df[col].last_valid_index()
+            serie = df[col].ffill()
+            if col in self._ultimos:
+                serie = serie.fillna(self._ultimos[col])
+            if ultimo is not None:
+                self._ultimos[col] = df[col][ultimo]
+            df[col] = serie
+
+        if "cliente" in df.columns:
+            cliente = limpiar_columna(df["cliente"])
         else:
-            for campo in ["telefono", "direccion", "comuna", "correo"]:
-                if campo in df.columns:
-                    row[campo] = limpiar_nan(
-                        row.get(campo),
-                        es_telefono=(campo == "telefono")
-                    )
-
-        for campo_texto in [
-            "canal_venta", "numero_pedido", "forma_pago",
-            "tipo_documento", "despacho", "estado", "producto"
-        ]:
+            cliente = pd.Series("", index=df.index, dtype=object)
+        con_cliente = cliente != ""
+        # Cliente vigente de cada fila (NaN antes del primer cliente)
+        cliente_actual = cliente.where(con_cliente).ffill()
+        if self._cliente_actual is not None:
+            cliente_actual = cliente_actual.fillna(self._cliente_actual)
+        if pd.notna(cliente_actual.iloc[-1]):
+            self._cliente_actual = cliente_actual.iloc[-1]
+
+        if "cliente" in df.columns:
+            heredado = ~con_cliente & cliente_actual.notna()
+            df["cliente"] = df["cliente"].astype(object).mask(heredado, cliente_actual)
+
+        for campo in ["telefono", "direccion", "comuna", "correo"]:
+            if campo not in df.columns:
+                continue
+            valor = limpiar_columna(df[campo], es_telefono=(campo == "telefono"))
+            # Último dato no vacío de cada cliente, tomado solo de filas con cliente escrito
+            escrito = con_cliente & (valor != "")
+            conocido = valor.where(escrito).groupby(cliente_actual).ffill()
+            previos = self._contactos[campo]
+            if previos:
+                conocido = conocido.fillna(cliente_actual.map(previos))
+            previos.update(valor[escrito].groupby(cliente[escrito]).last().to_dict())
+            df[campo] = valor.mask((valor == "") & conocido.notna(), conocido)
+
+        for campo_texto in _CAMPOS_TEXTO:
             if campo_texto in df.columns:
-                row[campo_texto] = limpiar_nan(row.get(campo_texto))
+                df[campo_texto] = limpiar_columna(df[campo_texto])
 
-        cleaned_rows.append(row)
+        return df.infer_objects()
 
-    cleaned_df = pd.DataFrame(cleaned_rows)
-    return cleaned_df
 
+def limpiar_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Deja el DataFrame del Excel listo para importar:
+    - Arrastra hacia abajo fecha, canal, N° de pedido, pago, etc.
+    - Las filas sin cliente heredan el último cliente de arriba.
+    - Teléfono, dirección, comuna y correo vacíos se completan con el
+      último dato conocido de ese mismo cliente (en filas donde el cliente
+      aparece escrito).
+    - Las columnas de texto quedan como str, sin NaN.
+
+    Todo se hace por columnas; no hay bucles fila por fila.
+    """
+    return LimpiadorExcel().limpiar(df)
 
-def importar_excel(ruta_excel: str):
+
+def leer_excel(ruta_excel: str) -> pd.DataFrame:
+    """
+    Lee la planilla de ventas y devuelve el DataFrame limpio (limpiar_dataframe).
+
+    El archivo se parsea una sola vez: la fila de encabezados ("FECHA") se
+    busca en esa lectura y las mismas celdas se pasan por TextParser, que
+    es lo que hace pd.read_excel(header=...) por dentro (mismos tipos y
+    nombres de columna).
+    """
     df_raw = pd.read_excel(ruta_excel, header=None)
 
     header_rows = df_raw.index[df_raw.iloc[:, 0] == "FECHA"].tolist()
@@ -152,127 +252,142 @@ def importar_excel(ruta_excel: str):
         raise ValueError("No se encontró una fila con 'FECHA' como encabezado.")
     header_row = header_rows[0]
 
-    df = pd.read_excel(ruta_excel, header=header_row)
-
-    df = df.rename(columns={
-        "FECHA": "fecha",
-        "CANAL DE VENTA": "canal_venta",
-        "PEDIDO": "numero_pedido",
-        "CLIENTE": "cliente",
-        "TELÉFONO": "telefono",
-        "DIRECCIÓN": "direccion",
-        "COMUNA": "comuna",
-        "PRODUCTOS": "producto",
-        "UNID": "unidades",
-        "FORMA DE PAGO": "forma_pago",
-        "BOLETA": "tipo_documento",
-        "PAGO": "pago",
-        "SALDO": "saldo",
-        "DESPACHO": "despacho",
-        "CORREO": "correo",
-        "ESTADO": "estado",
-    })
-
-    df = limpiar_dataframe(df)
+    df = TextParser(df_raw.values.tolist(), header=header_row).read()
 
-    session: Session = SessionLocal()
+    df = df.rename(columns=COLUMNAS_EXCEL)
+
+    return limpiar_dataframe(df)
 
+
+def _valor_celda(celda):
+    """Convierte una celda de openpyxl igual que pd.read_excel."""
+    if celda.value is None:
+        return ""
+    if celda.data_type == "e":  # error de fórmula (#N/A, #REF!, ...)
+        return float("nan")
+    if celda.data_type == "n":
+        entero = int(celda.value)
+        return entero if entero == celda.value else float(celda.value)
+    return celda.value
+
+
+def leer_excel_por_partes(ruta_excel: str, tam_parte: int = TAM_LOTE) -> Iterator[pd.DataFrame]:
+    """
+    Recorre la planilla con openpyxl en modo solo lectura y entrega
+    DataFrames de hasta tam_parte filas (columnas renombradas, sin limpiar).
+    Nunca se carga el archivo completo en memoria.
+
+    Los números enteros quedan como float: leyendo el archivo entero,
+    pandas hace lo mismo en toda columna con celdas vacías (lo normal en la
+    planilla), y así un N° de pedido 10027 queda "10027.0" en ambos modos y
+    no se duplica al reimportar.
+    """
+    from openpyxl import load_workbook
+
+    libro = load_workbook(ruta_excel, read_only=True, data_only=True, keep_links=False)
     try:
-        correlativo_interno = 1
+        hoja = libro.worksheets[0]
+        hoja.reset_dimensions()
+        filas = hoja.rows
+
+        encabezado = None
+        for fila in filas:
+            valores = [_valor_celda(c) for c in fila]
+            if valores and valores[0] == "FECHA":
+                encabezado = valores
+                break
+        if encabezado is None:
+            raise ValueError("No se encontró una fila con 'FECHA' como encabezado.")
+        while encabezado[-1] == "":
+            encabezado.pop()
+        ancho = len(encabezado)
+
+        parte: list[list] = []
+        for fila in filas:
+            valores = [_valor_celda(c) for c in fila[:ancho]]
+            parte.append(valores + [""] * (ancho - len(valores)))
+            if len(parte) == tam_parte:
+                yield _parte_a_dataframe(encabezado, parte)
+                parte = []
+        if parte:
+            yield _parte_a_dataframe(encabezado, parte)
+    finally:
+        libro.close()
 
-        for _, row in df.iterrows():
-            cliente_nombre = limpiar_nan(row.get("cliente"))
-            producto_nombre = limpiar_nan(row.get("producto"))
 
-            if not cliente_nombre and not producto_nombre:
-                continue
+def _parte_a_dataframe(encabezado: list, filas: list[list]) -> pd.DataFrame:
+    df = TextParser([encabezado] + filas, header=0).read()
+    enteras = df.select_dtypes("integer").columns
+    if len(enteras):
+        df[enteras] = df[enteras].astype(float)
+    return df.rename(columns=COLUMNAS_EXCEL)
 
-            if pd.isna(row.get("fecha")):
-                continue
 
-            cliente = (
-                session.query(Cliente)
-                .filter(Cliente.nombre == cliente_nombre)
-                .first()
-            )
-
-            tel = limpiar_nan(row.get("telefono"), es_telefono=True)
-            cor = limpiar_nan(row.get("correo"))
-            dir_ = limpiar_nan(row.get("direccion"))
-            com = limpiar_nan(row.get("comuna"))
-
-            if not cliente:
-                cliente = Cliente(
-                    nombre=cliente_nombre,
-                    telefono=tel,
-                    correo=cor,
-                    direccion=dir_,
-                    comuna=com,
-                )
-                session.add(cliente)
-                session.flush()
-            else:
-                if tel:
-                    cliente.telefono = tel
-                if cor:
-                    cliente.correo = cor
-                if dir_:
-                    cliente.direccion = dir_
-                if com:
-                    cliente.comuna = com
-
-            fecha_pedido = pd.to_datetime(row.get("fecha")).to_pydatetime()
-
-            numero_pedido = limpiar_nan(row.get("numero_pedido"))
-            if not numero_pedido:
-                continue
+def importar_excel(ruta_excel: str, progreso=None, tam_lote: int = TAM_LOTE) -> dict:
+    """
+    Importa clientes, pedidos e ítems desde el Excel de ventas.
 
-            pedido = (
-                session.query(Pedido)
-                .filter(Pedido.numero_pedido == numero_pedido)
-                .first()
-            )
-
-            if not pedido:
-                pedido = Pedido(
-                    numero_pedido=numero_pedido,
-                    fecha_pedido=fecha_pedido,
-                    canal_venta=limpiar_nan(row.get("canal_venta")),
-                    forma_pago=limpiar_nan(row.get("forma_pago")),
-                    tipo_documento=limpiar_nan(row.get("tipo_documento")),
-                    monto_pagado=a_entero_o_cero(row.get("pago")),
-                    saldo=a_entero_o_cero(row.get("saldo")),
-                    estado=limpiar_nan(row.get("estado")),
-                    cliente_id=cliente.id,
-                )
-                session.add(pedido)
-                session.flush()
-            else:
-                if not pedido.canal_venta:
-                    pedido.canal_venta = limpiar_nan(row.get("canal_venta"))
-                if not pedido.forma_pago:
-                    pedido.forma_pago = limpiar_nan(row.get("forma_pago"))
-                if not pedido.tipo_documento:
-                    pedido.tipo_documento = limpiar_nan(row.get("tipo_documento"))
-
-            if not producto_nombre:
-                continue
+    progreso: función opcional progreso(filas_procesadas, total_filas) que
+    se llama después de cada lote (p. ej. para una barra de avance).
+
+    Devuelve un diccionario con conteo de registros nuevos.
+    """
+    return importar_dataframe(leer_excel(ruta_excel), progreso, tam_lote)
+
+
+def importar_excel_streaming(ruta_excel: str, progreso=None, tam_lote: int = TAM_LOTE) -> dict:
+    """
+    Igual que importar_excel, pero sin cargar la planilla entera: se lee,
+    limpia y guarda de a tam_lote filas (leer_excel_por_partes +
+    LimpiadorExcel), con un commit por parte. La memoria usada depende de
+    tam_lote y de los clientes/pedidos conocidos, no del tamaño del archivo.
+
+    Solo .xlsx. Como no se sabe cuántas filas hay, progreso recibe
+    total_filas = 0.
+    """
+    limpiador = LimpiadorExcel()
+    partes = (
+        (limpiador.limpiar(parte).to_dict("records"), len(parte))
+        for parte in leer_excel_por_partes(ruta_excel, tam_lote)
+    )
+    return _importar_partes(partes, progreso)
+
+
+def importar_dataframe(df: pd.DataFrame, progreso=None, tam_lote: int = TAM_LOTE) -> dict:
+    """Guarda en la BD las filas de un DataFrame ya limpio, de a tam_lote filas."""
+    filas = df.to_dict("records")
+    partes = (
+        (filas[inicio:inicio + tam_lote], len(filas[inicio:inicio + tam_lote]))
+        for inicio in range(0, len(filas), tam_lote)
+    )
+    return _importar_partes(partes, progreso, total=len(filas))
+
+
+def _importar_partes(partes: Iterable[tuple[list[dict], int]], progreso=None, total: int = 0) -> dict:
+    """
+    Guarda las filas limpias que llegan por partes (filas, filas_leídas).
 
-            unidades = a_entero_o_cero(row.get("unidades"))
-            if unidades <= 0:
-                unidades = 1
+    Los clientes (por nombre) y pedidos (por N°) que ya existen se cargan una
+    sola vez en diccionarios; lo nuevo se inserta en bloque y se confirma
+    al final de cada parte. Si algo falla, solo se pierde la parte en curso.
+    """
+    session: Session = SessionLocal()
 
-            item = ItemPedido(
-                producto=producto_nombre,
-                cantidad=unidades,
-                precio_unitario=None,
-                total_item=None,
-                pedido_id=pedido.id,
-            )
-            session.add(item)
+    try:
+        importacion = _ImportacionExcel(session)
+        hechas = 0
+
+        for filas, leidas in partes:
+            for row in filas:
+                importacion.agregar_fila(row)
+            importacion.guardar_lote()
+            session.commit()
+            hechas += leidas
+            if progreso is not None:
+                progreso(hechas, total)
 
-        session.commit()
         print("Importación completa.")
+        return importacion.conteo()
 
     except Exception as exc:
         session.rollback()
@@ -282,6 +397,204 @@ def importar_excel(ruta_excel: str):
         session.close()
 
 
+_CAMPOS_COMPLETABLES = ("canal_venta", "forma_pago", "tipo_documento")
+
+
+class _ImportacionExcel:
+    """
+    Estado de una importación: clientes y pedidos conocidos (los de la BD
+    más los creados en esta importación) y lo pendiente de guardar.
+
+    Lo nuevo recibe un id provisional (negativo) para enlazar pedidos e
+    ítems antes de insertarlos. Los ids reales los asigna SQLite al
+    insertar cada parte (INSERT ... RETURNING), así que no chocan con lo
+    que otro escriba en la BD entre una parte y la siguiente.
+    """
+
+    def __init__(self, session: Session) -> None:
+        self.session = session
+
+        # nombre -> id y id -> datos de contacto
+        self.clientes: dict[str, int] = {}
+        self.contactos: dict[int, dict] = {}
+        filas = session.execute(
+            select(Cliente.id, Cliente.nombre, *(getattr(Cliente, c) for c in _CAMPOS_CONTACTO))
+            .order_by(Cliente.id)
+        )
+        for id_, nombre, *contacto in filas:
+            self.clientes.setdefault(nombre, id_)
+            self.contactos[id_] = dict(zip(_CAMPOS_CONTACTO, contacto))
+
+        # numero_pedido -> {"id", canal_venta, forma_pago, tipo_documento}
+        self.pedidos: dict[str, dict] = {}
+        filas = session.execute(
+            select(Pedido.id, Pedido.numero_pedido,
+                   *(getattr(Pedido, c) for c in _CAMPOS_COMPLETABLES))
+        )
+        for id_, numero, *datos in filas:
+            self.pedidos[numero] = {"id": id_, **dict(zip(_CAMPOS_COMPLETABLES, datos))}
+
+        self._ultimo_provisional = 0
+
+        self.clientes_nuevos: list[tuple[int, str]] = []
+        self.clientes_cambiados: set[int] = set()
+        self.pedidos_nuevos: list[dict] = []
+        self.pedidos_cambiados: set[str] = set()
+        self.items_nuevos: list[dict] = []
+        self.total_clientes = self.total_pedidos = self.total_items = 0
+
+    def _id_provisional(self) -> int:
+        self._ultimo_provisional -= 1
+        return self._ultimo_provisional
+
+    def agregar_fila(self, row: dict) -> None:
+        """Procesa una fila ya limpia del Excel (mismas reglas de siempre)."""
+        cliente_nombre = limpiar_nan(row.get("cliente"))
+        producto_nombre = limpiar_nan(row.get("producto"))
+
+        if not cliente_nombre and not producto_nombre:
+            return
+
+        if pd.isna(row.get("fecha")):
+            return
+
+        contacto = {
+            "telefono": limpiar_nan(row.get("telefono"), es_telefono=True),
+            "correo": limpiar_nan(row.get("correo")),
+            "direccion": limpiar_nan(row.get("direccion")),
+            "comuna": limpiar_nan(row.get("comuna")),
+        }
+
+        cliente_id = self.clientes.get(cliente_nombre)
+        if cliente_id is None:
+            cliente_id = self._id_provisional()
+            self.clientes[cliente_nombre] = cliente_id
+            self.contactos[cliente_id] = contacto
+            self.clientes_nuevos.append((cliente_id, cliente_nombre))
+        else:
+            datos = self.contactos[cliente_id]
+            for campo, valor in contacto.items():
+                if valor and datos[campo] != valor:
+                    datos[campo] = valor
+                    self.clientes_cambiados.add(cliente_id)
+
+        fecha_pedido = pd.to_datetime(row.get("fecha")).to_pydatetime()
+
+        numero_pedido = limpiar_nan(row.get("numero_pedido"))
+        if not numero_pedido:
+            return
+
+        pedido = self.pedidos.get(numero_pedido)
+        if pedido is None:
+            pedido = {
+                "id": self._id_provisional(),
+                "numero_pedido": numero_pedido,
+                "fecha_pedido": fecha_pedido,
+                "canal_venta": limpiar_nan(row.get("canal_venta")),
+                "forma_pago": limpiar_nan(row.get("forma_pago")),
+                "tipo_documento": limpiar_nan(row.get("tipo_documento")),
+                "monto_pagado": a_entero_o_cero(row.get("pago")),
+                "saldo": a_entero_o_cero(row.get("saldo")),
+                "estado": limpiar_nan(row.get("estado")),
+                "cliente_id": cliente_id,
+            }
+            self.pedidos[numero_pedido] = pedido
+            self.pedidos_nuevos.append(pedido)
+        else:
+            for campo in _CAMPOS_COMPLETABLES:
+                if not pedido[campo]:
+                    valor = limpiar_nan(row.get(campo))
+                    if valor != pedido[campo]:
+                        pedido[campo] = valor
+                        self.pedidos_cambiados.add(numero_pedido)
+
+        if not producto_nombre:
+            return
+
+        unidades = a_entero_o_cero(row.get("unidades"))
+        if unidades <= 0:
+            unidades = 1
+
+        self.items_nuevos.append({
+            "producto": producto_nombre,
+            "cantidad": unidades,
+            "precio_unitario": None,
+            "total_item": None,
+            "pedido_id": pedido["id"],
+        })
+
+    def guardar_lote(self) -> None:
+        """Inserta/actualiza en bloque lo pendiente (sin commit)."""
+        session = self.session
+
+        # id provisional -> id real
+        reales: dict[int, int] = {}
+
+        if self.clientes_nuevos:
+            ids = session.scalars(
+                insert(Cliente).returning(Cliente.id, sort_by_parameter_order=True),
+                [{"nombre": nombre, **self.contactos[i]} for i, nombre in self.clientes_nuevos],
+            ).all()
+            for (provisional, nombre), real in zip(self.clientes_nuevos, ids):
+                reales[provisional] = real
+                self.clientes[nombre] = real
+                self.contactos[real] = self.contactos.pop(provisional)
+        cambios = [
+            {"id": i, **self.contactos[i]}
+            for i in self.clientes_cambiados if i not in reales
+        ]
+        if cambios:
+            # UPDATE en bloque por clave primaria ("id" en cada dict)
+            session.execute(update(Cliente), cambios)
+
+        if self.pedidos_nuevos:
+            for p in self.pedidos_nuevos:
+                p["cliente_id"] = reales.get(p["cliente_id"], p["cliente_id"])
+            ids = session.scalars(
+                insert(Pedido).returning(Pedido.id, sort_by_parameter_order=True),
+                [{k: v for k, v in p.items() if k != "id"} for p in self.pedidos_nuevos],
+            ).all()
+            for p, real in zip(self.pedidos_nuevos, ids):
+                reales[p["id"]] = real
+                p["id"] = real
+        numeros_nuevos = {p["numero_pedido"] for p in self.pedidos_nuevos}
+        cambios = [
+            {"id": self.pedidos[n]["id"],
+             **{c: self.pedidos[n][c] for c in _CAMPOS_COMPLETABLES}}
+            for n in self.pedidos_cambiados if n not in numeros_nuevos
+        ]
+        if cambios:
+            # UPDATE en bloque por clave primaria ("id" en cada dict)
+            session.execute(update(Pedido), cambios)
+
+        if self.items_nuevos:
+            for item in self.items_nuevos:
+                item["pedido_id"] = reales.get(item["pedido_id"], item["pedido_id"])
+            session.execute(insert(ItemPedido), self.items_nuevos)
+
+        # De los pedidos ya guardados basta recordar lo que se puede completar
+        for p in self.pedidos_nuevos:
+            self.pedidos[p["numero_pedido"]] = {
+                "id": p["id"], **{c: p[c] for c in _CAMPOS_COMPLETABLES}
+            }
+
+        self.total_clientes += len(self.clientes_nuevos)
+        self.total_pedidos += len(self.pedidos_nuevos)
+        self.total_items += len(self.items_nuevos)
+        self.clientes_nuevos = []
+        self.clientes_cambiados = set()
+        self.pedidos_nuevos = []
+        self.pedidos_cambiados = set()
+        self.items_nuevos = []
+
+    def conteo(self) -> dict:
+        return {
+            "clientes_nuevos": self.total_clientes,
+            "pedidos_nuevos": self.total_pedidos,
+            "items_nuevos": self.total_items,
+        }
+
+
 if __name__ == "__main__":
     ruta = input("Ruta del Excel a importar: ").strip().strip('"')
     importar_excel(ruta)
@@ -1,9 +1,87 @@
 # init_db.py
 from db import engine
 from models import Base
+from busqueda import crear_indice_busqueda
+from totales import RECALCULAR_MONTOS, crear_totales
+from numeracion import crear_secuencias
+
+# Mismo criterio que models.normalizar_rut, en SQL
+_RUT_NORMALIZADO_SQL = (
+    "NULLIF(upper(replace(replace(replace(trim(rut), '.', ''), '-', ''), ' ', '')), '')"
+)
+
+# Sentencias para rellenar columnas agregadas a una BD que ya tenía datos
+RELLENOS = {
+    # Solo el primer cliente de cada RUT recibe la clave (índice único);
+    # los duplicados antiguos quedan en NULL.
+    ("clientes", "rut_normalizado"): [
+        f"""
+        UPDATE clientes SET rut_normalizado = {_RUT_NORMALIZADO_SQL}
+        WHERE id IN (
+            SELECT MIN(id) FROM clientes
+            WHERE {_RUT_NORMALIZADO_SQL} IS NOT NULL
+            GROUP BY {_RUT_NORMALIZADO_SQL}
+        )
+        """,
+    ],
+    ("pedidos", "monto_total"): [RECALCULAR_MONTOS],
+}
+
+
+def _agregar_columnas_faltantes(conn) -> None:
+    """ALTER TABLE ADD COLUMN para columnas del modelo que no existen aún."""
+    for tabla in Base.metadata.sorted_tables:
+        actuales = {
+            fila[1] for fila in conn.exec_driver_sql(f"PRAGMA table_info({tabla.name})")
+        }
+        for columna in tabla.columns:
+            if columna.name in actuales:
+                continue
+            tipo = columna.type.compile(dialect=conn.dialect)
+            # SQLite solo acepta NOT NULL en ADD COLUMN si hay DEFAULT
+            if columna.server_default is not None:
+                tipo += f" DEFAULT {columna.server_default.arg}"
+                if not columna.nullable:
+                    tipo += " NOT NULL"
+            conn.exec_driver_sql(
+                f"ALTER TABLE {tabla.name} ADD COLUMN {columna.name} {tipo}"
+            )
+            for sql in RELLENOS.get((tabla.name, columna.name), []):
+                conn.exec_driver_sql(sql)
+
+
+def preparar_esquema(bind) -> None:
+    """Crea tablas, índices e índice de búsqueda en el engine indicado."""
+    Base.metadata.create_all(bind)
+
+    # Migración simple: columnas nuevas en tablas creadas por versiones anteriores
+    with bind.begin() as conn:
+        _agregar_columnas_faltantes(conn)
+
+    # create_all no agrega índices nuevos a tablas que ya existían.
+    # (Se consulta sqlite_master porque la reflexión de SQLAlchemy omite
+    # los índices sobre expresiones, como lower(estado).)
+    with bind.begin() as conn:
+        existentes = set(conn.exec_driver_sql(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        ).scalars())
+        for tabla in Base.metadata.sorted_tables:
+            for indice in tabla.indexes:
+                if indice.name not in existentes:
+                    indice.create(conn)
+
+        # Búsqueda de texto completo (FTS5) + triggers de sincronización
+        crear_indice_busqueda(conn)
+
+        # Montos precalculados (pedidos.monto_total, resumen_clientes)
+        crear_totales(conn)
+
+        # Correlativos de N° de pedido por día
+        crear_secuencias(conn)
+
 
 def init_db():
-    Base.metadata.create_all(engine)
+    preparar_esquema(engine)
     print("Base creada/actualizada correctamente.")
 
 if __name__ == "__main__":
@@ -1,18 +1,27 @@
 # models.py
 from sqlalchemy import (
-    Column, Integer, String, DateTime, ForeignKey, Numeric
+    Column, Integer, String, DateTime, ForeignKey, Numeric, Index, func
 )
-from sqlalchemy.orm import declarative_base, relationship
+from sqlalchemy.orm import declarative_base, relationship, validates
 from datetime import datetime
 
 Base = declarative_base()
 
+
+def normalizar_rut(rut: str | None) -> str | None:
+    """RUT sin puntos, guion ni espacios, en mayúsculas (None si queda vacío)."""
+    limpio = (rut or "").replace(".", "").replace("-", "").replace(" ", "").upper()
+    return limpio or None
+
+
 class Cliente(Base):
     __tablename__ = "clientes"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
-    nombre = Column(String(100), nullable=False)
-    rut = Column(String(20))
+    nombre = Column(String(100), nullable=False, index=True)
+    rut = Column(String(20), index=True)
+    # Clave para detectar duplicados: se calcula sola al asignar rut
+    rut_normalizado = Column(String(20), unique=True, index=True)
     telefono = Column(String(20))
     correo = Column(String(100))
     direccion = Column(String(150))
@@ -20,13 +29,18 @@ class Cliente(Base):
 
     pedidos = relationship("Pedido", back_populates="cliente", cascade="all, delete-orphan")
 
+    @validates("rut")
+    def _sincronizar_rut_normalizado(self, key, rut):
+        self.rut_normalizado = normalizar_rut(rut)
+        return rut
+
 
 class Pedido(Base):
     __tablename__ = "pedidos"
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     numero_pedido = Column(String(30), unique=True, nullable=False)
-    fecha_pedido = Column(DateTime, default=datetime.now)
+    fecha_pedido = Column(DateTime, default=datetime.now, index=True)
     canal_venta = Column(String(50))
     forma_pago = Column(String(50))
     tipo_documento = Column(String(50))
@@ -34,11 +48,22 @@ class Pedido(Base):
     saldo = Column(Integer)
     despacho = Column(String(100))
     estado = Column(String(50))
-    cliente_id = Column(Integer, ForeignKey("clientes.id"), nullable=False)
+    cliente_id = Column(Integer, ForeignKey("clientes.id"), nullable=False, index=True)
+    # Suma de cantidad * precio_unitario de los ítems. No se asigna a mano:
+    # la mantienen triggers de SQLite (ver totales.py)
+    monto_total = Column(Integer, nullable=False, default=0, server_default="0")
 
     cliente = relationship("Cliente", back_populates="pedidos")
     items = relationship("ItemPedido", back_populates="pedido", cascade="all, delete-orphan")
 
+    # La búsqueda por estado no distingue mayúsculas: se indexa lower(estado),
+    # junto con la fecha para entregar el listado ya ordenado
+    __table_args__ = (
+        Index("ix_pedidos_estado", func.lower(estado), fecha_pedido),
+        # Historial de un cliente ya ordenado por fecha (y su último pedido)
+        Index("ix_pedidos_cliente_fecha", cliente_id, fecha_pedido),
+    )
+
 
 class ItemPedido(Base):
     __tablename__ = "items_pedido"
@@ -48,6 +73,6 @@ class ItemPedido(Base):
     cantidad = Column(Integer, nullable=False)
     precio_unitario = Column(Integer)
     total_item = Column(Integer)
-    pedido_id = Column(Integer, ForeignKey("pedidos.id"), nullable=False)
+    pedido_id = Column(Integer, ForeignKey("pedidos.id"), nullable=False, index=True)
 
     pedido = relationship("Pedido", back_populates="items")
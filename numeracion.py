@@ -0,0 +1,104 @@
+# numeracion.py
+"""
+Números de pedido correlativos por día: PAAAAMMDD-NNN.
+
+El último correlativo de cada día se guarda en secuencias_pedido. Pedir un
+número es una sola escritura por clave primaria (INSERT ... ON CONFLICT DO
+UPDATE ... RETURNING) dentro de la misma transacción que inserta el pedido:
+SQLite deja un solo escritor a la vez, así que dos ventanas que guardan al
+mismo tiempo reciben números distintos, y si la transacción se deshace el
+número vuelve a quedar libre.
+
+Un trigger sube la secuencia cuando entra un pedido con un número de este
+formato por otro camino (importar_excel, importar_respaldo), para que el
+siguiente número generado no choque con él.
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, Integer, MetaData, String, Table
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+# Números con el formato que genera este módulo
+_NUMERO_GLOB = "P[0-9][0-9][0-9][0-9][0-9][0-9][0-9][0-9]-[0-9]*"
+
+SENTENCIAS_NUMERACION = [
+    """
+    CREATE TABLE IF NOT EXISTS secuencias_pedido (
+        dia VARCHAR(8) PRIMARY KEY,
+        ultimo INTEGER NOT NULL
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_secuencia_ai AFTER INSERT ON pedidos
+    WHEN new.numero_pedido GLOB '{_NUMERO_GLOB}'
+    BEGIN
+        INSERT INTO secuencias_pedido (dia, ultimo)
+        VALUES (substr(new.numero_pedido, 2, 8), CAST(substr(new.numero_pedido, 11) AS INTEGER))
+        ON CONFLICT (dia) DO UPDATE SET ultimo = MAX(ultimo, excluded.ultimo);
+    END
+    """,
+]
+
+_POBLAR_SECUENCIAS = [
+    "DELETE FROM secuencias_pedido",
+    f"""
+    INSERT INTO secuencias_pedido (dia, ultimo)
+    SELECT substr(numero_pedido, 2, 8), MAX(CAST(substr(numero_pedido, 11) AS INTEGER))
+    FROM pedidos
+    WHERE numero_pedido GLOB '{_NUMERO_GLOB}'
+    GROUP BY substr(numero_pedido, 2, 8)
+    """,
+]
+
+
+def crear_secuencias(conn) -> None:
+    """
+    Crea la tabla secuencias_pedido y su trigger si no existen. Si la tabla
+    es nueva (BD antigua), parte desde los números que ya hay.
+
+    conn: conexión SQLAlchemy dentro de una transacción (engine.begin()).
+    """
+    existia = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'secuencias_pedido'"
+    ).first() is not None
+
+    for sql in SENTENCIAS_NUMERACION:
+        conn.exec_driver_sql(sql)
+
+    if not existia:
+        for sql in _POBLAR_SECUENCIAS:
+            conn.exec_driver_sql(sql)
+
+
+_meta_numeracion = MetaData()
+
+secuencias_pedido = Table(
+    "secuencias_pedido", _meta_numeracion,
+    Column("dia", String(8), primary_key=True),
+    Column("ultimo", Integer, nullable=False),
+)
+
+
+def formatear_numero_pedido(fecha: datetime, correlativo: int) -> str:
+    """Genera un código del tipo PYYYYMMDD-XXX."""
+    return "P" + fecha.strftime("%Y%m%d") + f"-{correlativo:03d}"
+
+
+def siguiente_numero_pedido(session: Session, fecha: datetime | None = None) -> str:
+    """
+    Reserva el siguiente número de pedido del día de `fecha` (hoy por defecto).
+
+    Debe llamarse en la misma transacción que inserta el pedido: el número
+    queda tomado al confirmarla y se libera si se hace rollback.
+    """
+    if fecha is None:
+        fecha = datetime.now()
+
+    stmt = insert(secuencias_pedido).values(dia=fecha.strftime("%Y%m%d"), ultimo=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[secuencias_pedido.c.dia],
+        set_={"ultimo": secuencias_pedido.c.ultimo + 1},
+    ).returning(secuencias_pedido.c.ultimo)
+    correlativo = session.execute(stmt).scalar_one()
+    return formatear_numero_pedido(fecha, correlativo)
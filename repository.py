@@ -0,0 +1,418 @@
+# repository.py
+"""
+Acceso a datos de las ventanas del CRM: consultas, altas, cambios y bajas
+de clientes, pedidos e ítems.
+
+Cada función recibe una sesión abierta y resuelve todo en una sola ida a
+la base de datos, evitando cargas perezosas (lazy loading) fila por fila.
+Los listados aceptan offset/limite para que las tablas de la GUI puedan
+pedir los datos por páginas. Las funciones no hacen commit: eso lo decide
+quien llama, normalmente con transaccion().
+
+Las consultas de forma fija usan lambda_stmt: SQLAlchemy guarda la
+sentencia ya armada y compilada, y en cada llamada solo cambian los
+parámetros. Las que arman filtros variables (listar_pedidos) usan select(),
+cuya compilación también queda en la caché del engine.
+
+Los datos de los clientes salen de memoria (cache_clientes) cuando ya
+está cargada y al día; si no, se consultan solo las filas pedidas.
+"""
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import func, lambda_stmt, select
+from sqlalchemy.orm import Session
+
+from db import SesionHilo
+from models import Cliente, Pedido, ItemPedido, normalizar_rut
+from cache_clientes import COLUMNAS_CLIENTE, cache_clientes
+from busqueda import (
+    buscar_clientes, consulta_fts, es_consulta_amplia, ids_clientes_coincidentes,
+    ids_clientes_por_relevancia,
+)
+from numeracion import siguiente_numero_pedido
+from totales import resumen_clientes
+
+
+# ============================================
+#  Sesiones
+# ============================================
+
+@contextmanager
+def sesion() -> Iterator[Session]:
+    """
+    Sesión del hilo actual (db.SesionHilo) para leer. Al salir se cierra:
+    la conexión vuelve al pool y se suelta la foto de la BD, pero el objeto
+    sesión se reutiliza en la próxima operación del mismo hilo.
+
+    Los objetos leídos siguen disponibles (desacoplados) con los atributos
+    que ya tenían cargados.
+    """
+    session = SesionHilo()
+    try:
+        yield session
+    finally:
+        session.close()
+
+
+@contextmanager
+def transaccion() -> Iterator[Session]:
+    """
+    Como sesion(), pero confirma al salir, o hace rollback si hubo un error.
+    Tras el commit los objetos quedan expirados: los datos que se necesiten
+    después (p. ej. el id de algo recién creado) se leen dentro del bloque.
+    """
+    with sesion() as session:
+        try:
+            yield session
+            session.commit()
+        except BaseException:
+            session.rollback()
+            raise
+
+
+# ============================================
+#  Pedidos
+# ============================================
+
+
+def _paginar(stmt, offset: int, limite: int | None):
+    if offset:
+        stmt = stmt.offset(offset)
+    if limite is not None:
+        stmt = stmt.limit(limite)
+    return stmt
+
+
+def listar_pedidos(
+    session: Session,
+    *,
+    cliente_id: int | None = None,
+    numero: str | None = None,
+    cliente: str | None = None,
+    estado: str | None = None,
+    desde: date | None = None,
+    hasta: date | None = None,
+    offset: int = 0,
+    limite: int | None = None,
+) -> list:
+    """
+    Devuelve pedidos (más recientes primero) con los datos del cliente y el
+    monto total (columna pedidos.monto_total, que mantienen los triggers de
+    totales.py: no se suman ítems).
+
+    Filtros opcionales (se combinan con AND):
+    - cliente_id: pedidos de ese cliente (historial; usa
+      ix_pedidos_cliente_fecha, que ya entrega el orden).
+    - numero: texto contenido en el N° de pedido.
+    - cliente: palabras (prefijos) en nombre, RUT, teléfono, correo,
+      dirección o comuna del cliente; usa el índice FTS5.
+    - estado: estado exacto (sin distinguir mayúsculas).
+    - desde / hasta: rango de fechas inclusivo.
+
+    Cada fila trae: id, numero_pedido, fecha_pedido, monto_pagado, saldo,
+    estado, cliente_nombre, cliente_rut, cliente_telefono, cliente_correo,
+    cliente_direccion, cliente_comuna y monto.
+    """
+    stmt = (
+        select(
+            Pedido.id,
+            Pedido.numero_pedido,
+            Pedido.fecha_pedido,
+            Pedido.monto_pagado,
+            Pedido.saldo,
+            Pedido.estado,
+            Cliente.nombre.label("cliente_nombre"),
+            Cliente.rut.label("cliente_rut"),
+            Cliente.telefono.label("cliente_telefono"),
+            Cliente.correo.label("cliente_correo"),
+            Cliente.direccion.label("cliente_direccion"),
+            Cliente.comuna.label("cliente_comuna"),
+            Pedido.monto_total.label("monto"),
+        )
+        .join(Cliente, Pedido.cliente_id == Cliente.id)
+    )
+
+    if cliente_id is not None:
+        stmt = stmt.where(Pedido.cliente_id == cliente_id)
+    if numero:
+        stmt = stmt.where(Pedido.numero_pedido.icontains(numero, autoescape=True))
+    consulta = consulta_fts(cliente) if cliente else None
+    if consulta:
+        stmt = stmt.where(Pedido.cliente_id.in_(ids_clientes_coincidentes(consulta)))
+    if estado:
+        # Misma expresión que el índice ix_pedidos_estado
+        stmt = stmt.where(func.lower(Pedido.estado) == estado.lower())
+    # Rango sobre la columna directa para que se use ix_pedidos_fecha_pedido
+    if desde is not None:
+        stmt = stmt.where(Pedido.fecha_pedido >= datetime.combine(desde, time.min))
+    if hasta is not None:
+        stmt = stmt.where(
+            Pedido.fecha_pedido < datetime.combine(hasta + timedelta(days=1), time.min)
+        )
+
+    stmt = stmt.order_by(Pedido.fecha_pedido.desc(), Pedido.id.desc())
+    return session.execute(_paginar(stmt, offset, limite)).all()
+
+
+# ============================================
+#  Clientes
+# ============================================
+
+def listar_clientes(
+    session: Session,
+    *,
+    texto: str | None = None,
+    offset: int = 0,
+    limite: int | None = None,
+    amplia: bool | None = None,
+) -> list:
+    """
+    Devuelve clientes ordenados por id o, si se indica texto, los que
+    calzan en el índice FTS5 (datos del cliente o productos comprados)
+    ordenados por relevancia.
+
+    amplia: busqueda_amplia(session, texto), calculado una vez por búsqueda
+    para no repetirlo en cada página.
+
+    Devuelve filas con id, nombre, rut, telefono, correo, direccion y
+    comuna. Si cache_clientes está al día salen de memoria; si no, cada
+    página es una consulta con LIMIT/OFFSET (nunca se cargan todos los
+    clientes para mostrar una página).
+    """
+    consulta = consulta_fts(texto) if texto else None
+    if consulta:
+        # 1) página de ids ordenada por relevancia, 2) los clientes de esa página
+        ids = ids_clientes_por_relevancia(
+            session, consulta, offset=offset, limite=limite, amplia=amplia
+        )
+        return clientes_por_id(session, ids)
+
+    if cache_clientes.al_dia:
+        return cache_clientes.pagina(session, offset, limite)
+    stmt = select(*COLUMNAS_CLIENTE).order_by(Cliente.id)
+    return session.execute(_paginar(stmt, offset, limite)).all()
+
+
+def busqueda_amplia(session: Session, texto: str | None) -> bool:
+    """True si el texto calza con tantos clientes que no se ordena por relevancia."""
+    consulta = consulta_fts(texto) if texto else None
+    return consulta is not None and es_consulta_amplia(session, consulta)
+
+
+def clientes_por_id(session: Session, ids: list[int]) -> list:
+    """
+    Filas de los clientes indicados (como las de cache_clientes), en ese
+    orden. Si el caché no está al día se leen solo esos clientes, sin
+    cargarlo entero.
+    """
+    if cache_clientes.al_dia:
+        return cache_clientes.varios(session, ids)
+    por_id = {
+        f.id: f
+        for f in session.execute(select(*COLUMNAS_CLIENTE).where(Cliente.id.in_(ids)))
+    }
+    return [por_id[i] for i in ids if i in por_id]
+
+
+def sugerencias_clientes(session: Session, texto: str, limite: int) -> list:
+    """
+    Los primeros `limite` clientes cuyos datos calzan con el texto (índice
+    FTS5, cada palabra como prefijo), por relevancia. Cuesta lo mismo con
+    pocos o muchos clientes.
+    """
+    ids = buscar_clientes(session, texto, limite=limite, incluir_productos=False)
+    return clientes_por_id(session, ids)
+
+
+def productos_por_cliente(session: Session, ids: list[int]) -> dict[int, list[str]]:
+    """Nombres de producto distintos comprados por cada cliente indicado."""
+    productos: dict[int, list[str]] = {i: [] for i in ids}
+    if not ids:
+        return productos
+    stmt = (
+        select(Pedido.cliente_id, ItemPedido.producto)
+        .join(ItemPedido, ItemPedido.pedido_id == Pedido.id)
+        .where(Pedido.cliente_id.in_(ids))
+        .distinct()
+    )
+    for cliente_id, producto in session.execute(stmt):
+        if producto:
+            productos[cliente_id].append(producto)
+    return productos
+
+
+_RESUMEN_VACIO = {"n_pedidos": 0, "monto_total": 0, "saldo_pendiente": 0, "ultimo_pedido": None}
+
+
+def resumen_por_cliente(session: Session, ids: list[int]) -> dict[int, dict]:
+    """
+    Resumen precalculado de cada cliente indicado (tabla resumen_clientes):
+    {"n_pedidos", "monto_total", "saldo_pendiente", "ultimo_pedido"}.
+    Un cliente sin pedidos da ceros.
+    """
+    resumenes = {i: dict(_RESUMEN_VACIO) for i in ids}
+    if not ids:
+        return resumenes
+    stmt = select(resumen_clientes).where(resumen_clientes.c.cliente_id.in_(ids))
+    for fila in session.execute(stmt).mappings():
+        resumenes[fila["cliente_id"]] = {k: fila[k] for k in _RESUMEN_VACIO}
+    return resumenes
+
+
+def buscar_por_rut(session: Session, rut: str | None):
+    """
+    Cliente con el mismo RUT (sin importar puntos ni guion), o None; se
+    usan .id, .nombre y .rut. Sale de cache_clientes si está al día; si
+    no, de una consulta por rut_normalizado.
+
+    Si otro programa agregó el RUT y el caché aún no lo sabe, el índice
+    único de rut_normalizado impide igual el duplicado al guardar.
+    """
+    clave = normalizar_rut(rut)
+    if clave is None:
+        return None
+    if cache_clientes.al_dia:
+        return cache_clientes.por_rut(session, clave)
+    stmt = lambda_stmt(lambda: select(Cliente).where(Cliente.rut_normalizado == clave))
+    return session.scalars(stmt).first()
+
+
+def crear_cliente(
+    session: Session,
+    *,
+    nombre: str,
+    rut: str | None,
+    telefono: str | None = None,
+    correo: str | None = None,
+    direccion: str | None = None,
+    comuna: str | None = None,
+) -> Cliente:
+    """Agrega un cliente y lo escribe (flush) para que ya tenga id."""
+    cliente = Cliente(
+        nombre=nombre,
+        rut=rut,
+        telefono=telefono,
+        correo=correo,
+        direccion=direccion,
+        comuna=comuna,
+    )
+    session.add(cliente)
+    session.flush()
+    return cliente
+
+
+def actualizar_cliente(session: Session, cliente_id: int, **datos) -> Cliente | None:
+    """
+    Cambia los campos indicados (nombre, rut, telefono, correo, direccion,
+    comuna) del cliente. Devuelve None si el cliente ya no existe.
+    """
+    cliente = session.get(Cliente, cliente_id)
+    if cliente is None:
+        return None
+    for campo, valor in datos.items():
+        setattr(cliente, campo, valor)
+    return cliente
+
+
+def eliminar_cliente(session: Session, cliente_id: int) -> bool:
+    """Borra el cliente (y sus pedidos). False si ya no existía."""
+    cliente = session.get(Cliente, cliente_id)
+    if cliente is None:
+        return False
+    session.delete(cliente)
+    return True
+
+
+# ============================================
+#  Pedidos: altas, cambios y bajas
+# ============================================
+
+def obtener_pedido(session: Session, pedido_id: int) -> Pedido | None:
+    return session.get(Pedido, pedido_id)
+
+
+def _saldo(pedido: Pedido) -> int:
+    """Saldo final según el monto de los ítems (pedidos.monto_total) y el abono."""
+    return max(int(pedido.monto_total or 0) - int(pedido.monto_pagado or 0), 0)
+
+
+def crear_pedido(session: Session, **datos) -> Pedido:
+    """
+    Agrega un pedido con el siguiente N° del día (numeracion), reservado en
+    esta misma transacción. datos: columnas de Pedido (cliente_id,
+    fecha_pedido, canal_venta, ...). El saldo parte en 0: se calcula al
+    guardar los ítems.
+    """
+    pedido = Pedido(numero_pedido=siguiente_numero_pedido(session), saldo=0, **datos)
+    session.add(pedido)
+    session.flush()
+    return pedido
+
+
+def actualizar_pedido(session: Session, pedido_id: int, **datos) -> Pedido | None:
+    """
+    Cambia las columnas indicadas del pedido y recalcula su saldo final.
+    Devuelve None si el pedido ya no existe.
+    """
+    pedido = session.get(Pedido, pedido_id)
+    if pedido is None:
+        return None
+    for campo, valor in datos.items():
+        setattr(pedido, campo, valor)
+    pedido.saldo = _saldo(pedido)
+    return pedido
+
+
+def eliminar_pedido(session: Session, pedido_id: int) -> bool:
+    """Borra el pedido y sus ítems. False si ya no existía."""
+    pedido = session.get(Pedido, pedido_id)
+    if pedido is None:
+        return False
+    session.delete(pedido)
+    return True
+
+
+# ============================================
+#  Ítems
+# ============================================
+
+def items_pedido(session: Session, pedido_id: int) -> list[ItemPedido]:
+    """Ítems del pedido, en el orden en que se agregaron."""
+    stmt = lambda_stmt(
+        lambda: select(ItemPedido).where(ItemPedido.pedido_id == pedido_id).order_by(ItemPedido.id)
+    )
+    return list(session.scalars(stmt))
+
+
+def guardar_items(session: Session, pedido_id: int, filas: list[dict]) -> Pedido | None:
+    """
+    Deja el pedido con exactamente los ítems de `filas` y recalcula su saldo.
+
+    filas: dicts {"id", "producto", "cantidad", "precio"}; "id" es None para
+    un ítem nuevo. Los ítems del pedido que no aparecen se borran.
+    Devuelve el pedido (None si ya no existe).
+    """
+    pedido = session.get(Pedido, pedido_id)
+    if pedido is None:
+        return None
+
+    existentes = {it.id: it for it in items_pedido(session, pedido_id)}
+    for f in filas:
+        it = existentes.pop(f["id"], None) if f["id"] is not None else None
+        if it is None:
+            it = ItemPedido(pedido_id=pedido_id)
+            session.add(it)
+        it.producto = f["producto"]
+        it.cantidad = f["cantidad"]
+        it.precio_unitario = f["precio"]
+        it.total_item = f["cantidad"] * f["precio"]
+    for it in existentes.values():
+        session.delete(it)
+
+    # Al escribir los ítems, los triggers actualizan pedidos.monto_total
+    session.flush()
+    session.refresh(pedido, ["monto_total"])
+    pedido.saldo = _saldo(pedido)
+    return pedido
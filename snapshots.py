@@ -0,0 +1,456 @@
+# snapshots.py
+"""
+Almacén de snapshots de la base de datos en la carpeta de respaldo.
+
+En vez de sobrescribir un respaldo completo en cada cierre, cada snapshot
+se parte en bloques de TAM_BLOQUE bytes que se guardan por su hash SHA-256.
+Un bloque que ya existe no se vuelve a escribir, así que un snapshot nuevo
+solo agrega los bloques que cambiaron: lo que OneDrive sube depende de
+cuánto cambió la BD, no de su tamaño.
+
+    <carpeta de respaldo>/snapshots/
+        bloques/ab/abcdef...      contenido de un bloque (nombre = sha256)
+        manifiestos/AAAAMMDD-HHMMSS.json
+                                  lista ordenada de bloques de un snapshot
+
+Retención: se conserva el último snapshot de cada uno de los últimos N días
+y de las últimas M semanas (config.get_retencion_snapshots). Los bloques
+que ya no usa ningún manifiesto se borran, salvo los de menos de
+GRACIA_BLOQUES, que pueden ser de un snapshot que otro proceso (u otro PC
+con la misma carpeta de OneDrive) todavía está escribiendo.
+
+Guardar un snapshot y aplicar la retención se hacen con el almacén
+bloqueado (ARCHIVO_BLOQUEO), de a un proceso a la vez.
+
+Uso por consola:
+
+    python snapshots.py listar
+    python snapshots.py crear
+    python snapshots.py restaurar <nombre> [destino]
+"""
+import hashlib
+import json
+import os
+import shutil
+import sys
+import socket
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from config import get_backup_folder, get_retencion_snapshots
+from db import DB_PATH, borrar_archivos_wal
+
+TAM_BLOQUE = 64 * 1024  # 16 páginas de SQLite de 4 KB
+
+_FORMATO_NOMBRE = "%Y%m%d-%H%M%S"
+
+# Archivo que existe mientras alguien escribe en el almacén (ver _bloquear)
+ARCHIVO_BLOQUEO = "en_uso.lock"
+ESPERA_BLOQUEO = 120  # segundos que se espera a que otro respaldo termine
+# Un bloqueo más viejo que esto quedó de un proceso que se cayó
+BLOQUEO_VENCIDO = timedelta(hours=1)
+# La retención no borra bloques más nuevos que esto
+GRACIA_BLOQUES = timedelta(days=1)
+
+
+def carpeta_snapshots() -> str:
+    backup_folder = get_backup_folder()
+    if not backup_folder:
+        raise RuntimeError("No hay carpeta de respaldo configurada.")
+    return os.path.join(backup_folder, "snapshots")
+
+
+def _ruta_bloque(carpeta: str, digest: str) -> str:
+    return os.path.join(carpeta, "bloques", digest[:2], digest)
+
+
+def _ruta_manifiesto(carpeta: str, nombre: str) -> str:
+    return os.path.join(carpeta, "manifiestos", nombre + ".json")
+
+
+def _escribir_atomico(ruta: str, datos: bytes) -> None:
+    """Escribe en "<ruta>.<id>.tmp" y renombra: nunca queda un archivo a medias."""
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    temporal = f"{ruta}.{uuid.uuid4().hex[:8]}.tmp"
+    with open(temporal, "wb") as f:
+        f.write(datos)
+    os.replace(temporal, ruta)
+
+
+@contextmanager
+def _bloquear(carpeta: str, progreso=None, espera: float = ESPERA_BLOQUEO):
+    """
+    Bloquea el almacén creando ARCHIVO_BLOQUEO con open(..., "x"); se borra
+    al salir. Si otro lo tiene, espera hasta `espera` segundos llamando a
+    progreso(0, 0), que puede lanzar una excepción para dejar de esperar.
+    Un bloqueo de más de BLOQUEO_VENCIDO se da por abandonado.
+    """
+    os.makedirs(carpeta, exist_ok=True)
+    ruta = os.path.join(carpeta, ARCHIVO_BLOQUEO)
+    limite = time.monotonic() + espera
+    while True:
+        try:
+            with open(ruta, "x", encoding="utf-8") as f:
+                f.write(f"{socket.gethostname()} pid {os.getpid()} {datetime.now():%Y-%m-%d %H:%M:%S}\n")
+            break
+        except FileExistsError:
+            pass
+        try:
+            edad = time.time() - os.path.getmtime(ruta)
+            with open(ruta, "r", encoding="utf-8") as f:
+                quien = f.read().strip()
+        except FileNotFoundError:
+            continue  # se acaba de soltar
+        if edad > BLOQUEO_VENCIDO.total_seconds():
+            print("Se quita un bloqueo abandonado del almacén:", quien)
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+            continue
+        if time.monotonic() >= limite:
+            raise RuntimeError(
+                f"El almacén de snapshots está ocupado por otro respaldo ({quien}). "
+                "Intenta de nuevo más tarde."
+            )
+        if progreso is not None:
+            progreso(0, 0)
+        time.sleep(1)
+
+    try:
+        yield
+    finally:
+        try:
+            os.remove(ruta)
+        except FileNotFoundError:
+            pass
+
+
+# ============================================
+#  Crear
+# ============================================
+
+def crear_snapshot(origen: str = DB_PATH, carpeta: str | None = None, progreso=None) -> dict:
+    """
+    Toma un snapshot consistente de la BD y lo guarda en el almacén.
+
+    La BD se copia primero con la API de backup de SQLite (backup.copiar_bd)
+    a un archivo temporal local, fuera de la carpeta sincronizada, y de esa
+    copia se sacan los bloques. Después aplica la retención; si no se puede
+    (un manifiesto ilegible), el snapshot queda guardado igual.
+
+    progreso: función opcional progreso(hechas, total), que se llama primero
+    con las páginas copiadas y luego con los bytes guardados en bloques (y
+    con (0, 0) mientras espera a que otro suelte el almacén). Si lanza una
+    excepción, el snapshot se abandona sin escribir su manifiesto (los
+    bloques sueltos los borra una retención posterior).
+
+    Devuelve {"nombre", "bloques", "bloques_nuevos", "bytes_nuevos"}.
+    """
+    from backup import copiar_bd
+
+    if not os.path.exists(origen):
+        raise RuntimeError(f"No se encontró la base de datos en {origen}.")
+
+    carpeta = carpeta or carpeta_snapshots()
+    temporal = tempfile.mkdtemp(prefix="crm_snapshot_")
+    try:
+        copia = os.path.join(temporal, "copia.db")
+        copiar_bd(origen, copia, progreso)
+        with _bloquear(carpeta, progreso):
+            resultado = _guardar_bloques(copia, carpeta, progreso)
+            try:
+                _aplicar_retencion(carpeta)
+            except RuntimeError as exc:
+                print("No se aplicó la retención:", exc)
+    finally:
+        shutil.rmtree(temporal, ignore_errors=True)
+
+    return resultado
+
+
+def _guardar_bloques(ruta: str, carpeta: str, progreso=None) -> dict:
+    bloques: list[str] = []
+    nuevos = bytes_nuevos = 0
+    total = hashlib.sha256()
+    tamano = os.path.getsize(ruta)
+
+    with open(ruta, "rb") as f:
+        while True:
+            datos = f.read(TAM_BLOQUE)
+            if not datos:
+                break
+            total.update(datos)
+            digest = hashlib.sha256(datos).hexdigest()
+            destino = _ruta_bloque(carpeta, digest)
+            if not os.path.exists(destino):
+                _escribir_atomico(destino, datos)
+                nuevos += 1
+                bytes_nuevos += len(datos)
+            bloques.append(digest)
+            if progreso is not None:
+                progreso(f.tell(), tamano)
+
+    ahora = datetime.now()
+    manifiesto = {
+        "version": 1,
+        "creado": ahora.isoformat(),
+        "tam_bloque": TAM_BLOQUE,
+        "tamano": tamano,
+        "sha256": total.hexdigest(),
+        "bloques": bloques,
+    }
+    datos = json.dumps(manifiesto, indent=1).encode("utf-8")
+
+    # Con "x" dos snapshots del mismo segundo nunca se pisan: el segundo
+    # recibe el sufijo siguiente
+    os.makedirs(os.path.join(carpeta, "manifiestos"), exist_ok=True)
+    nombre = ahora.strftime(_FORMATO_NOMBRE)
+    sufijo = 1
+    while True:
+        ruta_manifiesto = _ruta_manifiesto(carpeta, nombre)
+        try:
+            f = open(ruta_manifiesto, "xb")
+        except FileExistsError:
+            sufijo += 1
+            nombre = f"{ahora.strftime(_FORMATO_NOMBRE)}-{sufijo}"
+            continue
+        try:
+            with f:
+                f.write(datos)
+        except BaseException:
+            os.remove(ruta_manifiesto)
+            raise
+        break
+    print("Snapshot generado:", nombre)
+
+    return {
+        "nombre": nombre,
+        "bloques": len(bloques),
+        "bloques_nuevos": nuevos,
+        "bytes_nuevos": bytes_nuevos,
+    }
+
+
+# ============================================
+#  Listar / leer
+# ============================================
+
+def leer_manifiesto(nombre: str, carpeta: str | None = None) -> dict:
+    carpeta = carpeta or carpeta_snapshots()
+    ruta = _ruta_manifiesto(carpeta, nombre)
+    if not os.path.exists(ruta):
+        raise RuntimeError(f"No existe el snapshot {nombre}.")
+    with open(ruta, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _leer_manifiestos(carpeta: str) -> tuple[list[dict], dict[str, list[str]], list[str]]:
+    """
+    Lee todos los manifiestos del almacén. Devuelve (snapshots, bloques,
+    ilegibles): los snapshots como listar_snapshots (sin ordenar), los
+    bloques de cada uno por nombre y los nombres que no se pudieron leer
+    (dañados, o que OneDrive todavía no termina de bajar).
+    """
+    dir_manifiestos = os.path.join(carpeta, "manifiestos")
+    if not os.path.isdir(dir_manifiestos):
+        return [], {}, []
+
+    snapshots = []
+    bloques = {}
+    ilegibles = []
+    for archivo in os.listdir(dir_manifiestos):
+        if not archivo.endswith(".json"):
+            continue
+        nombre = archivo[:-len(".json")]
+        try:
+            m = leer_manifiesto(nombre, carpeta)
+            snapshot = {
+                "nombre": nombre,
+                "creado": datetime.fromisoformat(m["creado"]),
+                "tamano": m["tamano"],
+            }
+            bloques[nombre] = list(m["bloques"])
+        except (OSError, ValueError, KeyError, TypeError, RuntimeError):
+            ilegibles.append(nombre)
+            continue
+        snapshots.append(snapshot)
+    return snapshots, bloques, ilegibles
+
+
+def listar_snapshots(carpeta: str | None = None) -> list[dict]:
+    """
+    Snapshots del almacén, del más nuevo al más antiguo: {"nombre",
+    "creado", "tamano"}. Omite los manifiestos que no se pueden leer.
+    """
+    carpeta = carpeta or carpeta_snapshots()
+    snapshots, _, _ = _leer_manifiestos(carpeta)
+    snapshots.sort(key=lambda s: (s["creado"], s["nombre"]), reverse=True)
+    return snapshots
+
+
+# ============================================
+#  Restaurar
+# ============================================
+
+def restaurar_snapshot(nombre: str, destino: str = DB_PATH, carpeta: str | None = None) -> str:
+    """
+    Reconstruye el snapshot en destino (por defecto la BD principal).
+
+    Cada bloque y el archivo completo se verifican contra sus SHA-256; si
+    algo no calza, destino no se toca. La app no debe estar usando destino
+    mientras se restaura.
+    """
+    carpeta = carpeta or carpeta_snapshots()
+    manifiesto = leer_manifiesto(nombre, carpeta)
+
+    directorio = os.path.dirname(destino)
+    if directorio:
+        os.makedirs(directorio, exist_ok=True)
+
+    temporal = destino + ".tmp"
+    total = hashlib.sha256()
+    try:
+        with open(temporal, "wb") as salida:
+            for digest in manifiesto["bloques"]:
+                with open(_ruta_bloque(carpeta, digest), "rb") as f:
+                    datos = f.read()
+                if hashlib.sha256(datos).hexdigest() != digest:
+                    raise RuntimeError(f"Bloque dañado en el snapshot {nombre}: {digest}")
+                total.update(datos)
+                salida.write(datos)
+        if total.hexdigest() != manifiesto["sha256"]:
+            raise RuntimeError(f"El snapshot {nombre} no calza con su checksum.")
+        borrar_archivos_wal(destino)
+        os.replace(temporal, destino)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    print(f"Snapshot {nombre} restaurado en:", destino)
+    return destino
+
+
+# ============================================
+#  Retención
+# ============================================
+
+def snapshots_a_conservar(snapshots: list[dict], dias: int, semanas: int) -> set[str]:
+    """
+    Nombres a conservar: el más nuevo siempre, y el último de cada uno de
+    los últimos `dias` días y `semanas` semanas que tengan snapshots.
+    """
+    ordenados = sorted(snapshots, key=lambda s: (s["creado"], s["nombre"]), reverse=True)
+    if not ordenados:
+        return set()
+
+    conservar = {ordenados[0]["nombre"]}
+    dias_vistos: set = set()
+    semanas_vistas: set = set()
+    for s in ordenados:
+        dia = s["creado"].date()
+        if dia not in dias_vistos and len(dias_vistos) < dias:
+            dias_vistos.add(dia)
+            conservar.add(s["nombre"])
+        semana = s["creado"].isocalendar()[:2]
+        if semana not in semanas_vistas and len(semanas_vistas) < semanas:
+            semanas_vistas.add(semana)
+            conservar.add(s["nombre"])
+    return conservar
+
+
+def aplicar_retencion(carpeta: str | None = None,
+                      dias: int | None = None, semanas: int | None = None) -> list[str]:
+    """
+    Borra los snapshots que no entran en la retención y los bloques que ya
+    no usa ningún snapshot. Devuelve los nombres borrados.
+
+    Espera a tener el almacén para sí (ver _bloquear). Si algún manifiesto
+    no se puede leer no borra nada y lanza RuntimeError: sus bloques se
+    darían por sueltos y OneDrive propagaría el borrado a los otros PC.
+    Nunca borra archivos .tmp ni bloques de menos de GRACIA_BLOQUES.
+    """
+    carpeta = carpeta or carpeta_snapshots()
+    with _bloquear(carpeta):
+        return _aplicar_retencion(carpeta, dias, semanas)
+
+
+def _aplicar_retencion(carpeta: str, dias: int | None = None,
+                       semanas: int | None = None) -> list[str]:
+    # Llamar con el almacén bloqueado
+    if dias is None or semanas is None:
+        dias_cfg, semanas_cfg = get_retencion_snapshots()
+        dias = dias_cfg if dias is None else dias
+        semanas = semanas_cfg if semanas is None else semanas
+
+    snapshots, bloques, ilegibles = _leer_manifiestos(carpeta)
+    if ilegibles:
+        raise RuntimeError(
+            "No se pudieron leer los manifiestos " + ", ".join(sorted(ilegibles))
+            + "; no se borró ningún snapshot ni bloque."
+        )
+
+    conservar = snapshots_a_conservar(snapshots, dias, semanas)
+    borrados = [s["nombre"] for s in snapshots if s["nombre"] not in conservar]
+    for nombre in borrados:
+        os.remove(_ruta_manifiesto(carpeta, nombre))
+
+    en_uso: set[str] = set()
+    for nombre in conservar:
+        en_uso.update(bloques[nombre])
+
+    recientes = time.time() - GRACIA_BLOQUES.total_seconds()
+    dir_bloques = os.path.join(carpeta, "bloques")
+    if os.path.isdir(dir_bloques):
+        for sub in os.listdir(dir_bloques):
+            dir_sub = os.path.join(dir_bloques, sub)
+            if not os.path.isdir(dir_sub):
+                continue
+            for archivo in os.listdir(dir_sub):
+                if archivo in en_uso or archivo.endswith(".tmp"):
+                    continue
+                ruta = os.path.join(dir_sub, archivo)
+                try:
+                    if os.path.getmtime(ruta) > recientes:
+                        continue
+                    os.remove(ruta)
+                except FileNotFoundError:
+                    pass
+            if not os.listdir(dir_sub):
+                try:
+                    os.rmdir(dir_sub)
+                except OSError:
+                    pass  # otro proceso acaba de escribir un bloque ahí
+
+    return borrados
+
+
+# ============================================
+#  Consola
+# ============================================
+
+def main(argv: list[str]) -> None:
+    uso = "Uso: python snapshots.py listar | crear | restaurar <nombre> [destino]"
+    if not argv:
+        raise SystemExit(uso)
+
+    comando = argv[0]
+    if comando == "listar":
+        for s in listar_snapshots():
+            print(f"{s['nombre']:<20} {s['creado']:%Y-%m-%d %H:%M}  {s['tamano'] / 2**20:8.1f} MB")
+    elif comando == "crear":
+        r = crear_snapshot()
+        print(f"{r['bloques_nuevos']} de {r['bloques']} bloques nuevos "
+              f"({r['bytes_nuevos'] / 2**20:.1f} MB escritos)")
+    elif comando == "restaurar" and len(argv) in (2, 3):
+        restaurar_snapshot(argv[1], *argv[2:3])
+    else:
+        raise SystemExit(uso)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
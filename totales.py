@@ -0,0 +1,171 @@
+# totales.py
+"""
+Montos precalculados que SQLite mantiene al día con triggers.
+
+- pedidos.monto_total: suma de cantidad * precio_unitario de los ítems del
+  pedido. Cada insert/update/delete en items_pedido suma o resta solo lo
+  que aporta ese ítem, así que mostrar un monto nunca recorre los ítems.
+- resumen_clientes: por cliente, cantidad de pedidos, total comprado, saldo
+  pendiente y fecha del último pedido. Se ajusta con cada pedido que se
+  crea, cambia o borra (incluido el cambio de monto_total por sus ítems).
+
+Igual que el índice de búsqueda (busqueda.py), los triggers se aplican a
+todo lo que escribe en la BD: el ORM, importar_excel, importar_respaldo o
+SQL directo.
+"""
+from sqlalchemy import Column, DateTime, Integer, MetaData, Table
+
+# Aporte de un ítem al monto del pedido (mismo cálculo que usaba la GUI:
+# int(cantidad or 0) * int(precio_unitario or 0))
+_MONTO_ITEM_SQL = (
+    "CAST(COALESCE({t}.cantidad, 0) AS INTEGER)"
+    " * CAST(COALESCE({t}.precio_unitario, 0) AS INTEGER)"
+)
+
+# Saldo de un pedido, igual que el "Saldo final" de las tablas: el saldo
+# guardado o, si no hay, monto - abono (mínimo 0)
+_SALDO_PEDIDO_SQL = (
+    "COALESCE({t}.saldo, MAX({t}.monto_total - COALESCE({t}.monto_pagado, 0), 0))"
+)
+
+# Quita un pedido (old) del resumen de su cliente. La fecha del último
+# pedido se vuelve a buscar con ix_pedidos_cliente_fecha.
+_QUITAR_PEDIDO_SQL = f"""
+        UPDATE resumen_clientes SET
+            n_pedidos = n_pedidos - 1,
+            monto_total = monto_total - old.monto_total,
+            saldo_pendiente = saldo_pendiente - {_SALDO_PEDIDO_SQL.format(t="old")},
+            ultimo_pedido = (
+                SELECT MAX(fecha_pedido) FROM pedidos WHERE cliente_id = old.cliente_id
+            )
+        WHERE cliente_id = old.cliente_id;
+"""
+
+# Suma un pedido (new) al resumen de su cliente, creando la fila si falta
+_SUMAR_PEDIDO_SQL = f"""
+        INSERT INTO resumen_clientes
+            (cliente_id, n_pedidos, monto_total, saldo_pendiente, ultimo_pedido)
+        VALUES (new.cliente_id, 1, new.monto_total,
+                {_SALDO_PEDIDO_SQL.format(t="new")}, new.fecha_pedido)
+        ON CONFLICT (cliente_id) DO UPDATE SET
+            n_pedidos = n_pedidos + 1,
+            monto_total = monto_total + excluded.monto_total,
+            saldo_pendiente = saldo_pendiente + excluded.saldo_pendiente,
+            ultimo_pedido = CASE
+                WHEN ultimo_pedido IS NULL OR excluded.ultimo_pedido > ultimo_pedido
+                THEN excluded.ultimo_pedido ELSE ultimo_pedido
+            END;
+"""
+
+SENTENCIAS_TOTALES = [
+    # ---- monto de cada pedido ----
+    f"""
+    CREATE TRIGGER IF NOT EXISTS items_monto_ai AFTER INSERT ON items_pedido BEGIN
+        UPDATE pedidos SET monto_total = monto_total + {_MONTO_ITEM_SQL.format(t="new")}
+        WHERE id = new.pedido_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS items_monto_au
+    AFTER UPDATE OF cantidad, precio_unitario, pedido_id ON items_pedido BEGIN
+        UPDATE pedidos SET monto_total = monto_total - {_MONTO_ITEM_SQL.format(t="old")}
+        WHERE id = old.pedido_id;
+        UPDATE pedidos SET monto_total = monto_total + {_MONTO_ITEM_SQL.format(t="new")}
+        WHERE id = new.pedido_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS items_monto_ad AFTER DELETE ON items_pedido BEGIN
+        UPDATE pedidos SET monto_total = monto_total - {_MONTO_ITEM_SQL.format(t="old")}
+        WHERE id = old.pedido_id;
+    END
+    """,
+    # ---- resumen por cliente ----
+    """
+    CREATE TABLE IF NOT EXISTS resumen_clientes (
+        cliente_id INTEGER PRIMARY KEY,
+        n_pedidos INTEGER NOT NULL DEFAULT 0,
+        monto_total INTEGER NOT NULL DEFAULT 0,
+        saldo_pendiente INTEGER NOT NULL DEFAULT 0,
+        ultimo_pedido DATETIME
+    )
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_resumen_ai AFTER INSERT ON pedidos BEGIN
+        {_SUMAR_PEDIDO_SQL}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_resumen_au
+    AFTER UPDATE OF cliente_id, fecha_pedido, monto_total, monto_pagado, saldo ON pedidos BEGIN
+        {_QUITAR_PEDIDO_SQL}
+        {_SUMAR_PEDIDO_SQL}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS pedidos_resumen_ad AFTER DELETE ON pedidos BEGIN
+        {_QUITAR_PEDIDO_SQL}
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS clientes_resumen_ad AFTER DELETE ON clientes BEGIN
+        DELETE FROM resumen_clientes WHERE cliente_id = old.id;
+    END
+    """,
+]
+
+# Recalcula monto_total desde los ítems (BD antigua, o para reparar)
+RECALCULAR_MONTOS = f"""
+    UPDATE pedidos SET monto_total = (
+        SELECT COALESCE(SUM({_MONTO_ITEM_SQL.format(t="i")}), 0)
+        FROM items_pedido i WHERE i.pedido_id = pedidos.id
+    )
+"""
+
+_POBLAR_RESUMEN = [
+    "DELETE FROM resumen_clientes",
+    f"""
+    INSERT INTO resumen_clientes
+        (cliente_id, n_pedidos, monto_total, saldo_pendiente, ultimo_pedido)
+    SELECT p.cliente_id, COUNT(*), SUM(p.monto_total),
+           SUM({_SALDO_PEDIDO_SQL.format(t="p")}), MAX(p.fecha_pedido)
+    FROM pedidos p
+    GROUP BY p.cliente_id
+    """,
+]
+
+
+def crear_totales(conn) -> None:
+    """
+    Crea la tabla resumen_clientes y los triggers que mantienen los montos
+    si no existen. Si el resumen es nuevo (BD antigua), lo llena con los
+    pedidos actuales.
+
+    conn: conexión SQLAlchemy dentro de una transacción (engine.begin()).
+    """
+    existia = conn.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE name = 'resumen_clientes'"
+    ).first() is not None
+
+    for sql in SENTENCIAS_TOTALES:
+        conn.exec_driver_sql(sql)
+
+    if not existia:
+        for sql in _POBLAR_RESUMEN:
+            conn.exec_driver_sql(sql)
+
+
+# ============================================
+#  Consultas
+# ============================================
+
+_meta_totales = MetaData()
+
+resumen_clientes = Table(
+    "resumen_clientes", _meta_totales,
+    Column("cliente_id", Integer, primary_key=True),
+    Column("n_pedidos", Integer),
+    Column("monto_total", Integer),
+    Column("saldo_pendiente", Integer),
+    Column("ultimo_pedido", DateTime),
+)